@@ -0,0 +1,307 @@
+"""Monte Carlo simulation of the policy book, for checking premium tiers against claim risk.
+
+The book is read from a TravelInsuranceSystem's policies and grouped into
+cells of (risk group, plan type, coverage level). A risk group is a route and
+a season. Each cell keeps its policy count and the mean and spread of its
+coverage amounts, so one scenario costs O(cells), not O(policies).
+
+In each scenario:
+
+- every risk group may be hit by a shock (a storm, a strike) that multiplies
+  its claim probability;
+- each cell's claim count is drawn from a binomial;
+- the cell's loss is the sum of that many of its coverage amounts, sampled
+  without replacement. The spread of that sum around its mean is drawn from
+  a normal with the exact variance, once per tier rather than per cell.
+
+A cell's claim counts for a whole chunk are drawn as one multinomial
+histogram over the binomial's support, expanded and shuffled. That keeps the
+per-draw cost near a shuffle's instead of ``rng.binomial``'s.
+
+Scenarios are generated in chunks, each from its own spawned seed, and the
+chunks are spread over a process pool. The report gives the expected loss
+ratio, VaR/CVaR of the portfolio loss and of the underwriting result, and
+the profitability of each (plan type, coverage level) tier. For each tier it
+also gives the break-even premium rate to compare against pricing_rules.json.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+import math
+import time
+
+import numpy as np
+
+from pricing_engine import get_pricing_engine
+
+SEASONS = ("winter", "spring", "summer", "autumn")
+ANY = "*"
+CONFIDENCE_LEVELS = (0.95, 0.99, 0.999)
+DEFAULT_CLAIM_PROBABILITY = 0.02
+CHUNK_ELEMENTS = 4_000_000
+
+# (route, season) -> claim probability; either part may be ANY
+ClaimRates = Dict[Tuple[str, str], float]
+
+
+def route_of(details: Dict[str, Any]) -> str:
+    """Route of a ticket from its airline details, or ANY when the airline gives none."""
+    if details.get("route"):
+        return details["route"]
+    if details.get("origin") and details.get("destination"):
+        return f"{details['origin']}-{details['destination']}"
+    return ANY
+
+
+def season_of(departure: Optional[str]) -> str:
+    """Meteorological season (northern hemisphere) of an ISO departure date."""
+    if not departure:
+        return ANY
+    month = int(departure[5:7])
+    return SEASONS[month % 12 // 3]
+
+
+class PolicyBook:
+    """Active policies aggregated into (risk group, plan type, coverage level) cells."""
+
+    def __init__(self, policies: List[Dict[str, Any]]):
+        """``policies`` are dicts with route, season, plan_type, coverage_level,
+        coverage_amount, premium_amount and ticket_price."""
+        cells: Dict[Tuple[str, str, str, int], List[Tuple[float, float, float]]] = {}
+        for policy in policies:
+            key = (policy["route"], policy["season"], policy["plan_type"], int(policy["coverage_level"]))
+            cells.setdefault(key, []).append(
+                (policy["coverage_amount"], policy["premium_amount"], policy["ticket_price"])
+            )
+
+        self.cells = list(cells)
+        self.groups = sorted({(route, season) for route, season, _, _ in self.cells})
+        self.tiers = sorted({(plan, level) for _, _, plan, level in self.cells})
+        group_index = {group: i for i, group in enumerate(self.groups)}
+        tier_index = {tier: i for i, tier in enumerate(self.tiers)}
+
+        self.cell_group = np.array([group_index[c[0], c[1]] for c in self.cells], dtype=np.int64)
+        self.cell_tier = np.array([tier_index[c[2], c[3]] for c in self.cells], dtype=np.int64)
+        amounts = [np.array(cells[c], dtype=np.float64).reshape(-1, 3) for c in self.cells]
+        self.count = np.array([len(a) for a in amounts], dtype=np.int64)
+        self.coverage_mean = np.array([a[:, 0].mean() for a in amounts])
+        self.coverage_std = np.array([a[:, 0].std() for a in amounts])
+        self.premium = np.array([a[:, 1].sum() for a in amounts])
+        self.ticket_value = np.array([a[:, 2].sum() for a in amounts])
+
+        # (cell, tier) weights that turn per-cell claim counts into tier loss means and variances
+        member = np.zeros((len(self.cells), len(self.tiers)))
+        member[np.arange(len(self.cells)), self.cell_tier] = 1.0
+        variance = np.square(self.coverage_std)
+        self.tier_mean_weights = member * self.coverage_mean[:, None]
+        self.tier_var_weights = member * variance[:, None]
+        self.tier_var_correction = member * (variance / self.count)[:, None]
+
+    @classmethod
+    def from_system(cls, system) -> "PolicyBook":
+        """Book of the system's active policies, with route and season from each ticket's details.
+
+        A trip covered by a subscription has no premium of its own; it is
+        credited an equal share of its month's fee, ``monthly_fee / trips_per_month``.
+        """
+        engine = get_pricing_engine()
+        policies = []
+        for ticket_number, policy in system.insurance_data.items():
+            if policy.get("status", "active") != "active":
+                continue
+            premium_amount = policy["premium_amount"]
+            if policy.get("subscription_id") is not None:
+                subscription = system.storage.subscriptions.get(policy["subscription_id"])
+                terms = ((subscription["monthly_fee"], subscription["trips_per_month"]) if subscription
+                         else engine.subscription_terms(policy.get("plan_type")))
+                if terms is not None:
+                    premium_amount = terms[0] / terms[1]
+            flight = system.flight_data.get(ticket_number) or {}
+            details = flight.get("details") or {}
+            ticket_price = details.get("price")
+            if ticket_price is None:
+                coverage_rate = engine.rules.coverage_rates[policy["coverage_level"]]
+                ticket_price = policy["coverage_amount"] / coverage_rate
+            policies.append({
+                "route": route_of(details),
+                "season": season_of(details.get("departure")),
+                "plan_type": policy.get("plan_type"),
+                "coverage_level": policy["coverage_level"],
+                "coverage_amount": policy["coverage_amount"],
+                "premium_amount": premium_amount,
+                "ticket_price": ticket_price
+            })
+        return cls(policies)
+
+    def __len__(self) -> int:
+        return int(self.count.sum())
+
+    def claim_probabilities(self, rates: ClaimRates,
+                            default: float = DEFAULT_CLAIM_PROBABILITY) -> np.ndarray:
+        """Claim probability of each risk group.
+
+        Looked up as (route, season), then (route, ANY), then (ANY, season), then ``default``.
+        """
+        probabilities = []
+        for route, season in self.groups:
+            for key in ((route, season), (route, ANY), (ANY, season)):
+                if key in rates:
+                    probabilities.append(rates[key])
+                    break
+            else:
+                probabilities.append(default)
+        return np.clip(np.array(probabilities, dtype=np.float64), 0.0, 1.0)
+
+
+def claim_count_pmf(n: int, p: float) -> Tuple[int, np.ndarray]:
+    """(first count, probabilities) of Binomial(n, p), trimmed to where the mass is."""
+    if p <= 0.0 or n == 0:
+        return 0, np.ones(1)
+    if p >= 1.0:
+        return n, np.ones(1)
+    mean, sd = n * p, math.sqrt(n * p * (1.0 - p))
+    lo, hi = max(0, int(mean - 12 * sd) - 12), min(n, int(mean + 12 * sd) + 12)
+    k = np.arange(lo, hi + 1)
+    log_comb = math.lgamma(n + 1) - np.array([math.lgamma(x + 1) + math.lgamma(n - x + 1) for x in k])
+    log_pmf = log_comb + k * math.log(p) + (n - k) * math.log1p(-p)
+    pmf = np.exp(log_pmf - log_pmf.max())
+    return lo, pmf / pmf.sum()
+
+
+def _draw_counts(rng: np.random.Generator, pmf: Tuple[int, np.ndarray], size: int) -> np.ndarray:
+    # `size` i.i.d. binomial draws: a histogram from one multinomial, expanded and shuffled.
+    # About 6x faster than rng.binomial, whose per-draw cost dominates otherwise.
+    lo, probabilities = pmf
+    draws = np.repeat(np.arange(lo, lo + len(probabilities), dtype=np.float64),
+                      rng.multinomial(size, probabilities))
+    rng.shuffle(draws)
+    return draws
+
+
+def _simulate_chunk(book: PolicyBook, pmfs: List[Tuple[Tuple[int, np.ndarray], Tuple[int, np.ndarray]]],
+                    shock_probability: float, scenarios: int,
+                    seed: np.random.SeedSequence) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Top-level so it can be shipped to a process pool.
+    # Returns (portfolio loss per scenario, summed tier losses, summed squared tier losses)
+    rng = np.random.default_rng(seed)
+    claims = np.empty((len(book.cells), scenarios))
+    if shock_probability > 0.0:
+        shocked = rng.random((len(book.groups), scenarios)) < shock_probability
+        split = [(np.flatnonzero(~row), np.flatnonzero(row)) for row in shocked]
+        for cell, (calm_pmf, shocked_pmf) in enumerate(pmfs):
+            calm, hit = split[book.cell_group[cell]]
+            claims[cell, calm] = _draw_counts(rng, calm_pmf, len(calm))
+            claims[cell, hit] = _draw_counts(rng, shocked_pmf, len(hit))
+    else:
+        for cell, (calm_pmf, _) in enumerate(pmfs):
+            claims[cell] = _draw_counts(rng, calm_pmf, scenarios)
+
+    # A cell's loss is the sum of `claims` coverage amounts drawn without replacement:
+    # mean claims * m, variance claims * (1 - claims / n) * s^2. Cells are independent,
+    # so a tier's severity noise is one normal with the summed variance.
+    tiers = len(book.tiers)
+    tier_loss = book.tier_mean_weights.T @ claims
+    tier_var = book.tier_var_weights.T @ claims - book.tier_var_correction.T @ np.square(claims)
+    tier_loss += np.sqrt(np.maximum(tier_var, 0.0)) * rng.standard_normal((tiers, scenarios))
+    np.maximum(tier_loss, 0.0, out=tier_loss)
+    return tier_loss.sum(axis=0), tier_loss.sum(axis=1), np.square(tier_loss).sum(axis=1)
+
+
+def _tail(values: np.ndarray, level: float) -> Tuple[float, float]:
+    """(VaR, CVaR) of ``values`` as losses at confidence ``level``."""
+    var = float(np.quantile(values, level))
+    tail = values[values >= var]
+    return var, float(tail.mean()) if tail.size else var
+
+
+class PortfolioSimulator:
+    def __init__(self, book: PolicyBook, claim_rates: Optional[ClaimRates] = None,
+                 default_probability: float = DEFAULT_CLAIM_PROBABILITY,
+                 shock_probability: float = 0.0, shock_multiplier: float = 1.0,
+                 processes: int = 0, chunk_size: Optional[int] = None, seed: Optional[int] = None):
+        self.book = book
+        self.probabilities = book.claim_probabilities(claim_rates or {}, default_probability)
+        self.shock_probability = shock_probability
+        self.shock_multiplier = shock_multiplier
+        self.processes = processes
+        # By default a chunk's (cells x scenarios) claim matrix stays around 32 MB
+        self.chunk_size = chunk_size or max(1_000, CHUNK_ELEMENTS // max(len(book.cells), 1))
+        self.seed = seed
+        shocked = np.minimum(self.probabilities * shock_multiplier, 1.0)
+        self._pmfs = [
+            (claim_count_pmf(int(n), self.probabilities[group]), claim_count_pmf(int(n), shocked[group]))
+            for n, group in zip(book.count, book.cell_group)
+        ]
+
+    def run(self, scenarios: int = 1_000_000,
+            confidence_levels: Tuple[float, ...] = CONFIDENCE_LEVELS) -> Dict[str, Any]:
+        """Simulate ``scenarios`` loss years of the book and summarize them."""
+        if not len(self.book):
+            return {"status": "error", "message": "Policy book is empty"}
+        start = time.perf_counter()
+        sizes = [min(self.chunk_size, scenarios - i) for i in range(0, scenarios, self.chunk_size)]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        args = [(self.book, self._pmfs, self.shock_probability, size, seed)
+                for size, seed in zip(sizes, seeds)]
+
+        if self.processes:
+            with ProcessPoolExecutor(self.processes) as executor:
+                results = list(executor.map(_simulate_chunk, *zip(*args)))
+        else:
+            results = [_simulate_chunk(*a) for a in args]
+
+        losses = np.concatenate([r[0] for r in results])
+        tier_sum = np.sum([r[1] for r in results], axis=0)
+        tier_sq_sum = np.sum([r[2] for r in results], axis=0)
+        report = self._report(losses, tier_sum, tier_sq_sum, scenarios, confidence_levels)
+        report["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+        return report
+
+    def _report(self, losses: np.ndarray, tier_sum: np.ndarray, tier_sq_sum: np.ndarray,
+                scenarios: int, confidence_levels: Tuple[float, ...]) -> Dict[str, Any]:
+        book = self.book
+        premium = float(book.premium.sum())
+        result = losses - premium  # underwriting loss; negative is profit
+        tail_risk = {}
+        for level in confidence_levels:
+            loss_var, loss_cvar = _tail(losses, level)
+            result_var, result_cvar = _tail(result, level)
+            tail_risk[str(level)] = {
+                "loss_var": loss_var,
+                "loss_cvar": loss_cvar,
+                "underwriting_var": result_var,
+                "underwriting_cvar": result_cvar
+            }
+
+        tier_premium = np.bincount(book.cell_tier, book.premium, len(book.tiers))
+        tier_value = np.bincount(book.cell_tier, book.ticket_value, len(book.tiers))
+        tier_count = np.bincount(book.cell_tier, book.count, len(book.tiers))
+        tier_mean = tier_sum / scenarios
+        tier_std = np.sqrt(np.maximum(tier_sq_sum / scenarios - tier_mean ** 2, 0.0))
+        tiers = []
+        for i, (plan_type, level) in enumerate(book.tiers):
+            tiers.append({
+                "plan_type": plan_type,
+                "coverage_level": level,
+                "policies": int(tier_count[i]),
+                "premium": float(tier_premium[i]),
+                "expected_loss": float(tier_mean[i]),
+                "loss_std": float(tier_std[i]),
+                "expected_loss_ratio": float(tier_mean[i] / tier_premium[i]) if tier_premium[i] else None,
+                "expected_profit": float(tier_premium[i] - tier_mean[i]),
+                "premium_rate": float(tier_premium[i] / tier_value[i]),
+                "breakeven_premium_rate": float(tier_mean[i] / tier_value[i])
+            })
+
+        return {
+            "status": "success",
+            "scenarios": scenarios,
+            "policies": len(book),
+            "premium": premium,
+            "expected_loss": float(losses.mean()),
+            "loss_std": float(losses.std()),
+            "expected_loss_ratio": float(losses.mean() / premium) if premium else None,
+            "probability_of_underwriting_loss": float((result > 0).mean()),
+            "tail_risk": tail_risk,
+            "tiers": tiers
+        }
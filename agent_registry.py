@@ -0,0 +1,129 @@
+"""Lazy construction of ADK agents and Gemini model clients.
+
+Agents and models are registered as factories and built on first use, so
+importing main.py or streamlit_app.py does not configure the Gemini client or
+construct any agent. Setting TRAVEL_INSURANCE_OFFLINE=1 (or calling
+``registry.set_offline(True)``) swaps every entry for a local stub.
+"""
+
+from typing import Dict, Any, Callable, Iterable, List, Optional
+import os
+import threading
+
+DEFAULT_MODEL = "gemini-pro"
+
+
+class StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubModel:
+    """Offline stand-in for ``GenerativeModel``."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL):
+        self.model_name = model_name
+
+    def generate_content(self, prompt: Any, **kwargs) -> StubResponse:
+        return StubResponse(f"[{self.model_name} offline] {prompt}")
+
+
+class StubAgent:
+    """Offline stand-in for an ADK ``Agent`` carrying the same declaration."""
+
+    def __init__(self, name: str, model: str, description: str = "",
+                 skills: Optional[List[str]] = None, on_event: Optional[List[str]] = None, **kwargs):
+        self.name = name
+        self.model = model
+        self.description = description
+        self.skills = skills or []
+        self.on_event = on_event or []
+
+
+class AgentRegistry:
+    """Builds registered agents and models on first use and caches them."""
+
+    def __init__(self, offline: Optional[bool] = None):
+        if offline is None:
+            offline = os.getenv("TRAVEL_INSURANCE_OFFLINE", "").lower() in ("1", "true", "yes")
+        self.offline = offline
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._stub_factories: Dict[str, Callable[[], Any]] = {}
+        self._specs: Dict[str, Dict[str, Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def register(self, key: str, factory: Callable[[], Any], stub_factory: Callable[[], Any],
+                 spec: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            self._factories[key] = factory
+            self._stub_factories[key] = stub_factory
+            self._specs[key] = spec or {}
+            self._instances.pop(key, None)
+
+    def register_model(self, key: str, model_name: str = DEFAULT_MODEL) -> None:
+        """Register a Gemini ``GenerativeModel`` client."""
+        self.register(
+            key,
+            lambda: _gemini_model(model_name),
+            lambda: StubModel(model_name),
+            {"model": model_name}
+        )
+
+    def register_agent(self, key: str, **spec) -> None:
+        """Register an ADK ``Agent``; ``spec`` holds its constructor arguments."""
+        self.register(key, lambda: _adk_agent(**spec), lambda: StubAgent(**spec), spec)
+
+    def spec(self, key: str) -> Dict[str, Any]:
+        """Declared configuration of an entry, available without building it."""
+        return self._specs[key]
+
+    def keys(self) -> List[str]:
+        return list(self._factories)
+
+    def get(self, key: str) -> Any:
+        instance = self._instances.get(key)
+        if instance is not None:
+            return instance
+        with self._lock:
+            instance = self._instances.get(key)
+            if instance is None:
+                factories = self._stub_factories if self.offline else self._factories
+                instance = self._instances[key] = factories[key]()
+            return instance
+
+    def is_built(self, key: str) -> bool:
+        return key in self._instances
+
+    def preload(self, keys: Optional[Iterable[str]] = None) -> None:
+        for key in list(keys if keys is not None else self._factories):
+            self.get(key)
+
+    def set_offline(self, offline: bool) -> None:
+        with self._lock:
+            self.offline = offline
+            self._instances.clear()
+
+
+_genai_configured = False
+_genai_lock = threading.Lock()
+
+
+def _gemini_model(model_name: str):
+    global _genai_configured
+    import google.generativeai as genai
+
+    with _genai_lock:
+        if not _genai_configured:
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            _genai_configured = True
+    return genai.GenerativeModel(model_name)
+
+
+def _adk_agent(**spec):
+    from google.adk.agents import Agent
+
+    return Agent(**spec)
+
+
+registry = AgentRegistry()
@@ -1,28 +1,20 @@
-
 """Demonstration of Travel AI Conceirge using Agent Development Kit"""
 
-from google.adk.agents import Agent
-from google.adk.tools import Tool
 from typing import List, Dict, Any
 
-from travel_concierge import prompt
-
-from travel_concierge.sub_agents.booking.agent import booking_agent
-from travel_concierge.sub_agents.in_trip.agent import in_trip_agent
-from travel_concierge.sub_agents.inspiration.agent import inspiration_agent
-from travel_concierge.sub_agents.planning.agent import planning_agent
-from travel_concierge.sub_agents.post_trip.agent import post_trip_agent
-from travel_concierge.sub_agents.pre_trip.agent import pre_trip_agent
-
-from travel_concierge.tools.memory import _load_precreated_itinerary
+from agent_registry import registry
+from pricing_engine import DEFAULT_PLAN_TYPE, get_pricing_engine
 
 
 # === Agent Definition ===
+# Agents are registered here and constructed lazily on first attribute access
+# (e.g. ``agents.claims_agent``), see agent_registry.py.
 
 
 # ===1. User Vetting Agent ===>>>>> (handles user registration and MAC address verification) 
 
-user_vetting_agent = Agent(
+registry.register_agent(
+    "user_vetting_agent",
     name="UserVettingAgent",
     model="gemini-2.5-pro-exp-03-25",
     description="Handles user registration, authentication, and MAC address verification",
@@ -37,7 +29,8 @@ user_vetting_agent = Agent(
 )
 
 # === Flight Purchase Verification Agent ===>>>>> (verifies flight purchases)
-flight_verification_agent = Agent(
+registry.register_agent(
+    "flight_verification_agent",
     name="FlightVerificationAgent",
     model="gemini-2.5-pro-exp-03-25",
     description="Verifies flight purchases and matches them with user credentials",
@@ -51,7 +44,8 @@ flight_verification_agent = Agent(
 )
 
 # === Insurance Coverage Agent ===>>>>> (manages insurance coverage options and calculations)
-coverage_agent = Agent(
+registry.register_agent(
+    "coverage_agent",
     name="CoverageAgent",
     model="gemini-2.5-pro-exp-03-25",
     description="Manages insurance coverage options and calculations",
@@ -65,7 +59,8 @@ coverage_agent = Agent(
 )
 
 # === Payment Processing Agent ===>>>>> (handles payment processing for insurance plans)
-payment_agent = Agent(
+registry.register_agent(
+    "payment_agent",
     name="PaymentAgent",
     model="gemini-2.5-pro-exp-03-25",
     description="Handles payment processing for insurance plans",
@@ -79,7 +74,8 @@ payment_agent = Agent(
 )
 
 # === Claims Processing Agent ===>>>>> (manages insurance claims and payouts)
-claims_agent = Agent(
+registry.register_agent(
+    "claims_agent",
     name="ClaimsAgent",
     model="gemini-2.5-pro-exp-03-25",
     description="Manages insurance claims and payouts",
@@ -92,44 +88,47 @@ claims_agent = Agent(
     on_event=["claim_submission", "claim_verification_request"]
 )
 
+AGENT_NAMES = (
+    "user_vetting_agent",
+    "flight_verification_agent",
+    "coverage_agent",
+    "payment_agent",
+    "claims_agent",
+)
+
+
+def __getattr__(name: str):
+    if name in AGENT_NAMES:
+        return registry.get(name)
+    # PLAN_TYPES is read from the pricing engine on each access, so a rules reload is picked up
+    if name == "PLAN_TYPES":
+        return get_pricing_engine().plan_types()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # === Coverage Calculation Formula ===>>>>> (calculates insurance coverage based on ticket price and coverage level)
-def calculate_coverage(ticket_price: float, coverage_level: int) -> Dict[str, float]:
+def calculate_coverage(ticket_price: float, coverage_level: int,
+                       plan_type: str = DEFAULT_PLAN_TYPE) -> Dict[str, float]:
     """
     Calculate insurance coverage based on ticket price and coverage level.
     
-    Coverage levels:
+    Coverage tiers and plan surcharges are defined in pricing_rules.json.
+    With the default rules:
     1: 50% coverage (1% of ticket price)
     2: 75% coverage (2% of ticket price)
     3: 100% coverage (3% of ticket price)
     """
-    coverage_percentages = {
-        1: 0.50,
-        2: 0.75,
-        3: 1.00
-    }
-    
-    premium_percentages = {
-        1: 0.01,
-        2: 0.02,
-        3: 0.03
-    }
-    
-    coverage_amount = ticket_price * coverage_percentages[coverage_level]
-    premium_amount = ticket_price * premium_percentages[coverage_level]
+    coverage_amount, premium_amount, coverage_percentage = get_pricing_engine().quote(
+        ticket_price, coverage_level, plan_type
+    )
     
     return {
         "coverage_amount": coverage_amount,
         "premium_amount": premium_amount,
-        "coverage_percentage": coverage_percentages[coverage_level] * 100
+        "coverage_percentage": coverage_percentage
     }
 
-# === Plan Types ===>>>>> (defines different types of insurance plans)
-PLAN_TYPES = {
-    "SINGLE": "Single purchase plan",
-    "MONTHLY": "Yearly Plan (1 per month)",
-    "FAMILY_TRIP": "One time family trip for 4",
-    "ANNUAL_FAMILY": "Annual Trip Protection for 4 (1 per month)"
-}
+# === Plan Types ===>>>>> (``agents.PLAN_TYPES`` is served by the module __getattr__ above,
+# read from pricing_rules.json on each access)
 
 # === Payment Methods ===>>>>> (defines different payment methods)
 PAYMENT_METHODS = [
@@ -139,33 +138,37 @@ PAYMENT_METHODS = [
     "PAYPAL"
 ]
 
-# === Register User ===>>>>> (registers a new user)
+# === Example usage ===>>>>> (runs the full flow end to end)
+if __name__ == "__main__":
+    from main import TravelInsuranceSystem
 
-system = TravelInsuranceSystem()
-user_registration = system.register_user(
-    email="user@example.com",
-    mac_address="00:1A:2B:3C:4D:5E"
-)
+    # === Register User ===>>>>> (registers a new user)
 
-# === Process a flight purchase ===>>>>> (processes a flight purchase)
+    system = TravelInsuranceSystem()
+    user_registration = system.register_user(
+        email="user@example.com",
+        mac_address="00:1A:2B:3C:4D:5E"
+    )
 
-flight_purchase = system.process_flight_purchase(
-    ticket_number="ABC123",
-    user_id=user_registration["user_id"]
-)
+    # === Process a flight purchase ===>>>>> (processes a flight purchase)
 
-# === Purchase insurance ===>>>>> (purchases insurance for a flight)
+    flight_purchase = system.process_flight_purchase(
+        ticket_number="ABC123",
+        user_id=user_registration["user_id"]
+    )
 
-insurance_purchase = system.purchase_insurance(
-    user_id=user_registration["user_id"],
-    ticket_number="ABC123",
-    coverage_level=2,  # 75% coverage
-    payment_method="VISA"
-)
+    # === Purchase insurance ===>>>>> (purchases insurance for a flight)
+
+    insurance_purchase = system.purchase_insurance(
+        user_id=user_registration["user_id"],
+        ticket_number="ABC123",
+        coverage_level=2,  # 75% coverage
+        payment_method="VISA"
+    )
 
-# === Process a claim ===>>>>> (processes a claim)
+    # === Process a claim ===>>>>> (processes a claim)
 
-claim = system.process_claim(
-    ticket_number="ABC123",
-    user_id=user_registration["user_id"]
-)
\ No newline at end of file
+    claim = system.process_claim(
+        ticket_number="ABC123",
+        user_id=user_registration["user_id"]
+    )
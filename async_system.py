@@ -0,0 +1,123 @@
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, Callable, Optional
+import asyncio
+
+from main import TravelInsuranceSystem
+from metrics import instrument_class
+from pricing_engine import DEFAULT_PLAN_TYPE
+from tools import UserVettingTools, CachedFlightVerificationTools
+
+DEFAULT_TOOL_TIMEOUT = 10.0
+
+
+class ToolTimeoutError(Exception):
+    """A tool call did not finish within its timeout."""
+
+    def __init__(self, tool_name: str, timeout: float):
+        super().__init__(f"{tool_name} timed out after {timeout}s")
+        self.tool_name = tool_name
+        self.timeout = timeout
+
+
+async def gather_or_cancel(*aws):
+    """Run awaitables concurrently; if one fails, cancel the rest and re-raise."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class AsyncTravelInsuranceSystem:
+    """Asyncio front end for TravelInsuranceSystem.
+
+    Independent tool calls run concurrently, and each call is bounded by a
+    timeout. Blocking tools run on an executor. Tools that are coroutine
+    functions are awaited directly. The business rules live in the wrapped
+    TravelInsuranceSystem: purchases, claims and refunds call its methods on
+    the executor, and registration and ticket checks hand their tool results
+    to it, so both APIs share storage and behaviour.
+    """
+
+    def __init__(self, system: Optional[TravelInsuranceSystem] = None,
+                 tool_timeout: float = DEFAULT_TOOL_TIMEOUT,
+                 executor: Optional[Executor] = None):
+        self.system = system or TravelInsuranceSystem()
+        self.tool_timeout = tool_timeout
+        self._executor = executor or ThreadPoolExecutor(max_workers=32, thread_name_prefix="tool")
+
+    async def call_tool(self, tool: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """Call a tool with a timeout; the awaiting task is cancelled on expiry."""
+        timeout = self.tool_timeout if timeout is None else timeout
+        if asyncio.iscoroutinefunction(tool):
+            call = tool(*args)
+        else:
+            loop = asyncio.get_running_loop()
+            call = loop.run_in_executor(self._executor, partial(tool, *args))
+        try:
+            return await asyncio.wait_for(call, timeout)
+        except asyncio.TimeoutError:
+            raise ToolTimeoutError(getattr(tool, "__qualname__", repr(tool)), timeout) from None
+
+    async def register_user(self, email: str, mac_address: str) -> Dict[str, Any]:
+        """Register a new user with MAC address verification and 2FA setup."""
+        if not UserVettingTools.verify_mac_address(mac_address):
+            return {"status": "error", "message": "Invalid MAC address"}
+
+        try:
+            user_info, two_fa_info = await gather_or_cancel(
+                self.call_tool(UserVettingTools.register_user, email, mac_address),
+                self.call_tool(UserVettingTools.setup_2fa, email)
+            )
+        except ToolTimeoutError as e:
+            return {"status": "error", "message": str(e)}
+        return self.system.complete_registration(user_info, two_fa_info)
+
+    async def process_flight_purchase(self, ticket_number: str, user_id: str) -> Dict[str, Any]:
+        """Process flight purchase and offer insurance options."""
+        try:
+            flight_info, ticket_details = await gather_or_cancel(
+                self.call_tool(CachedFlightVerificationTools.verify_flight_purchase, ticket_number, user_id),
+                self.call_tool(CachedFlightVerificationTools.extract_ticket_details, ticket_number)
+            )
+        except ToolTimeoutError as e:
+            return {"status": "error", "message": str(e)}
+        return self.system.complete_flight_purchase(ticket_number, flight_info, ticket_details)
+
+    # Purchases, claims and refunds run the sync core on the executor, so
+    # eligibility, reservations and recording stay in one place
+
+    async def purchase_insurance(self, user_id: str, ticket_number: str, coverage_level: int,
+                                 payment_method: str, plan_type: str = DEFAULT_PLAN_TYPE) -> Dict[str, Any]:
+        """Process insurance purchase."""
+        return await self._run_system(self.system.purchase_insurance, user_id, ticket_number, coverage_level,
+                                      payment_method, plan_type)
+
+    async def process_claim(self, ticket_number: str, user_id: str,
+                            payout_destination: Optional[str] = None) -> Dict[str, Any]:
+        """Process insurance claim for flight cancellation."""
+        return await self._run_system(self.system.process_claim, ticket_number, user_id, payout_destination)
+
+    async def process_refund(self, transaction_id: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Process refund for unused insurance plan; with ``user_id``, only that user's own charges."""
+        return await self._run_system(self.system.process_refund, transaction_id, user_id)
+
+    async def _run_system(self, method: Callable, *args) -> Dict[str, Any]:
+        # A timed-out call keeps running to completion on its thread; retrying
+        # it is safe because the core's charges and payouts are idempotent
+        try:
+            return await self.call_tool(method, *args)
+        except ToolTimeoutError as e:
+            return {"status": "error", "message": str(e)}
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+instrument_class(AsyncTravelInsuranceSystem, "async_system",
+                 ["register_user", "process_flight_purchase", "purchase_insurance",
+                  "process_claim", "process_refund"])
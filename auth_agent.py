@@ -1,11 +1,19 @@
-from google.generativeai import GenerativeModel
-import google.generativeai as genai
+from typing import Dict, Any
+import hmac
+import secrets
 
-# Configure the Gemini API
-genai.configure(api_key="YOUR_API_KEY")  # Replace with your actual API key
+from agent_registry import registry
+from two_factor import get_two_factor
 
-# Create the authentication agent
-agent = GenerativeModel('gemini-pro')
+# Register the authentication agent; the Gemini client is configured from
+# GOOGLE_API_KEY and the model is created on first use of ``agent``
+registry.register_model("auth_model", "gemini-pro")
+
+
+def __getattr__(name: str):
+    if name == "agent":
+        return registry.get("auth_model")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def verify_credentials(email: str, password: str) -> bool:
     """Verify user credentials."""
@@ -14,9 +22,16 @@ def verify_credentials(email: str, password: str) -> bool:
 
 def generate_2fa_code() -> str:
     """Generate a 2FA code."""
-    import random
-    return str(random.randint(100000, 999999))
+    return str(secrets.randbelow(1_000_000)).zfill(6)
 
 def verify_2fa_code(code: str, user_code: str) -> bool:
     """Verify 2FA code."""
-    return code == user_code 
\ No newline at end of file
+    return hmac.compare_digest(code.encode(), user_code.encode())
+
+def issue_2fa_code(user_id: str) -> Dict[str, Any]:
+    """Issue a stored, expiring 2FA code for a user."""
+    return get_two_factor().issue(user_id)
+
+def check_2fa_code(user_id: str, code: str) -> Dict[str, Any]:
+    """Verify a user's 2FA code against the code store."""
+    return get_two_factor().verify(user_id, code)
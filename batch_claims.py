@@ -0,0 +1,230 @@
+"""Batch claims adjudication for mass flight-cancellation events.
+
+Claims are read from any iterable of (ticket_number, user_id) pairs in fixed
+size batches. Each batch is verified in bulk and paid out with one call per
+payment rail. Payout notifications are queued on the system's notification
+dispatcher, which delivers them in batches.
+
+Verified claims go through the same eligibility and fraud screening as
+process_claim; a claim the fraud index flags is held for review and not paid.
+A screened claim is indexed as in flight before payout, so claim bursts inside
+one batch are caught too.
+
+Idempotency: a claim is written as ``pending_payout`` before its rail is
+called and as ``success`` afterwards. A re-run skips paid claims and
+resubmits pending and failed ones under the same claim_id, which the rail
+treats as the idempotency key, so a crash between the two writes never
+double-pays.
+Each ticket is reserved on the system for the length of its batch, the same
+reservation process_claim takes, so the two paths never pay one ticket twice.
+"""
+
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+import time
+
+from event_log import CLAIM_FILED
+from main import CLAIM_IN_PROGRESS, TravelInsuranceSystem
+from reporting import ACTIVE
+from tools import ClaimsTools, batched
+
+PENDING_PAYOUT = "pending_payout"
+
+# Claims a re-run leaves alone; pending and failed payouts are submitted again
+SETTLED_STATUSES = ("success", "under_review")
+
+
+def _verify_chunk(claims: List[Tuple[str, str]]) -> List[bool]:
+    # Top-level so it can be shipped to a process pool
+    return [
+        result["verification_status"] == "verified"
+        for result in ClaimsTools.verify_claims(claims)
+    ]
+
+
+class BatchClaimsProcessor:
+    """Adjudicate a stream of claims against a TravelInsuranceSystem."""
+
+    def __init__(self, system: TravelInsuranceSystem, batch_size: int = 1000,
+                 processes: int = 0,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.system = system
+        self.batch_size = batch_size
+        self.processes = processes
+        self.progress = progress
+        self.stats = {
+            "received": 0,
+            "paid": 0,
+            "already_paid": 0,
+            "rejected": 0,
+            "held_for_review": 0,
+            "failed": 0,
+            "payout_total": 0.0,
+            "notifications": 0
+        }
+
+    def run(self, claims: Iterable[Tuple[str, str]]) -> Dict[str, Any]:
+        """Process every claim and return summary statistics."""
+        start = time.perf_counter()
+        executor = ProcessPoolExecutor(self.processes) if self.processes else None
+        errors: List[Dict[str, Any]] = []
+        try:
+            for batch in batched(claims, self.batch_size):
+                errors.extend(self._process_batch(batch, executor))
+                self._report(start)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return {
+            "status": "success" if not errors else "partial",
+            **self._summary(start),
+            "errors": errors
+        }
+
+    def _process_batch(self, batch: List[Tuple[str, str]],
+                       executor: Optional[Executor]) -> List[Dict[str, Any]]:
+        self.stats["received"] += len(batch)
+        reserved = []
+        try:
+            return self._adjudicate(batch, reserved, executor)
+        finally:
+            for ticket_number in reserved:
+                self.system.release_claim(ticket_number)
+
+    def _adjudicate(self, batch: List[Tuple[str, str]], reserved: List[str],
+                    executor: Optional[Executor]) -> List[Dict[str, Any]]:
+        # Tickets are reserved before their claim is checked, so a claim filed
+        # through process_claim meanwhile cannot be paid twice
+        errors = []
+        seen = set()
+        candidates = []  # (claim_id, ticket_number, user_id, policy, screened)
+
+        for ticket_number, user_id in batch:
+            claim_id = f"claim_{ticket_number}_{user_id}"
+            if claim_id in seen:
+                self.stats["already_paid"] += 1
+                continue
+            seen.add(claim_id)
+            if not self.system.reserve_claim(ticket_number):
+                self.stats["failed"] += 1
+                errors.append({**CLAIM_IN_PROGRESS, "claim_id": claim_id})
+                continue
+            reserved.append(ticket_number)
+
+            existing = self.system.claims_data.get(claim_id)
+            if existing is not None and existing.get("status") in SETTLED_STATUSES:
+                self.stats["already_paid"] += 1
+                continue
+
+            policy = self.system.insurance_data.get(ticket_number)
+            if policy is None or policy["user_id"] != user_id:
+                self.stats["failed"] += 1
+                errors.append({"claim_id": claim_id, "message": "No policy for ticket"})
+                continue
+            if policy.get("status", ACTIVE) != ACTIVE:
+                self.stats["failed"] += 1
+                errors.append({"claim_id": claim_id, "message": f"Policy is {policy['status']}"})
+                continue
+            # A pending claim was screened and indexed when it was first filed
+            screened = existing is not None and existing.get("status") == PENDING_PAYOUT
+            candidates.append((claim_id, ticket_number, user_id, policy, screened))
+
+        verified = self._verify([(c[0], c[2]) for c in candidates], executor)
+
+        by_rail: Dict[str, List[tuple]] = defaultdict(list)
+        with self.system.storage.transaction():
+            for candidate, ok in zip(candidates, verified):
+                claim_id, ticket_number, user_id, policy, screened = candidate
+                if not ok:
+                    self.stats["rejected"] += 1
+                    errors.append({"claim_id": claim_id, "message": "Claim verification failed"})
+                    continue
+                if not screened:
+                    fraud_check = self.system.screen_claim(claim_id, ticket_number, user_id, None,
+                                                           policy["coverage_amount"])
+                    if fraud_check is not None:
+                        held = self.system.claims_data.get(claim_id)
+                        if held is not None and held.get("status") == "under_review":
+                            self.stats["held_for_review"] += 1
+                        else:
+                            self.stats["rejected"] += 1
+                        errors.append({**fraud_check, "claim_id": claim_id})
+                        continue
+                    self.system.fraud.record_claim(claim_id, ticket_number, user_id)
+                rail = policy["payment_info"]["payment_method"]
+                self.system.record_event(CLAIM_FILED, [("claims", claim_id, {
+                    "claim_id": claim_id,
+                    "amount": policy["coverage_amount"],
+                    "status": PENDING_PAYOUT,
+                    "payment_rail": rail,
+                    "user_id": user_id,
+                    "ticket_number": ticket_number
+                })])
+                by_rail[rail].append(candidate)
+
+        for rail, rail_claims in by_rail.items():
+            payouts = ClaimsTools.process_payouts(
+                rail, [(c[0], c[3]["coverage_amount"]) for c in rail_claims]
+            )
+            with self.system.storage.transaction():
+                for (claim_id, ticket_number, user_id, policy, _), payout_info in zip(rail_claims, payouts):
+                    self.system.store_payout(claim_id, ticket_number, user_id, payout_info)
+                    if payout_info.get("status") != "success":
+                        self.system.fraud.forget_claim(claim_id, ticket_number)
+                        self.stats["failed"] += 1
+                        errors.append({"claim_id": claim_id, "message": "Payout failed"})
+                        continue
+                    self.stats["paid"] += 1
+                    self.stats["payout_total"] += payout_info["amount"]
+                    self.system.notify_claim_paid(user_id, payout_info["amount"])
+                    self.stats["notifications"] += 1
+        return errors
+
+    def _verify(self, claims: List[Tuple[str, str]], executor: Optional[Executor]) -> List[bool]:
+        if executor is None or not claims:
+            return _verify_chunk(claims)
+        chunk_size = max(1, len(claims) // self.processes)
+        chunks = [claims[i:i + chunk_size] for i in range(0, len(claims), chunk_size)]
+        return [ok for chunk in executor.map(_verify_chunk, chunks) for ok in chunk]
+
+    def _summary(self, start: float) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - start
+        return {
+            **self.stats,
+            "elapsed_seconds": elapsed,
+            "claims_per_second": self.stats["received"] / elapsed if elapsed else 0.0
+        }
+
+    def _report(self, start: float) -> None:
+        if self.progress is not None:
+            self.progress(self._summary(start))
+
+
+if __name__ == "__main__":
+    import sys
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    system = TravelInsuranceSystem()
+    # One traveller per ticket; a single account filing thousands of claims would be held for review
+    user_ids = []
+    for i in range(n):
+        ticket = f"STORM{i}"
+        mac = f"02:00:00:{i >> 16 & 0xFF:02X}:{i >> 8 & 0xFF:02X}:{i & 0xFF:02X}"
+        user_id = system.register_user(f"storm{i}@example.com", mac)["user_id"]
+        user_ids.append(user_id)
+        system.process_flight_purchase(ticket, user_id)
+        system.purchase_insurance(user_id, ticket, i % 3 + 1, "VISA" if i % 2 else "PAYPAL")
+
+    processor = BatchClaimsProcessor(
+        system, batch_size=5000,
+        progress=lambda p: print(f"{p['received']:>8} claims  {p['claims_per_second']:>10,.0f}/s")
+    )
+    claims = ((f"STORM{i}", user_ids[i]) for i in range(n))
+    summary = processor.run(claims)
+    print({k: v for k, v in summary.items() if k != "errors"})
+
+    # Re-running the same event pays nothing twice
+    rerun = BatchClaimsProcessor(system).run((f"STORM{i}", user_ids[i]) for i in range(n))
+    print(f"re-run: paid={rerun['paid']} already_paid={rerun['already_paid']}")
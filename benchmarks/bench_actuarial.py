@@ -0,0 +1,61 @@
+"""Benchmark the portfolio simulator and its claim-count sampler.
+
+Run from the repository root:
+    python -m benchmarks.bench_actuarial
+"""
+
+import time
+
+import numpy as np
+
+from actuarial import PolicyBook, PortfolioSimulator, _draw_counts, claim_count_pmf
+
+POLICIES = 100_000
+ROUTES = 50
+SCENARIOS = [100_000, 1_000_000]
+PLANS = ["SINGLE", "MONTHLY", "FAMILY_TRIP", "ANNUAL_FAMILY"]
+SEASONS = ["winter", "summer"]
+
+
+def synthetic_book(rng: np.random.Generator) -> PolicyBook:
+    return PolicyBook([
+        {
+            "route": f"R{rng.integers(ROUTES)}",
+            "season": SEASONS[i % 2],
+            "plan_type": PLANS[i % 4],
+            "coverage_level": 1 + i % 3,
+            "coverage_amount": float(rng.uniform(100.0, 2000.0)),
+            "premium_amount": 20.0,
+            "ticket_price": 1000.0
+        }
+        for i in range(POLICIES)
+    ])
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(42)
+    book = synthetic_book(rng)
+    probabilities = rng.uniform(0.01, 0.05, len(book.cells))
+
+    # Claim counts for 10k scenarios: one binomial call over (scenario, cell) vs a histogram per cell
+    binomial = timed(rng.binomial, book.count, np.broadcast_to(probabilities, (10_000, len(book.cells))))
+    histogram = timed(lambda: [_draw_counts(rng, claim_count_pmf(int(n), p), 10_000)
+                               for n, p in zip(book.count, probabilities)])
+    print(f"claim counts, 10k scenarios x {len(book.cells)} cells: rng.binomial {binomial:.2f}s, "
+          f"histogram+shuffle {histogram:.2f}s ({binomial / histogram:.1f}x)")
+
+    print(f"\n{len(book)} policies in {len(book.cells)} cells, {len(book.tiers)} tiers")
+    print(f"{'scenarios':>10} {'seconds':>9} {'loss ratio':>11} {'99% CVaR':>12}")
+    for scenarios in SCENARIOS:
+        simulator = PortfolioSimulator(book, shock_probability=0.01, shock_multiplier=5.0, seed=1)
+        start = time.perf_counter()
+        report = simulator.run(scenarios)
+        elapsed = time.perf_counter() - start
+        print(f"{scenarios:>10} {elapsed:>9.2f} {report['expected_loss_ratio']:>11.3f} "
+              f"{report['tail_risk']['0.99']['loss_cvar']:>12.0f}")
@@ -0,0 +1,38 @@
+"""Benchmark bulk premium quoting against the per-ticket loop.
+
+Run from the repository root:
+    python -m benchmarks.bench_bulk_quote
+"""
+
+import time
+
+import numpy as np
+
+from tools import CoverageTools
+
+SIZES = [10_000, 100_000, 1_000_000]
+
+
+def per_ticket(prices, levels):
+    return [CoverageTools.calculate_premium(p, l) for p, l in zip(prices, levels)]
+
+
+def bulk(prices, levels):
+    return CoverageTools.calculate_premiums_bulk(prices, levels)
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(42)
+    print(f"{'tickets':>10} {'loop (s)':>10} {'bulk (s)':>10} {'speedup':>9}")
+    for size in SIZES:
+        prices = rng.uniform(50.0, 5000.0, size)
+        levels = rng.integers(1, 4, size)
+        loop_time = timed(per_ticket, prices.tolist(), levels.tolist())
+        bulk_time = timed(bulk, prices, levels)
+        print(f"{size:>10} {loop_time:>10.4f} {bulk_time:>10.4f} {loop_time / bulk_time:>8.1f}x")
@@ -0,0 +1,77 @@
+"""Benchmark the agent event bus: a flight-purchase burst alongside claims.
+
+A burst of flight_purchase_detected events with a slow (5 ms) handler fills
+the flight agent's queues. Meanwhile claim_submission events are published
+at a steady rate. Because each agent has its own queues and workers, claim
+latency should stay near the claim handler's own cost. The benchmark also
+checks per-user ordering and try_publish backpressure.
+
+Run from the repository root:
+    python -m benchmarks.bench_event_bus
+"""
+
+import asyncio
+import os
+import time
+
+os.environ.setdefault("TRAVEL_INSURANCE_OFFLINE", "1")
+
+from event_bus import EventBus, QueueFullError
+
+BURST = 2000
+CLAIMS = 200
+
+
+async def main() -> None:
+    bus = EventBus(queue_size=4000, workers_per_agent=8)
+    seen = {}
+
+    def flight(ticket_number: str, user_id: str):
+        time.sleep(0.005)
+        seen.setdefault(user_id, []).append(ticket_number)
+
+    def claim(ticket_number: str, user_id: str):
+        return {"status": "success"}
+
+    bus.subscribe("flight_purchase_detected", flight)
+    bus.subscribe("claim_submission", claim)
+    await bus.start()
+
+    burst = [await bus.publish("flight_purchase_detected", ticket_number=f"TK{i}", user_id=f"user{i % 50}")
+             for i in range(BURST)]
+
+    latencies = []
+    for i in range(CLAIMS):
+        start = time.perf_counter()
+        await bus.request("claim_submission", ticket_number=f"TK{i}", user_id=f"claimant{i}")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.001)
+    depth = bus.stats()["flight_verification_agent"]["depth"]
+    await asyncio.gather(*burst)
+
+    latencies.sort()
+    print(f"flight queue depth during claims: {depth}")
+    print(f"claim latency under burst: p50={latencies[len(latencies) // 2] * 1000:.2f} ms "
+          f"p99={latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+    ordered = all(tickets == sorted(tickets, key=lambda t: int(t[2:])) for tickets in seen.values())
+    print(f"per-user order preserved: {ordered}")
+    for agent, stats in bus.stats().items():
+        print(f"  {agent:<26} processed={stats['processed']:5d} "
+              f"queue_wait p50={stats['queue_wait_p50_ms']:.2f} ms p99={stats['queue_wait_p99_ms']:.2f} ms")
+    await bus.stop()
+
+    small = EventBus(queue_size=4, workers_per_agent=1)
+    small.subscribe("flight_purchase_detected", flight)
+    await small.start()
+    rejected = 0
+    for i in range(20):
+        try:
+            small.try_publish("flight_purchase_detected", ticket_number=f"TK{i}", user_id="u")
+        except QueueFullError:
+            rejected += 1
+    print(f"try_publish on a 4-slot queue: {rejected} of 20 rejected")
+    await small.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""Benchmark event log append throughput and recovery time.
+
+Appends N events shaped like the system's (users, flights, policies with
+payments, payouts), then times recovery into fresh in-memory storage twice:
+replaying the whole log, and loading a snapshot taken at 90% plus the tail.
+
+Run from the repository root (N defaults to 1,000,000; try 10000000):
+    python -m benchmarks.bench_event_log [N]
+"""
+
+import sys
+import tempfile
+import threading
+import time
+
+from event_log import (
+    PAYOUT_ISSUED, POLICY_PURCHASED, TICKET_VERIFIED, USER_REGISTERED, EventLog
+)
+from storage import InMemoryStorage
+
+
+def event(i: int):
+    user_id = f"user{i // 4}"
+    ticket = f"TKT{i // 4}"
+    kind = i % 4
+    if kind == 0:
+        return USER_REGISTERED, [("users", user_id, {
+            "user_id": user_id, "mac_address": "00:1A:2B:3C:4D:5E", "email": f"{user_id}@example.com",
+            "2fa": {"2fa_enabled": True, "email": f"{user_id}@example.com"}})]
+    if kind == 1:
+        return TICKET_VERIFIED, [("flights", ticket, {
+            "verified": True, "ticket_number": ticket, "user_id": user_id,
+            "details": {"flight_number": "FL123", "price": 500.0}})]
+    if kind == 2:
+        txn = f"txn{i}"
+        return POLICY_PURCHASED, [
+            ("payments", txn, {"transaction_id": txn, "amount": 50.0, "status": "success", "user_id": user_id}),
+            ("policies", ticket, {"ticket_number": ticket, "user_id": user_id, "transaction_id": txn,
+                                  "coverage_level": 2, "coverage_amount": 500.0, "premium_amount": 50.0,
+                                  "status": "active"})]
+    return PAYOUT_ISSUED, [("claims", f"claim_{ticket}", {
+        "claim_id": f"claim_{ticket}", "amount": 500.0, "status": "success", "user_id": user_id,
+        "ticket_number": ticket})]
+
+
+def recover(directory: str) -> float:
+    log = EventLog(directory)
+    storage = InMemoryStorage()
+    start = time.perf_counter()
+    log.recover(storage)
+    elapsed = time.perf_counter() - start
+    log.close()
+    return elapsed, log.stats["recovered"], len(storage.claims)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    events = [event(i) for i in range(n)]
+    with tempfile.TemporaryDirectory() as tmp:
+        log = EventLog(tmp, snapshot_every=n + 1)
+        start = time.perf_counter()
+        for event_type, writes in events:
+            log.append(event_type, writes)
+        log.flush()
+        elapsed = time.perf_counter() - start
+        print(f"append {n:,} events: {n / elapsed:,.0f}/s in {log.stats['commits']:,} group commits")
+
+        # 20 writers waiting on durable appends share fsyncs
+        durable = 2000
+        start = time.perf_counter()
+        threads = [threading.Thread(target=lambda: [log.append(*events[3], durable=True) for _ in range(durable // 20)])
+                   for _ in range(20)]
+        commits = log.stats["commits"]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        print(f"durable appends from 20 threads: {durable / elapsed:,.0f}/s, "
+              f"{log.stats['commits'] - commits} fsyncs for {durable} events")
+        log.close()
+
+        elapsed, replayed, claims = recover(tmp)
+        print(f"full replay:       {elapsed:6.2f} s for {replayed:,} events ({claims:,} claims)")
+
+        # Snapshot at 90%: rebuild state, snapshot it, then append the last 10% again
+        storage = InMemoryStorage()
+        log = EventLog(tmp)
+        log.recover(storage)
+        log.attach(storage)
+        log.snapshot()
+        for event_type, writes in events[-n // 10:]:
+            log.append(event_type, writes, storage=storage)
+        log.close()
+        elapsed, replayed, claims = recover(tmp)
+        print(f"snapshot + tail:   {elapsed:6.2f} s, replaying {replayed:,} events ({claims:,} claims)")
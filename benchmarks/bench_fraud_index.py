@@ -0,0 +1,49 @@
+"""Benchmark fraud checks against a large claim history.
+
+Loads N historical claims into a FraudIndex, then times check_claim for new
+claims. The cost per check should stay flat as N grows. It also shows a
+duplicate, a shared-device and a burst case being caught.
+
+Run from the repository root:
+    python -m benchmarks.bench_fraud_index
+"""
+
+import time
+
+from fraud import FraudIndex
+
+CHECKS = 100_000
+
+
+def build(n: int) -> FraudIndex:
+    index = FraudIndex()
+    now = time.time()
+    for i in range(n):
+        user_id = f"user{i % (n // 2 + 1)}"
+        if i < n // 2 + 1:
+            index.record_user(user_id, f"02:00:00:{i >> 16 & 255:02X}:{i >> 8 & 255:02X}:{i & 255:02X}")
+        index.record_claim(f"claim_T{i}_{user_id}", f"T{i}", user_id, f"acct{i}", now - (n - i))
+    return index
+
+
+if __name__ == "__main__":
+    for n in (10_000, 100_000, 1_000_000):
+        start = time.perf_counter()
+        index = build(n)
+        load = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(CHECKS):
+            index.check_claim(f"claim_N{i}_user{i}", f"N{i}", f"user{i}", f"acct{i}")
+        per_check = (time.perf_counter() - start) / CHECKS
+        print(f"{n:>9,} claims: load {load:6.2f} s, {per_check * 1e6:5.2f} us/check")
+
+    index = FraudIndex()
+    for i in range(5):
+        index.record_user(f"u{i}", "00:1A:2B:3C:4D:5E")
+    index.record_user("solo", "AA:BB:CC:DD:EE:FF")
+    index.record_claim("claim_T1_u0", "T1", "u0")
+    for i in range(3):
+        index.record_claim(f"claim_B{i}_solo", f"B{i}", "solo")
+    print("duplicate ticket:", index.check_claim("claim_T1_u1", "T1", "u1").to_dict())
+    print("shared device:   ", index.check_claim("claim_T2_u1", "T2", "u1").to_dict())
+    print("claim burst:     ", index.check_claim("claim_B3_solo", "B3", "solo").to_dict())
@@ -0,0 +1,95 @@
+"""Benchmark the pooled HTTP client against a local stub server.
+
+Starts an in-process HTTP/1.1 stub of the airline, payment and notification
+APIs, then compares one-connection-per-call requests with the shared pooled
+client, and exercises retries and the circuit breaker.
+
+Run from the repository root:
+    python -m benchmarks.bench_http_client
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+import requests
+
+from http_client import CircuitOpenError, PooledHTTPClient
+from tools import FlightVerificationTools, PaymentTools
+
+N = 2000
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    fail_next = 0
+
+    def _reply(self, status: int, body) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if StubHandler.fail_next > 0:
+            StubHandler.fail_next -= 1
+            return self._reply(503, {"error": "unavailable"})
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if parts[0] != "tickets" or parts[1].startswith("UNKNOWN"):
+            return self._reply(404, {"error": "not found"})
+        if len(parts) == 3:
+            return self._reply(200, {"ticket_number": parts[1], "status": "verified"})
+        return self._reply(200, {"ticket_number": parts[1], "price": 1000.0,
+                                 "departure": "2024-03-20", "arrival": "2024-03-21"})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self._reply(200, {**payload, "status": "success"})
+
+    def log_message(self, *args):
+        pass
+
+
+def run(label: str, fn, workers: int = 8) -> None:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(fn, range(N)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {N / elapsed:>10,.0f} req/s")
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    run("new connection per call", lambda i: requests.get(f"{base}/tickets/T{i}").json())
+
+    client = PooledHTTPClient(pool_maxsize=8, backoff_base=0.01)
+    run("pooled keep-alive client", lambda i: client.get_json(f"{base}/tickets/T{i}"))
+    print(json.dumps(client.stats(), indent=2))
+
+    # Tools route through the shared client once an endpoint is configured
+    FlightVerificationTools.api_url = base
+    PaymentTools.api_url = base
+    print(FlightVerificationTools.extract_ticket_details("ABC123"))
+    print(FlightVerificationTools.extract_ticket_details("UNKNOWN1"))
+    print(PaymentTools.process_payment(20.0, "VISA", "user-1"))
+
+    StubHandler.fail_next = 2
+    client.get_json(f"{base}/tickets/RETRY")
+    print(f"recovered after {client.stats()['retries']} retries")
+
+    breaker_client = PooledHTTPClient(max_retries=0, failure_threshold=3, reset_timeout=60)
+    StubHandler.fail_next = 10
+    for _ in range(5):
+        try:
+            breaker_client.request("GET", f"{base}/tickets/T1")
+        except CircuitOpenError as e:
+            print(e)
+    server.shutdown()
@@ -0,0 +1,32 @@
+"""Measure the per-call cost of metrics instrumentation.
+
+Run from the repository root:
+    python -m benchmarks.bench_metrics
+"""
+
+import time
+
+from metrics import MetricsRegistry
+
+N = 1_000_000
+
+
+def noop(x):
+    return x
+
+
+def per_call_ns(fn) -> float:
+    start = time.perf_counter_ns()
+    for i in range(N):
+        fn(i)
+    return (time.perf_counter_ns() - start) / N
+
+
+if __name__ == "__main__":
+    registry = MetricsRegistry()
+    bare = per_call_ns(noop)
+    instrumented = per_call_ns(registry.wrap("bench.noop", noop))
+    print(f"bare call          {bare:8.1f} ns")
+    print(f"instrumented call  {instrumented:8.1f} ns")
+    print(f"recording cost     {(instrumented - bare) / 1000:8.3f} us/call")
+    print(registry.snapshot()["bench.noop"])
@@ -0,0 +1,96 @@
+"""Benchmark claim latency and notification throughput.
+
+Compares process_claim when each notification is sent inline on a gateway
+with a 20 ms round trip against the dispatcher, where the claim only queues
+it. It then pushes N messages through the dispatcher and reports delivery
+throughput, and shows retries, dead-lettering and outbox recovery.
+
+Run from the repository root:
+    python -m benchmarks.bench_notifications
+"""
+
+import os
+import statistics
+import tempfile
+import time
+
+from main import TravelInsuranceSystem
+from notifications import CLAIM_PAID, EMAIL, NotificationDispatcher, StubGateway
+
+GATEWAY_LATENCY = 0.02
+CLAIMS = 200
+N = 100_000
+
+
+def claim_latencies(system: TravelInsuranceSystem, user_id: str, prefix: str):
+    tickets = [f"{prefix}{i}" for i in range(CLAIMS)]
+    for ticket in tickets:
+        system.process_flight_purchase(ticket, user_id)
+        system.purchase_insurance(user_id, ticket, 1, "VISA")
+    latencies = []
+    for ticket in tickets:
+        start = time.perf_counter()
+        system.process_claim(ticket, user_id)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+class InlineNotifier:
+    """The old behaviour: deliver before returning."""
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+
+    def send(self, kind, recipient, channel=EMAIL, **fields):
+        self.gateway.send_batch(channel, [{"recipient": recipient, "ids": ["inline"], "messages": [kind]}])
+        return "inline"
+
+
+if __name__ == "__main__":
+    for label, notifier in (
+        ("inline", InlineNotifier(StubGateway(GATEWAY_LATENCY))),
+        ("dispatcher", NotificationDispatcher({EMAIL: StubGateway(GATEWAY_LATENCY)}))
+    ):
+        system = TravelInsuranceSystem(notifications=notifier)
+        user_id = system.register_user(f"{label}@example.com", "00:1A:2B:3C:4D:5E")["user_id"]
+        # Few claims per account would otherwise trip the velocity check
+        system.fraud.user_claim_limit = system.fraud.mac_claim_limit = CLAIMS + 1
+        latencies = sorted(claim_latencies(system, user_id, label.upper()))
+        print(f"process_claim, {label:<10} p50 {statistics.median(latencies) * 1e3:6.2f} ms   "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:6.2f} ms")
+
+    gateway = StubGateway(GATEWAY_LATENCY)
+    dispatcher = NotificationDispatcher({EMAIL: gateway})
+    start = time.perf_counter()
+    for i in range(N):
+        dispatcher.send(CLAIM_PAID, f"user{i % 20_000}@example.com", amount=float(i % 3 * 100 + 200))
+    queued = time.perf_counter() - start
+    dispatcher.drain()
+    elapsed = time.perf_counter() - start
+    stats = dispatcher.throughput()
+    print(f"{N:,} messages: queued at {N / queued:,.0f}/s, delivered at {N / elapsed:,.0f}/s "
+          f"in {gateway.batches} gateway calls, {stats['deliveries']:,} deliveries, "
+          f"delivery p99 {stats['delivery_p99_ms']:.0f} ms")
+    dispatcher.shutdown()
+
+    flaky = NotificationDispatcher({EMAIL: StubGateway(fail_recipients=("bounce@example.com",))},
+                                   max_attempts=3, retry_delay=0.01)
+    flaky.send(CLAIM_PAID, "bounce@example.com", amount=300.0)
+    flaky.send(CLAIM_PAID, "ok@example.com", amount=300.0)
+    flaky.drain()
+    print(f"retries: {flaky.throughput()['retried']}, dead letters: "
+          f"{[m['recipient'] for m in flaky.dead_letters]}")
+    flaky.shutdown()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "outbox.jsonl")
+        down = NotificationDispatcher({EMAIL: StubGateway(latency=2)}, outbox_path=path, flush_interval=0)
+        for i in range(5):
+            down.send(CLAIM_PAID, f"crash{i}@example.com", amount=100.0)
+        time.sleep(0.05)
+        # Simulate a crash: the gateway call never returns and the process restarts
+        restarted = NotificationDispatcher({EMAIL: StubGateway()}, outbox_path=path)
+        restarted.drain()
+        print(f"outbox recovery: {restarted.throughput()['recovered']} recovered, "
+              f"{restarted.throughput()['sent']} sent after restart")
+        restarted.shutdown()
@@ -0,0 +1,41 @@
+"""Micro-benchmark of quotes/second for the compiled pricing engine.
+
+Run from the repository root:
+    python -m benchmarks.bench_pricing_engine
+"""
+
+import time
+
+from pricing_engine import PricingEngine
+from tools import CoverageTools
+
+N = 1_000_000
+
+
+def dict_literal_quote(ticket_price: float, coverage_level: int):
+    # The per-call dict construction that calculate_premium used before the engine
+    coverage_percentages = {1: 0.5, 2: 0.75, 3: 1.0}
+    premium_percentages = {1: 0.01, 2: 0.02, 3: 0.03}
+    return (ticket_price * coverage_percentages[coverage_level],
+            ticket_price * premium_percentages[coverage_level],
+            coverage_percentages[coverage_level] * 100)
+
+
+def run(name: str, fn) -> None:
+    start = time.perf_counter()
+    for i in range(N):
+        fn(250.0 + i % 1000, i % 3 + 1)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {N / elapsed:>14,.0f} quotes/s")
+
+
+if __name__ == "__main__":
+    engine = PricingEngine()
+    run("dict literals per call", dict_literal_quote)
+    run("PricingEngine.quote", engine.quote)
+    run("CoverageTools.calculate_premium", CoverageTools.calculate_premium)
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        engine.reload()
+    print(f"{'reload + compile':<28} {(time.perf_counter() - start) * 1000:>14.3f} us/reload")
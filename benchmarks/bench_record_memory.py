@@ -0,0 +1,74 @@
+"""Memory per policy for dict records, slotted records and the columnar store.
+
+Run from the repository root:
+    python -m benchmarks.bench_record_memory [num_policies]
+"""
+
+import sys
+import tracemalloc
+import uuid
+
+from records import Policy, PolicyColumnStore
+from storage import SCHEMA, InMemoryTable
+
+USERS = 10_000
+
+
+def make_records(n: int):
+    users = [str(uuid.uuid4()) for _ in range(USERS)]
+    for i in range(n):
+        transaction_id = str(uuid.uuid4())
+        premium = 10.0 + i % 100
+        payment_info = {"transaction_id": transaction_id, "amount": premium,
+                        "payment_method": "VISA", "status": "success"}
+        yield f"TKT{i:09d}", {
+            "user_id": users[i % USERS],
+            "transaction_id": transaction_id,
+            "coverage_level": i % 3 + 1,
+            "plan_type": "SINGLE",
+            "coverage_amount": premium * 50,
+            "premium_amount": premium,
+            "payment_info": payment_info
+        }
+
+
+def measure(label: str, n: int, build) -> None:
+    records = list(make_records(n))
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    table = build(records)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Keys and ID strings are shared inputs, so only container overhead is counted
+    print(f"{label:<22} {(after - before) / n:>8.1f} bytes/policy")
+    del table
+
+
+def as_dicts(records):
+    return {ticket: {**record, "payment_info": dict(record["payment_info"])} for ticket, record in records}
+
+
+def as_indexed_dicts(records):
+    table = InMemoryTable("policies", SCHEMA["policies"])
+    for ticket, record in records:
+        table[ticket] = {**record, "payment_info": dict(record["payment_info"])}
+    return table
+
+
+def as_slotted(records):
+    return {ticket: Policy.from_dict(ticket, record) for ticket, record in records}
+
+
+def as_columns(records):
+    store = PolicyColumnStore()
+    for ticket, record in records:
+        store[ticket] = record
+    return store
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    measure("nested dicts", n, as_dicts)
+    measure("slotted Policy", n, as_slotted)
+    measure("InMemoryTable+indexes", n, as_indexed_dicts)
+    measure("PolicyColumnStore", n, as_columns)
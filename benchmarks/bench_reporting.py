@@ -0,0 +1,34 @@
+"""Benchmark report generation against the number of recorded events.
+
+Feeds N registrations, purchases and claims into ReportingAggregates, then
+times snapshot(). A snapshot reads counters and fixed-size rollup rings, so
+it should cost the same at every N. The per-event update cost is printed too.
+
+Run from the repository root:
+    python -m benchmarks.bench_reporting
+"""
+
+import time
+
+from reporting import ReportingAggregates
+
+SNAPSHOTS = 2000
+
+
+if __name__ == "__main__":
+    for n in (10_000, 100_000, 1_000_000):
+        reports = ReportingAggregates()
+        start = time.perf_counter()
+        for i in range(n):
+            reports.record_registration()
+            policy = {"coverage_level": i % 3 + 1, "plan_type": "SINGLE", "status": "active"}
+            reports.record_policy(policy["coverage_level"], "SINGLE", 20.0)
+            if i % 10 == 0:
+                reports.record_claim(750.0, policy)
+        per_event = (time.perf_counter() - start) / (n * 2.1)
+        start = time.perf_counter()
+        for _ in range(SNAPSHOTS):
+            snapshot = reports.snapshot()
+        per_report = (time.perf_counter() - start) / SNAPSHOTS
+        print(f"{n:>9,} users: {per_event * 1e6:5.2f} us/event update, {per_report * 1e6:7.1f} us/report "
+              f"(active={snapshot['active_policies']}, loss_ratio={snapshot['loss_ratio']:.3f})")
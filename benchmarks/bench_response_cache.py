@@ -0,0 +1,68 @@
+"""Benchmark the agent response cache on near-duplicate claim descriptions.
+
+Feeds claim-triage prompts drawn from a small set of templates, with varied
+case, spacing and punctuation, through the cache in front of a fake model.
+It reports exact-tier and similarity-tier hit rates and lookup latency, then
+reopens the disk store to check that entries survive a restart.
+
+Run from the repository root:
+    python -m benchmarks.bench_response_cache
+"""
+
+import os
+import random
+import tempfile
+import time
+
+from response_cache import HashingEmbedder, ResponseCache
+
+N = 5000
+TEMPLATES = [
+    "My flight {n} was cancelled and I had to book a hotel",
+    "Flight {n} delayed more than six hours, requesting compensation",
+    "Baggage lost on flight {n}, bag never arrived at destination",
+    "Missed connection after flight {n} was late",
+]
+
+
+def prompts(rng: random.Random):
+    for _ in range(N):
+        text = rng.choice(TEMPLATES).format(n=rng.randint(100, 140))
+        if rng.random() < 0.5:
+            text = text.upper()
+        if rng.random() < 0.5:
+            text = "  " + text.replace(" ", "  ") + "!!"
+        if rng.random() < 0.3:
+            text = "Please help: " + text
+        yield text
+
+
+def run(cache: ResponseCache) -> float:
+    model_calls = 0
+
+    def generate(prompt: str) -> str:
+        nonlocal model_calls
+        model_calls += 1
+        return f"triage: {prompt[:40]}"
+
+    start = time.perf_counter()
+    for prompt in prompts(random.Random(7)):
+        cache.get_or_generate(prompt, "claims_model", generate, agent="claims")
+    elapsed = time.perf_counter() - start
+    stats = cache.stats()["agents"]["claims"]
+    print(f"  model calls={model_calls:5d}  hits={stats['hits']:5d}  similar_hits={stats['similar_hits']:5d}"
+          f"  hit_rate={stats['hit_rate']:.1%}  {elapsed / N * 1e6:6.1f} us/lookup")
+    return elapsed
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "responses.bin")
+        print("exact tier:")
+        run(ResponseCache(path=path))
+        print("exact + similarity tier (threshold 0.9):")
+        run(ResponseCache(embedder=HashingEmbedder(), similarity_threshold=0.9))
+
+        reopened = ResponseCache(path=path)
+        print(f"after restart: {reopened.stats()['size']} entries, {reopened.stats()['disk_bytes']} bytes on disk")
+        reopened.close()
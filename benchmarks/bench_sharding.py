@@ -0,0 +1,57 @@
+"""Benchmark the sharded system: throughput by shard count and rebalancing.
+
+Each client thread runs register -> flight purchase -> insurance purchase
+sequences. The single in-process TravelInsuranceSystem is the baseline.
+Throughput only scales with shard count up to the number of cores, so run it
+on a multi-core machine. Finally, a shard is added under a live population
+and the benchmark reports how many users moved.
+
+Run from the repository root:
+    python -m benchmarks.bench_sharding
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+os.environ.setdefault("TRAVEL_INSURANCE_OFFLINE", "1")
+
+from main import TravelInsuranceSystem
+from payment_engine import PaymentEngine
+from sharding import ShardedTravelInsuranceSystem
+
+USERS = 3000
+CLIENTS = 32
+
+
+def workload(system, start: int, count: int) -> None:
+    for i in range(start, start + count):
+        user_id = system.register_user(f"user{i}@example.com", "00:1A:2B:3C:4D:5E")["user_id"]
+        system.process_flight_purchase(f"TK{i}", user_id)
+        system.purchase_insurance(user_id, f"TK{i}", 2, "VISA")
+
+
+def throughput(system) -> float:
+    per_client = USERS // CLIENTS
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as pool:
+        for future in [pool.submit(workload, system, c * per_client, per_client) for c in range(CLIENTS)]:
+            future.result()
+    return per_client * CLIENTS * 3 / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    print(f"cores: {os.cpu_count()}")
+    print(f"in-process: {throughput(TravelInsuranceSystem(payments=PaymentEngine())):8.0f} ops/s")
+    for shards in sorted({1, 2, 4, os.cpu_count() or 1}):
+        system = ShardedTravelInsuranceSystem(shards=shards)
+        print(f"{shards:2d} shard(s): {throughput(system):8.0f} ops/s")
+        system.close()
+
+    system = ShardedTravelInsuranceSystem(shards=3)
+    workload(system, 0, USERS)
+    before = system.shard_sizes()
+    moved = system.add_shard()
+    print(f"rebalance 3 -> 4 shards: {before} -> moved {sum(moved.values())} of {USERS} users, "
+          f"now {system.shard_sizes()}")
+    system.close()
@@ -0,0 +1,50 @@
+"""Startup benchmark: import time and first-request latency.
+
+Each measurement runs in a fresh interpreter. "eager" builds the four Gemini
+model clients at startup, which is what importing main.py used to do; this
+needs google-generativeai installed but makes no network calls. "lazy" builds
+nothing until it is used.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+RUNS = 5
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import main, agents, auth_agent, payment_agent, claims_agent, monitoring_agent
+from agent_registry import registry
+if sys.argv[1] == "eager":
+    registry.preload(key for key in registry.keys() if key.endswith("_model"))
+t1 = time.perf_counter()
+agents.calculate_coverage(1000.0, 2)
+t2 = time.perf_counter()
+system = main.TravelInsuranceSystem()
+system.register_user("user@example.com", "00:1A:2B:3C:4D:5E")
+t3 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "first_quote_ms": (t2 - t1) * 1000,
+                  "first_request_ms": (t3 - t2) * 1000}))
+"""
+
+
+def measure(mode: str) -> dict:
+    env = {**os.environ, "TRAVEL_INSURANCE_OFFLINE": "", "GOOGLE_API_KEY": "benchmark"}
+    samples = []
+    for _ in range(RUNS):
+        out = subprocess.run([sys.executable, "-c", PROBE, mode], env=env,
+                             capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(out))
+    return {key: sorted(s[key] for s in samples)[RUNS // 2] for key in samples[0]}
+
+
+if __name__ == "__main__":
+    for mode in ("eager", "lazy"):
+        result = measure(mode)
+        print(f"{mode:<6} " + "  ".join(f"{k}={v:8.2f}" for k, v in result.items()))
@@ -0,0 +1,51 @@
+"""Benchmark policy writes and indexed lookups for each storage backend.
+
+Run from the repository root:
+    python -m benchmarks.bench_storage [num_policies]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from storage import InMemoryStorage, SQLiteStorage
+
+
+def bench(name: str, storage, n: int) -> None:
+    start = time.perf_counter()
+    with storage.transaction():
+        for i in range(n):
+            storage.policies[f"TKT{i}"] = {
+                "user_id": f"user{i % (n // 4 or 1)}",
+                "transaction_id": f"txn{i}",
+                "coverage_level": i % 3 + 1,
+                "coverage_amount": 500.0,
+                "premium_amount": 10.0
+            }
+    write_time = time.perf_counter() - start
+
+    keys = [random.randrange(n) for _ in range(10_000)]
+    start = time.perf_counter()
+    for i in keys:
+        storage.policies[f"TKT{i}"]
+    get_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in keys:
+        storage.policies.find_by("user_id", f"user{i % (n // 4 or 1)}")
+    find_time = time.perf_counter() - start
+
+    print(f"{name:<10} writes {n / write_time:>12,.0f}/s   "
+          f"get {len(keys) / get_time:>10,.0f}/s   "
+          f"find_by(user_id) {len(keys) / find_time:>10,.0f}/s")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    bench("memory", InMemoryStorage(), n)
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SQLiteStorage(os.path.join(tmp, "bench.db"))
+        bench("sqlite", storage, n)
+        storage.close()
@@ -0,0 +1,69 @@
+"""Benchmark subscription renewals and trip-quota checks.
+
+Seeds storage with subscriptions spread evenly over a month, as if the process
+had restarted with them on record. It then compares finding one day's due
+renewals by full scan with popping them from the scheduler's heap, charges
+them in batches, and times use_trip.
+
+Run from the repository root:
+    python -m benchmarks.bench_subscriptions
+"""
+
+import time
+
+from main import TravelInsuranceSystem
+from payment_engine import PaymentEngine
+from reporting import ReportingAggregates
+from subscriptions import ACTIVE, SubscriptionScheduler
+
+SUBSCRIPTIONS = 300_000
+MONTH = 30 * 86_400.0
+DAY = 86_400.0
+NOW = 1_700_000_000.0
+
+
+def seed(system: TravelInsuranceSystem) -> None:
+    records = {}
+    for i in range(SUBSCRIPTIONS):
+        started = NOW - MONTH + MONTH * i / SUBSCRIPTIONS
+        sub_id = f"sub_{i}"
+        records[sub_id] = {
+            "subscription_id": sub_id, "user_id": f"user_{i}", "plan_type": "MONTHLY",
+            "payment_method": ("VISA", "MASTERCARD", "AMEX", "PAYPAL")[i % 4], "status": ACTIVE,
+            "started_at": started, "periods_billed": 1, "paid_through": started + MONTH,
+            "next_charge_at": started + MONTH, "monthly_fee": 15.0, "trips_per_month": 1,
+            "trips_used": 0, "failures": 0, "transaction_id": f"txn_{i}",
+            "payment_info": {"transaction_id": f"txn_{i}", "amount": 15.0, "status": "success"}
+        }
+    system.storage.subscriptions.load(records)
+
+
+if __name__ == "__main__":
+    system = TravelInsuranceSystem(payments=PaymentEngine(), reports=ReportingAggregates())
+    seed(system)
+    start = time.perf_counter()
+    system.subscriptions = SubscriptionScheduler(system, clock=lambda: NOW + DAY)
+    print(f"load {SUBSCRIPTIONS} subscriptions: {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    scanned = [r for r in system.storage.subscriptions.values()
+               if r["next_charge_at"] is not None and r["next_charge_at"] <= NOW + DAY]
+    scan = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = system.subscriptions.run_due()
+    elapsed = time.perf_counter() - start
+    print(f"one day's renewals ({len(scanned)} due): full scan to find them {scan * 1000:.1f} ms; "
+          f"heap pop + batched charges + writes {elapsed:.2f}s ({result['renewed'] / elapsed:,.0f} renewals/s)")
+
+    start = time.perf_counter()
+    system.subscriptions.run_due()
+    print(f"run_due with nothing due: {(time.perf_counter() - start) * 1e6:.0f} us")
+
+    users = [f"user_{i}" for i in range(0, SUBSCRIPTIONS, 3)]
+    start = time.perf_counter()
+    granted = sum(system.subscriptions.use_trip(user_id, "MONTHLY")["status"] == "success" for user_id in users)
+    elapsed = time.perf_counter() - start
+    print(f"use_trip: {len(users) / elapsed:,.0f} checks/s ({elapsed / len(users) * 1e6:.1f} us each, "
+          f"{granted} granted)")
+    system.payments.shutdown()
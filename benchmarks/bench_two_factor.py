@@ -0,0 +1,56 @@
+"""Benchmark 2FA code issue and verify throughput during a login storm.
+
+Issues and verifies a code for each of N users, in memory and with the
+SQLite backend, and compares with the old random.randint / == helpers.
+Also shows the rate limit, attempt limit and expiry at work.
+
+Run from the repository root:
+    python -m benchmarks.bench_two_factor
+"""
+
+import os
+import random
+import tempfile
+import time
+
+from two_factor import SQLiteCodeBackend, TwoFactorService
+
+N = 200_000
+
+
+def storm(service: TwoFactorService, n: int) -> float:
+    start = time.perf_counter()
+    codes = [service.issue(f"user{i}")["code"] for i in range(n)]
+    for i, code in enumerate(codes):
+        assert service.verify(f"user{i}", code)["status"] == "success"
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    for i in range(N):
+        code = str(random.randint(100000, 999999))
+        assert code == str(code)
+    legacy = time.perf_counter() - start
+    print(f"randint + ==    {N / legacy * 60:>14,.0f} logins/min (no storage, expiry or limits)")
+
+    elapsed = storm(TwoFactorService(), N)
+    print(f"in-memory       {N / elapsed * 60:>14,.0f} logins/min")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SQLiteCodeBackend(os.path.join(tmp, "codes.db"))
+        elapsed = storm(TwoFactorService(backend=backend), N // 4)
+        print(f"SQLite backend  {N // 4 / elapsed * 60:>14,.0f} logins/min")
+        backend.close()
+
+    now = [0.0]
+    service = TwoFactorService(clock=lambda: now[0])
+    print("rate limit:   ", [service.issue("storm")["status"] for _ in range(6)])
+    service.issue("guess")
+    print("attempt limit:", [service.verify("guess", "x")["message"] for _ in range(5)][-1])
+    code = service.issue("late")["code"]
+    now[0] += 301
+    print("expiry:       ", service.verify("late", code)["message"])
+    now[0] += 900
+    service.issue("someone")
+    print("after eviction, live codes:", service.active_codes())
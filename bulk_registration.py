@@ -0,0 +1,130 @@
+"""Bulk user registration for corporate onboarding exports.
+
+Rows of (email, mac_address) are read from any iterable, such as
+``read_csv`` over an HR export, and handled in fixed-size batches:
+
+- MAC addresses are validated in one vectorized pass per batch
+- emails are normalized the way register_user stores them, and duplicates
+  are caught via the users table's email index plus the emails already
+  seen in this import
+- duplicate devices are caught via the fraud index's MAC -> accounts map
+  plus the MACs already seen in this import
+- 2FA state is created for the whole batch at once, and the batch's users
+  are written in a single storage transaction
+
+Rejected rows are reported with their 1-based row number; the rest of the
+batch is still registered.
+"""
+
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Tuple
+import csv
+import time
+
+from fraud import normalize_mac
+from main import TravelInsuranceSystem
+from tools import UserVettingTools, batched, normalize_email
+
+
+def read_csv(path: str, email_column: str = "email",
+             mac_column: str = "mac_address") -> Iterator[Tuple[str, str]]:
+    """Stream (email, mac_address) rows from a CSV file with a header line."""
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            yield (row.get(email_column) or "").strip(), (row.get(mac_column) or "").strip()
+
+
+class BulkRegistrationImporter:
+    """Register a stream of users against a TravelInsuranceSystem."""
+
+    def __init__(self, system: TravelInsuranceSystem, batch_size: int = 5000,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.system = system
+        self.batch_size = batch_size
+        self.progress = progress
+        self._emails = set()
+        self._macs = set()
+        self._row = 0
+        self.stats = {
+            "received": 0,
+            "registered": 0,
+            "invalid_mac": 0,
+            "duplicate_email": 0,
+            "duplicate_mac": 0
+        }
+
+    def run(self, rows: Iterable[Tuple[str, str]]) -> Dict[str, Any]:
+        """Register every row and return summary statistics."""
+        start = time.perf_counter()
+        errors: List[Dict[str, Any]] = []
+        for batch in batched(rows, self.batch_size):
+            errors.extend(self._process_batch(batch))
+            self._report(start)
+
+        return {
+            "status": "success" if not errors else "partial",
+            **self._summary(start),
+            "errors": errors
+        }
+
+    def _process_batch(self, batch: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        self.stats["received"] += len(batch)
+        errors = []
+        accepted = []  # (email, mac_address)
+        valid = UserVettingTools.verify_mac_addresses([mac for _, mac in batch])
+
+        for (email, mac_address), ok in zip(batch, valid):
+            self._row += 1
+            if not ok:
+                self.stats["invalid_mac"] += 1
+                errors.append({"row": self._row, "email": email, "message": "Invalid MAC address"})
+                continue
+            email_key = normalize_email(email)
+            if email_key in self._emails or self.system.user_data.find_by("email", email_key):
+                self.stats["duplicate_email"] += 1
+                errors.append({"row": self._row, "email": email, "message": "Email already registered"})
+                continue
+            mac_key = normalize_mac(mac_address)
+            if mac_key in self._macs or self.system.fraud.accounts_for_mac(mac_key):
+                self.stats["duplicate_mac"] += 1
+                errors.append({"row": self._row, "email": email, "message": "Device already registered"})
+                continue
+            self._emails.add(email_key)
+            self._macs.add(mac_key)
+            accepted.append((email, mac_address))
+
+        two_fa = UserVettingTools.setup_2fa_bulk([email for email, _ in accepted])
+        with self.system.storage.transaction():
+            for (email, mac_address), two_fa_info in zip(accepted, two_fa):
+                self.system.store_user(UserVettingTools.register_user(email, mac_address), two_fa_info)
+        self.stats["registered"] += len(accepted)
+        return errors
+
+    def _summary(self, start: float) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - start
+        return {
+            **self.stats,
+            "elapsed_seconds": elapsed,
+            "rows_per_second": self.stats["received"] / elapsed if elapsed else 0.0
+        }
+
+    def _report(self, start: float) -> None:
+        if self.progress is not None:
+            self.progress(self._summary(start))
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and not sys.argv[1].isdigit():
+        rows = read_csv(sys.argv[1])
+    else:
+        n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+        rows = ((f"employee{i}@corp.example.com", ":".join(f"{b:02X}" for b in i.to_bytes(6, "big")))
+                for i in range(n))
+
+    importer = BulkRegistrationImporter(
+        TravelInsuranceSystem(),
+        progress=lambda p: print(f"{p['received']:>8} rows  {p['rows_per_second']:>10,.0f}/s")
+    )
+    summary = importer.run(rows)
+    print({k: v for k, v in summary.items() if k != "errors"})
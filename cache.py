@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Hashable
+import threading
+import time
+
+
+class _InFlight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Bounded LRU cache with TTL expiry, negative caching and single-flight loads.
+
+    Values for which ``is_negative(value)`` is true (e.g. an unknown ticket) are
+    cached for ``negative_ttl`` instead of ``ttl``. Concurrent misses for the
+    same key share a single call to the loader. Loader exceptions are not cached.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300.0, negative_ttl: float = 30.0,
+                 is_negative: Callable[[Any], bool] = lambda value: value is None,
+                 clock: Callable[[], float] = time.monotonic):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.is_negative = is_negative
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._in_flight: Dict[Hashable, _InFlight] = {}
+        self._stats = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "load_errors": 0
+        }
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached value for ``key``, calling ``loader`` on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > self._clock():
+                    self._entries.move_to_end(key)
+                    self._stats["negative_hits" if self.is_negative(entry[1]) else "hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+            call = self._in_flight.get(key)
+            if call is not None:
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                call = self._in_flight[key] = _InFlight()
+                self._stats["misses"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = loader()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._stats["load_errors"] += 1
+            raise
+        else:
+            self.put(key, call.value)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+        return call.value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        ttl = self.negative_ttl if self.is_negative(value) else self.ttl
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters suitable for scraping; ``hit_rate`` counts negative hits as hits."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            stats["maxsize"] = self.maxsize
+        lookups = stats["hits"] + stats["negative_hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["negative_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -1,11 +1,19 @@
-from google.generativeai import GenerativeModel
-import google.generativeai as genai
+from concurrent.futures import Future
+from typing import List, Tuple
 
-# Configure the Gemini API
-genai.configure(api_key="YOUR_API_KEY")  # Replace with your actual API key
+from agent_registry import registry
+from llm_scheduler import get_scheduler
+from notifications import get_notifier
 
-# Create the claims agent
-agent = GenerativeModel('gemini-pro')
+# Register the claims agent; the Gemini client is configured from
+# GOOGLE_API_KEY and the model is created on first use of ``agent``
+registry.register_model("claims_model", "gemini-pro")
+
+
+def __getattr__(name: str):
+    if name == "agent":
+        return registry.get("claims_model")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def verify_claim(claim_id: str, user_id: str) -> dict:
     """Verify a claim."""
@@ -16,6 +24,16 @@ def verify_claim(claim_id: str, user_id: str) -> dict:
         "user_id": user_id
     }
 
+def triage_claim(claim_id: str, description: str) -> Future:
+    """Queue a claim for model triage at claims priority; resolves to the model's text."""
+    prompt = f"Triage travel insurance claim {claim_id}. Description: {description}"
+    return get_scheduler().submit(prompt, "claims_model", priority="claims")
+
+def triage_claims(claims: List[Tuple[str, str]]) -> List[str]:
+    """Triage (claim_id, description) pairs; concurrent prompts share model calls."""
+    futures = [triage_claim(claim_id, description) for claim_id, description in claims]
+    return [future.result() for future in futures]
+
 def process_payout(claim_id: str, amount: float) -> dict:
     """Process a claim payout."""
     # In a real implementation, this would integrate with a payment processor
@@ -26,7 +44,6 @@ def process_payout(claim_id: str, amount: float) -> dict:
     }
 
 def notify_user(email: str, message: str) -> bool:
-    """Send notification to user."""
-    # In a real implementation, this would send an email or SMS
-    print(f"Sending notification to {email}: {message}")
+    """Queue a notification to the user; delivery is batched in the background."""
+    get_notifier().send_message(email, message)
     return True 
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""In-process event bus for the ``on_event`` triggers declared in agents.py.
+
+Each event type routes to the agent that declares it. Every agent has its
+own worker lanes: bounded asyncio queues, each drained by one worker task.
+Sync handlers run on the agent's own thread pool, so a burst of flight
+purchases can fill the flight agent's queues without delaying claims.
+
+Events for the same user go to the same lane of an agent, so one agent
+handles them in publish order. The user is taken from the payload's
+``user_id`` or ``email``, or can be given as ``ordering_key``. Nothing
+orders events across agents, so publishers that depend on an earlier result
+should await it first.
+``publish`` waits for queue space (backpressure). ``try_publish`` raises
+``QueueFullError`` instead.
+
+Queue wait and handler latency are recorded in the metrics registry as
+``bus.<agent>.queue_wait`` and ``bus.<agent>.<event>``. The queue wait's
+in-flight gauge is the agent's queue depth.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional
+import asyncio
+import time
+import zlib
+
+from agent_registry import registry
+from agents import AGENT_NAMES
+from metrics import MetricsRegistry, metrics
+
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_WORKERS = 4
+
+
+class QueueFullError(Exception):
+    """The target agent's queue is full."""
+
+    def __init__(self, agent: str):
+        super().__init__(f"Event queue for {agent} is full")
+        self.agent = agent
+
+
+class UnroutedEventError(Exception):
+    """No agent declares the event, or no handler is subscribed to it."""
+
+
+class Event:
+    __slots__ = ("type", "payload", "user_key", "enqueued_at", "future")
+
+    def __init__(self, event_type: str, payload: Dict[str, Any], user_key: str, future: asyncio.Future):
+        self.type = event_type
+        self.payload = payload
+        self.user_key = user_key
+        self.enqueued_at = time.perf_counter()
+        self.future = future
+
+
+def routes_from_registry(agent_keys=AGENT_NAMES) -> Dict[str, str]:
+    """Map each declared ``on_event`` trigger to its agent key."""
+    return {
+        event_type: key
+        for key in agent_keys
+        for event_type in registry.spec(key).get("on_event", [])
+    }
+
+
+class _AgentLanes:
+    def __init__(self, agent: str, lanes: int, queue_size: int, metrics_registry: MetricsRegistry):
+        self.agent = agent
+        self.queues = [asyncio.Queue(max(1, queue_size // lanes)) for _ in range(lanes)]
+        self.executor = ThreadPoolExecutor(lanes, thread_name_prefix=f"bus-{agent}")
+        self.queue_wait = metrics_registry.operation(f"bus.{agent}.queue_wait")
+        self.tasks: List[asyncio.Task] = []
+
+    def lane(self, user_key: str) -> asyncio.Queue:
+        return self.queues[zlib.crc32(user_key.encode()) % len(self.queues)]
+
+
+class EventBus:
+    def __init__(self, routes: Optional[Dict[str, str]] = None, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 workers_per_agent: int = DEFAULT_WORKERS, metrics_registry: MetricsRegistry = metrics):
+        self.routes = routes if routes is not None else routes_from_registry()
+        self.queue_size = queue_size
+        self.workers_per_agent = workers_per_agent
+        self.metrics = metrics_registry
+        self._handlers: Dict[str, Callable] = {}
+        self._agents: Dict[str, _AgentLanes] = {}
+        self._running = False
+
+    def subscribe(self, event_type: str, handler: Callable) -> None:
+        """Register the handler for an event; it is called with the payload as kwargs."""
+        agent = self.routes.get(event_type)
+        if agent is None:
+            raise UnroutedEventError(f"No agent declares event {event_type!r}")
+        self._handlers[event_type] = self.metrics.wrap(f"bus.{agent}.{event_type}", handler)
+
+    async def start(self) -> None:
+        if self._running:
+            return
+        for agent in sorted(set(self.routes.values())):
+            lanes = self._agents[agent] = _AgentLanes(agent, self.workers_per_agent, self.queue_size, self.metrics)
+            lanes.tasks = [asyncio.create_task(self._worker(lanes, q)) for q in lanes.queues]
+        self._running = True
+
+    def _event(self, event_type: str, payload: Dict[str, Any], ordering_key: Optional[str]) -> tuple:
+        if not self._running:
+            raise RuntimeError("Event bus is not running")
+        if event_type not in self._handlers:
+            raise UnroutedEventError(f"No handler subscribed to event {event_type!r}")
+        lanes = self._agents[self.routes[event_type]]
+        user_key = str(ordering_key or payload.get("user_id") or payload.get("email") or "")
+        event = Event(event_type, payload, user_key, asyncio.get_running_loop().create_future())
+        return lanes, event
+
+    async def publish(self, event_type: str, ordering_key: Optional[str] = None, **payload) -> asyncio.Future:
+        """Enqueue an event, waiting for queue space; returns a future for the handler's result."""
+        lanes, event = self._event(event_type, payload, ordering_key)
+        lanes.queue_wait.in_flight += 1
+        try:
+            await lanes.lane(event.user_key).put(event)
+        except BaseException:
+            lanes.queue_wait.in_flight -= 1
+            raise
+        return event.future
+
+    def try_publish(self, event_type: str, ordering_key: Optional[str] = None, **payload) -> asyncio.Future:
+        """Enqueue an event without waiting; raises QueueFullError when the lane is full."""
+        lanes, event = self._event(event_type, payload, ordering_key)
+        try:
+            lanes.lane(event.user_key).put_nowait(event)
+        except asyncio.QueueFull:
+            raise QueueFullError(lanes.agent) from None
+        lanes.queue_wait.in_flight += 1
+        return event.future
+
+    async def request(self, event_type: str, ordering_key: Optional[str] = None, **payload) -> Any:
+        """Publish an event and wait for its handler's result."""
+        return await (await self.publish(event_type, ordering_key, **payload))
+
+    async def _worker(self, lanes: _AgentLanes, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            event = await queue.get()
+            lanes.queue_wait.observe(time.perf_counter() - event.enqueued_at, False)
+            handler = self._handlers[event.type]
+            try:
+                if asyncio.iscoroutinefunction(handler):
+                    result = await handler(**event.payload)
+                else:
+                    result = await loop.run_in_executor(lanes.executor, lambda: handler(**event.payload))
+            except Exception as e:
+                if not event.future.done():
+                    event.future.set_exception(e)
+            else:
+                if not event.future.done():
+                    event.future.set_result(result)
+            finally:
+                queue.task_done()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth and wait latency per agent."""
+        stats = {}
+        for agent, lanes in self._agents.items():
+            wait = lanes.queue_wait.snapshot()
+            stats[agent] = {
+                "depth": sum(q.qsize() for q in lanes.queues),
+                "capacity": sum(q.maxsize for q in lanes.queues),
+                "processed": wait["calls"],
+                "queue_wait_p50_ms": wait["p50_ms"],
+                "queue_wait_p99_ms": wait["p99_ms"]
+            }
+        return stats
+
+    async def stop(self, drain: bool = True) -> None:
+        """Stop the workers, by default after the queued events are handled."""
+        self._running = False
+        for lanes in self._agents.values():
+            if drain:
+                await asyncio.gather(*(q.join() for q in lanes.queues))
+            for task in lanes.tasks:
+                task.cancel()
+            await asyncio.gather(*lanes.tasks, return_exceptions=True)
+            lanes.executor.shutdown(wait=False)
+        self._agents.clear()
+
+
+def system_handlers(system) -> Dict[str, Callable]:
+    """Handlers that run each declared event through a TravelInsuranceSystem."""
+    from tools import CachedFlightVerificationTools, ClaimsTools, CoverageTools
+    from two_factor import get_two_factor
+
+    return {
+        "user_registration": system.register_user,
+        "authentication_request": get_two_factor().verify,
+        "flight_purchase_detected": system.process_flight_purchase,
+        "ticket_verification_request": CachedFlightVerificationTools.verify_flight_purchase,
+        "coverage_calculation_request": CoverageTools.calculate_premium,
+        "plan_subscription_request": system.subscriptions.subscribe,
+        "payment_request": system.purchase_insurance,
+        "refund_request": system.process_refund,
+        "claim_submission": system.process_claim,
+        "claim_verification_request": ClaimsTools.verify_claim
+    }
+
+
+def create_system_bus(system=None, **kwargs) -> EventBus:
+    """An EventBus with every declared event wired to ``system`` (a new one by default)."""
+    if system is None:
+        from main import TravelInsuranceSystem
+        system = TravelInsuranceSystem()
+    bus = EventBus(**kwargs)
+    for event_type, handler in system_handlers(system).items():
+        if event_type in bus.routes:
+            bus.subscribe(event_type, handler)
+    return bus
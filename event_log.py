@@ -0,0 +1,351 @@
+"""Append-only binary event log with snapshots, for recovering system state.
+
+Every state change TravelInsuranceSystem makes is recorded as one event: a
+type (user registered, ticket verified, ...) plus the table writes it made.
+
+Appends are queued in memory. A flusher thread writes and fsyncs them every
+``commit_interval`` seconds, so concurrent writers share one fsync (group
+commit). Each commit is one length-prefixed frame:
+
+    payload length, CRC-32, first sequence number, event count | payload
+
+The payload is one pickle of the commit's (timestamp, type, writes) events.
+Decoding a frame at a time instead of an event at a time roughly halves
+replay cost. Payouts, refunds and subscription charges wait until their
+event is on disk before returning. Other events are durable within one commit interval. Writes must
+not be mutated after they are appended, the same rule storage records follow.
+
+Every ``snapshot_every`` events, the flusher starts a snapshot thread. It
+starts a new log segment and freezes the attached tables while appends are
+briefly paused (a shallow copy, see ``Table.freeze``), then pickles them with
+appends and group commits running again. Recovery loads the latest
+snapshot and replays only the segments after it, reading them through
+``mmap``. A torn or corrupt tail is cut off at the last valid frame. Old
+segments are kept by default as the audit trail (``read``/``audit``).
+
+Snapshots and payloads are pickles, so only open logs you wrote yourself.
+"""
+
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import gc
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+USER_REGISTERED = 1
+TICKET_VERIFIED = 2
+POLICY_PURCHASED = 3
+CLAIM_FILED = 4
+PAYOUT_ISSUED = 5
+REFUND_PROCESSED = 6
+USERS_MOVED = 7
+SUBSCRIPTION_STARTED = 8
+SUBSCRIPTIONS_RENEWED = 9
+SUBSCRIPTION_UPDATED = 10
+PAYOUT_FAILED = 11
+
+EVENT_NAMES = {
+    USER_REGISTERED: "user_registered",
+    TICKET_VERIFIED: "ticket_verified",
+    POLICY_PURCHASED: "policy_purchased",
+    CLAIM_FILED: "claim_filed",
+    PAYOUT_ISSUED: "payout_issued",
+    REFUND_PROCESSED: "refund_processed",
+    USERS_MOVED: "users_moved",
+    SUBSCRIPTION_STARTED: "subscription_started",
+    SUBSCRIPTIONS_RENEWED: "subscriptions_renewed",
+    SUBSCRIPTION_UPDATED: "subscription_updated",
+    PAYOUT_FAILED: "payout_failed"
+}
+
+# Events whose append waits for the fsync
+DURABLE_EVENTS = (PAYOUT_ISSUED, REFUND_PROCESSED, SUBSCRIPTION_STARTED, SUBSCRIPTIONS_RENEWED)
+
+TABLES = ("users", "flights", "policies", "payments", "claims", "subscriptions")
+
+# payload length, crc32 of payload, first sequence number, event count
+_HEADER = struct.Struct("<IIQI")
+_SNAPSHOT = "snapshot.pkl"
+_SEGMENT_SUFFIX = ".log"
+
+# (table, key, record); a record of None deletes the key
+Write = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+def apply_writes(tables, writes: List[Write]) -> None:
+    """Apply (table, key, record) writes to a storage backend or a dict of tables."""
+    for table, key, record in writes:
+        target = tables[table] if isinstance(tables, dict) else getattr(tables, table)
+        if record is None:
+            target.pop(key, None)
+        else:
+            target[key] = record
+
+
+def _frame(events: List[Tuple[float, int, List[Write]]], last_seq: int) -> bytes:
+    if not events:
+        return b""
+    payload = pickle.dumps(events, pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(len(payload), zlib.crc32(payload), last_seq - len(events) + 1, len(events)) + payload
+
+
+def _segment_name(first_seq: int) -> str:
+    return f"{first_seq:020d}{_SEGMENT_SUFFIX}"
+
+
+class EventLog:
+    def __init__(self, directory: str, commit_interval: float = 0.002,
+                 snapshot_every: int = 1_000_000, retain_segments: bool = True):
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        self.retain_segments = retain_segments
+        os.makedirs(directory, exist_ok=True)
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[float, int, List[Write]]] = []
+        self._storage = None
+        self._closed = False
+        self._io_lock = threading.Lock()
+        self._snapshotter: Optional[threading.Thread] = None
+        self.stats = {"appended": 0, "commits": 0, "snapshots": 0, "recovered": 0}
+
+        segments = self._segments()
+        first_seq, self._segment_path = segments[-1] if segments else (1, os.path.join(directory, _segment_name(1)))
+        self._seq = self._snapshot_seq = first_seq - 1
+        valid_end = 0
+        for frame_seq, count, _, valid_end in self._frames(self._segment_path):
+            self._seq = frame_seq + count - 1
+        self._durable_seq = self._seq
+        self._file = open(self._segment_path, "ab")
+        if os.path.getsize(self._segment_path) > valid_end:
+            # Drop a torn tail so new frames follow the last valid one
+            self._file.truncate(valid_end)
+        self._flusher = threading.Thread(target=self._run, daemon=True, name="event-log")
+        self._flusher.start()
+
+    # === Writing ===>>>>> (buffered appends, group commit)
+
+    def append(self, event_type: int, writes: List[Write], durable: bool = False,
+               storage=None) -> int:
+        """Record an event; returns its sequence number.
+
+        With ``storage``, the writes are applied to its tables under the log's
+        lock, so a snapshot never sees a write without its event.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Event log is closed")
+            if storage is not None:
+                apply_writes(storage, writes)
+            self._seq += 1
+            seq = self._seq
+            self._pending.append((time.time(), event_type, writes))
+            self.stats["appended"] += 1
+            if len(self._pending) == 1:
+                self._cond.notify_all()
+            if durable:
+                self._cond.wait_for(lambda: self._durable_seq >= seq or self._closed)
+        return seq
+
+    def flush(self) -> None:
+        """Write and fsync everything appended so far."""
+        with self._cond:
+            seq = self._seq
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self._durable_seq >= seq or self._closed)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                closing = self._closed
+            if not closing:
+                time.sleep(self.commit_interval)  # let concurrent appends join this commit
+            self._commit()
+            if (self._storage is not None and self._seq - self._snapshot_seq >= self.snapshot_every
+                    and not closing and (self._snapshotter is None or not self._snapshotter.is_alive())):
+                # Pickling millions of records must not hold up the next commits
+                self._snapshotter = threading.Thread(target=self.snapshot, daemon=True,
+                                                     name="event-log-snapshot")
+                self._snapshotter.start()
+            if closing:
+                return
+
+    def _write(self, frame: bytes, seq: int) -> None:
+        # Caller holds self._io_lock
+        if frame:
+            self._file.write(frame)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        with self._cond:
+            self._durable_seq = max(self._durable_seq, seq)
+            self.stats["commits"] += bool(frame)
+            self._cond.notify_all()
+
+    def _commit(self) -> None:
+        with self._io_lock:
+            with self._cond:
+                events, self._pending = self._pending, []
+                seq = self._seq
+            self._write(_frame(events, seq), seq)
+
+    # === Snapshots ===>>>>> (compact state + new segment)
+
+    def attach(self, storage) -> None:
+        """Tables to snapshot every ``snapshot_every`` events."""
+        self._storage = storage
+
+    def snapshot(self) -> int:
+        """Snapshot the attached storage and start a new segment; returns the snapshot's sequence."""
+        if self._storage is None:
+            raise RuntimeError("No storage attached to the event log")
+        with self._io_lock:
+            # Holding the append lock: every event up to seq has already been applied to the tables
+            with self._cond:
+                events, self._pending = self._pending, []
+                seq = self._seq
+                frozen = {name: getattr(self._storage, name).freeze() for name in TABLES}
+            self._snapshot_seq = seq
+            self._write(_frame(events, seq), seq)
+            self._file.close()
+            self._segment_path = os.path.join(self.directory, _segment_name(seq + 1))
+            self._file = open(self._segment_path, "ab")
+
+        tables = {name: dict(table.items()) for name, table in frozen.items()}
+        tmp_path = os.path.join(self.directory, _SNAPSHOT + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+            pickler.fast = True  # records are plain trees; skipping the memo halves dump time
+            pickler.dump({"seq": seq, "tables": tables})
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.directory, _SNAPSHOT))
+        self.stats["snapshots"] += 1
+        if not self.retain_segments:
+            for first_seq, path in self._segments():
+                if path != self._segment_path and first_seq <= seq:
+                    os.remove(path)
+        return seq
+
+    # === Reading ===>>>>> (mmap scans, recovery, audit)
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        return sorted(
+            (int(name[:-len(_SEGMENT_SUFFIX)]), os.path.join(self.directory, name))
+            for name in os.listdir(self.directory) if name.endswith(_SEGMENT_SUFFIX)
+        )
+
+    @staticmethod
+    def _frames(path: str) -> Iterator[Tuple[int, int, memoryview, int]]:
+        """Yield (first seq, count, payload, end offset) for each valid frame in a segment."""
+        if not os.path.exists(path) or not os.path.getsize(path):
+            return
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            view = memoryview(data)
+            try:
+                offset, end, size = 0, len(data), _HEADER.size
+                while offset + size <= end:
+                    length, crc, first_seq, count = _HEADER.unpack_from(data, offset)
+                    start = offset + size
+                    payload = view[start:start + length]
+                    if start + length > end or zlib.crc32(payload) != crc:
+                        payload.release()
+                        break
+                    offset = start + length
+                    try:
+                        yield first_seq, count, payload, offset
+                    finally:
+                        payload.release()
+            finally:
+                view.release()
+
+    def _events(self, path: str) -> Iterator[Tuple[int, float, int, List[Write]]]:
+        """Yield (seq, timestamp, type, writes) for each durable event in a segment."""
+        for first_seq, _, payload, _ in self._frames(path):
+            for seq, (ts, event_type, writes) in enumerate(pickle.loads(payload), first_seq):
+                yield seq, ts, event_type, writes
+
+    def read(self, since_seq: int = 0) -> Iterator[Dict[str, Any]]:
+        """Every durable event after ``since_seq``, oldest first."""
+        self.flush()
+        for _, path in self._segments():
+            for seq, ts, event_type, writes in self._events(path):
+                if seq > since_seq:
+                    yield {"seq": seq, "timestamp": ts, "type": EVENT_NAMES.get(event_type, event_type),
+                           "writes": writes}
+
+    def audit(self, event_types=DURABLE_EVENTS) -> Iterator[Dict[str, Any]]:
+        """The audit trail: by default every payout, refund and subscription charge on record."""
+        names = {EVENT_NAMES[t] for t in event_types}
+        return (event for event in self.read() if event["type"] in names)
+
+    def recover(self, storage) -> int:
+        """Rebuild ``storage`` from the snapshot plus the log tail; returns events replayed."""
+        # Recovery only allocates, so GC passes over millions of new dicts are wasted work
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            tables, snapshot_seq, replayed = self._replay()
+            with storage.transaction():
+                for name, records in tables.items():
+                    getattr(storage, name).load(records)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self._snapshot_seq = snapshot_seq
+        self.stats["recovered"] = replayed
+        return replayed
+
+    def _replay(self) -> Tuple[Dict[str, Dict[str, Any]], int, int]:
+        tables: Dict[str, Dict[str, Any]] = {name: {} for name in TABLES}
+        snapshot_seq = 0
+        snapshot_path = os.path.join(self.directory, _SNAPSHOT)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "rb") as f:
+                snapshot = pickle.load(f)
+            snapshot_seq = snapshot["seq"]
+            tables.update(snapshot["tables"])
+
+        replayed = 0
+        segments = self._segments()
+        for i, (first_seq, path) in enumerate(segments):
+            if i + 1 < len(segments) and segments[i + 1][0] <= snapshot_seq + 1:
+                continue  # wholly covered by the snapshot
+            for seq, _, _, writes in self._events(path):
+                if seq <= snapshot_seq:
+                    continue
+                for table, key, record in writes:
+                    if record is None:
+                        tables[table].pop(key, None)
+                    else:
+                        tables[table][key] = record
+                replayed += 1
+        return tables, snapshot_seq, replayed
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        self._file.close()
+
+
+_default_log: Optional[EventLog] = None
+_default_lock = threading.Lock()
+
+
+def get_event_log() -> Optional[EventLog]:
+    """Process-wide event log in EVENT_LOG_DIR, or None when it is unset."""
+    global _default_log
+    directory = os.getenv("EVENT_LOG_DIR")
+    if _default_log is None and directory:
+        with _default_lock:
+            if _default_log is None:
+                _default_log = EventLog(directory)
+    return _default_log
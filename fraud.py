@@ -0,0 +1,153 @@
+"""Incremental fraud and duplicate-claim checks.
+
+``FraudIndex`` keeps indexes that are updated as users register and claims
+are paid, so each check costs a few dict lookups no matter how many claims
+are on record:
+
+- ticket -> claim_id, to catch a second claim on a ticket
+- MAC address -> accounts, to catch one device behind many accounts
+- payout destination -> accounts, to catch many accounts paid to one place
+- per-user and per-MAC recent claim times, to catch claim bursts
+
+Recent claim times sit in deques capped at the velocity limit, so a burst
+check only looks at the oldest kept timestamp. ``from_storage`` rebuilds the
+indexes with a single pass over stored users and claims.
+"""
+
+from collections import deque
+from typing import Dict, Deque, Iterable, List, Optional, Set
+import time
+
+APPROVE = "approve"
+REVIEW = "review"
+REJECT = "reject"
+
+# Status of a claim whose payout the rail declined; it can be filed again
+PAYOUT_FAILED_STATUS = "payout_failed"
+
+# Statuses of claims that do not count as paid or in flight
+INACTIVE_CLAIM_STATUSES = ("under_review", "rejected", PAYOUT_FAILED_STATUS)
+
+DAY = 86_400.0
+
+
+def normalize_mac(mac_address: str) -> str:
+    return mac_address.upper().replace("-", ":")
+
+
+class FraudDecision:
+    __slots__ = ("action", "reasons")
+
+    def __init__(self, action: str, reasons: List[str]):
+        self.action = action
+        self.reasons = reasons
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"action": self.action, "reasons": list(self.reasons)}
+
+
+class FraudIndex:
+    def __init__(self, max_accounts_per_mac: int = 3, max_accounts_per_destination: int = 2,
+                 user_claim_limit: int = 3, mac_claim_limit: int = 5, velocity_window: float = DAY):
+        self.max_accounts_per_mac = max_accounts_per_mac
+        self.max_accounts_per_destination = max_accounts_per_destination
+        self.user_claim_limit = user_claim_limit
+        self.mac_claim_limit = mac_claim_limit
+        self.velocity_window = velocity_window
+        self._ticket_claim: Dict[str, str] = {}
+        self._user_mac: Dict[str, str] = {}
+        self._mac_users: Dict[str, Set[str]] = {}
+        self._destination_users: Dict[str, Set[str]] = {}
+        self._user_recent: Dict[str, Deque[float]] = {}
+        self._mac_recent: Dict[str, Deque[float]] = {}
+
+    def record_user(self, user_id: str, mac_address: str) -> None:
+        mac = normalize_mac(mac_address)
+        self._user_mac[user_id] = mac
+        self._mac_users.setdefault(mac, set()).add(user_id)
+
+    def accounts_for_mac(self, mac_address: str) -> int:
+        """Number of registered accounts on a device."""
+        return len(self._mac_users.get(normalize_mac(mac_address), ()))
+
+    def record_claim(self, claim_id: str, ticket_number: str, user_id: str,
+                     payout_destination: Optional[str] = None, filed_at: Optional[float] = None) -> None:
+        """Index a paid (or in-flight) claim; recording the same claim twice is a no-op."""
+        if self._ticket_claim.get(ticket_number) == claim_id:
+            return
+        self._ticket_claim[ticket_number] = claim_id
+        filed_at = time.time() if filed_at is None else filed_at
+        self._recent(self._user_recent, user_id, self.user_claim_limit).append(filed_at)
+        mac = self._user_mac.get(user_id)
+        if mac is not None:
+            self._recent(self._mac_recent, mac, self.mac_claim_limit).append(filed_at)
+        if payout_destination:
+            self._destination_users.setdefault(payout_destination, set()).add(user_id)
+
+    def forget_claim(self, claim_id: str, ticket_number: str) -> None:
+        """Drop an in-flight claim whose payout failed, so the ticket can be claimed again.
+
+        Its claim times stay in the velocity windows.
+        """
+        if self._ticket_claim.get(ticket_number) == claim_id:
+            del self._ticket_claim[ticket_number]
+
+    @staticmethod
+    def _recent(index: Dict[str, Deque[float]], key: str, limit: int) -> Deque[float]:
+        recent = index.get(key)
+        if recent is None:
+            recent = index[key] = deque(maxlen=limit)
+        return recent
+
+    def _burst(self, recent: Optional[Deque[float]], now: float) -> bool:
+        # Full deque whose oldest entry is inside the window: limit claims already in it
+        return recent is not None and len(recent) == recent.maxlen and recent[0] > now - self.velocity_window
+
+    def check_claim(self, claim_id: str, ticket_number: str, user_id: str,
+                    payout_destination: Optional[str] = None, now: Optional[float] = None) -> FraudDecision:
+        now = time.time() if now is None else now
+        existing = self._ticket_claim.get(ticket_number)
+        if existing is not None:
+            reason = "claim already paid" if existing == claim_id else "ticket already claimed by another account"
+            return FraudDecision(REJECT, [reason])
+
+        reasons = []
+        if self._burst(self._user_recent.get(user_id), now):
+            reasons.append(f"more than {self.user_claim_limit} claims by this account in the velocity window")
+        mac = self._user_mac.get(user_id)
+        if mac is not None:
+            if len(self._mac_users.get(mac, ())) > self.max_accounts_per_mac:
+                reasons.append(f"device shared by more than {self.max_accounts_per_mac} accounts")
+            if self._burst(self._mac_recent.get(mac), now):
+                reasons.append(f"more than {self.mac_claim_limit} claims from this device in the velocity window")
+        if payout_destination:
+            others = self._destination_users.get(payout_destination, set()) - {user_id}
+            if len(others) >= self.max_accounts_per_destination:
+                reasons.append(f"payout destination used by {len(others)} other accounts")
+        return FraudDecision(REVIEW if reasons else APPROVE, reasons)
+
+    @classmethod
+    def from_storage(cls, storage, **kwargs) -> "FraudIndex":
+        """Build an index from the users and claims already in ``storage``."""
+        index = cls(**kwargs)
+        for user_id, user in storage.users.items():
+            index.record_user(user_id, user["mac_address"])
+        index.record_claims(storage.claims.items())
+        return index
+
+    def record_claims(self, claims: Iterable) -> None:
+        """Index (claim_id, record) pairs; claim times are applied oldest first."""
+        active = [(claim_id, claim) for claim_id, claim in claims
+                  if claim.get("status") not in INACTIVE_CLAIM_STATUSES and "ticket_number" in claim]
+        active.sort(key=lambda item: item[1].get("filed_at", 0.0))
+        for claim_id, claim in active:
+            self.record_claim(claim_id, claim["ticket_number"], claim["user_id"],
+                              claim.get("payout_destination"), claim.get("filed_at", 0.0))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "claimed_tickets": len(self._ticket_claim),
+            "devices": len(self._mac_users),
+            "shared_devices": sum(len(users) > self.max_accounts_per_mac for users in self._mac_users.values()),
+            "payout_destinations": len(self._destination_users)
+        }
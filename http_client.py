@@ -0,0 +1,204 @@
+from collections import defaultdict
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+
+
+class CircuitOpenError(Exception):
+    """Raised when calls to a host are short-circuited by its breaker."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a half-open probe."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return self.state == self.CLOSED
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class PooledHTTPClient:
+    """Shared keep-alive HTTP session with per-host pools, retries and breakers.
+
+    Connections to each host are capped at ``pool_maxsize``; callers block for a
+    free connection rather than opening extra ones. Failed idempotent requests
+    (and POSTs carrying an Idempotency-Key header) are retried with capped
+    exponential backoff and full jitter.
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 20,
+                 max_retries: int = 3, backoff_base: float = 0.1, backoff_max: float = 5.0,
+                 timeout: Tuple[float, float] = (3.05, 10.0),
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+            max_retries=0, pool_block=True
+        )
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._in_flight: Dict[str, int] = defaultdict(int)
+        self._counters: Dict[str, int] = defaultdict(int)
+
+    def _breaker(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return breaker
+
+    def _count(self, name: str, host: str, delta: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += delta
+            if name == "in_flight":
+                self._in_flight[host] += delta
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request, retrying transient failures. Raises CircuitOpenError
+        when the host's breaker is open, or the last error once retries run out."""
+        method = method.upper()
+        host = urlsplit(url).netloc
+        breaker = self._breaker(host)
+        kwargs.setdefault("timeout", self.timeout)
+        retryable = method in IDEMPOTENT_METHODS or "Idempotency-Key" in (kwargs.get("headers") or {})
+
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                self._count("short_circuited", host)
+                raise CircuitOpenError(f"Circuit open for {host}")
+
+            self._count("requests", host)
+            self._count("in_flight", host)
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error: Optional[Exception] = e
+                response = None
+            except BaseException:
+                # Not retried (invalid URL, too many redirects, ...), but the breaker
+                # still needs an outcome or a half-open probe would never finish
+                breaker.record_failure()
+                self._count("failures", host)
+                raise
+            else:
+                error = None
+            finally:
+                self._count("in_flight", host, -1)
+
+            failed = error is not None or response.status_code in RETRY_STATUSES or response.status_code >= 500
+            if not failed:
+                breaker.record_success()
+                return response
+
+            breaker.record_failure()
+            self._count("failures", host)
+            if not retryable or attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                return response
+            self._count("retries", host)
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def get_json(self, url: str, **kwargs) -> Dict[str, Any]:
+        response = self.request("GET", url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def post_json(self, url: str, payload: Dict[str, Any],
+                  idempotency_key: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        if idempotency_key is not None:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), "Idempotency-Key": idempotency_key}
+        response = self.request("POST", url, json=payload, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def stats(self) -> Dict[str, Any]:
+        """Request counters plus per-host pool utilization and breaker state."""
+        hosts = {}
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.host}:{pool.port}" if pool.port else pool.host
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            hosts[host] = {
+                "connections_opened": pool.num_connections,
+                "requests_sent": pool.num_requests,
+                "idle_connections": idle,
+                "pool_maxsize": self.pool_maxsize,
+                "utilization": 1 - pool.pool.qsize() / self.pool_maxsize if pool.pool else 0.0
+            }
+        with self._lock:
+            for host, in_flight in self._in_flight.items():
+                hosts.setdefault(host, {})["in_flight"] = in_flight
+            for host, breaker in self._breakers.items():
+                hosts.setdefault(host, {})["circuit"] = breaker.state
+            return {**self._counters, "hosts": hosts}
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_default_client: Optional[PooledHTTPClient] = None
+_default_lock = threading.Lock()
+
+
+def get_http_client() -> PooledHTTPClient:
+    """Return the process-wide pooled client shared by all tool integrations."""
+    global _default_client
+    if _default_client is None:
+        with _default_lock:
+            if _default_client is None:
+                _default_client = PooledHTTPClient()
+    return _default_client
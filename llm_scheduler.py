@@ -0,0 +1,278 @@
+"""Shared scheduler for Gemini model calls.
+
+Prompts from every agent go through one priority queue, so claims are served
+before payments, auth and reports. A dispatcher thread coalesces waiting
+prompts for the same model into batches and holds them to a global
+requests-per-second and tokens-per-minute budget. A prompt submitted while an
+identical one is still pending shares that prompt's result. With a response
+cache attached, cached answers are returned without queueing and completed
+responses are stored.
+
+Models are resolved through the agent registry by key (e.g. "claims_model").
+A model with ``generate_batch(prompts)`` gets one call per batch. Any other
+model gets one ``generate_content`` call per prompt, and each call counts
+against the request budget.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import hashlib
+import heapq
+import itertools
+import json
+import threading
+import time
+
+from agent_registry import StubResponse, registry
+from response_cache import ResponseCache, get_response_cache
+
+PRIORITIES = {"claims": 0, "payments": 1, "auth": 2, "reports": 3}
+DEFAULT_PRIORITY = "reports"
+
+
+def estimate_tokens(prompt: str) -> int:
+    return len(prompt) // 4 + 1
+
+
+def _agent_name(model_key: str) -> str:
+    return model_key[:-len("_model")] if model_key.endswith("_model") else model_key
+
+
+class TokenBucket:
+    """Refilling budget; ``reserve`` returns how long to wait before spending."""
+
+    def __init__(self, rate_per_second: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def reserve(self, amount: float) -> float:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class FakeModel:
+    """Local model for tests and benchmarks; records every call it receives."""
+
+    def __init__(self, latency: float = 0.0, supports_batch: bool = True):
+        self.latency = latency
+        self.calls: List[List[str]] = []
+        self._lock = threading.Lock()
+        if not supports_batch:
+            self.generate_batch = None
+
+    def generate_content(self, prompt: str, **kwargs) -> StubResponse:
+        with self._lock:
+            self.calls.append([prompt])
+        time.sleep(self.latency)
+        return StubResponse(f"fake: {prompt}")
+
+    def generate_batch(self, prompts: List[str]) -> List[StubResponse]:
+        with self._lock:
+            self.calls.append(list(prompts))
+        time.sleep(self.latency)
+        return [StubResponse(f"fake: {prompt}") for prompt in prompts]
+
+
+class _Request:
+    __slots__ = ("priority", "seq", "model_key", "prompt", "context", "tokens", "future", "dedupe_key",
+                 "submitted_at")
+
+    def __init__(self, priority: int, seq: int, model_key: str, prompt: str,
+                 context: Optional[Dict[str, Any]], dedupe_key: str):
+        self.priority = priority
+        self.seq = seq
+        self.model_key = model_key
+        self.prompt = prompt
+        self.context = context
+        self.tokens = estimate_tokens(prompt)
+        self.future: Future = Future()
+        self.dedupe_key = dedupe_key
+        self.submitted_at = time.monotonic()
+
+    def __lt__(self, other: "_Request") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class ModelCallScheduler:
+    def __init__(self, max_batch_size: int = 16, batch_window: float = 0.02,
+                 requests_per_second: float = 5.0, tokens_per_minute: float = 120_000,
+                 max_concurrent_calls: int = 4,
+                 model_resolver: Callable[[str], Any] = registry.get,
+                 cache: Optional[ResponseCache] = None):
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.model_resolver = model_resolver
+        self.cache = cache
+        self._requests = TokenBucket(requests_per_second, max(1.0, requests_per_second))
+        self._tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute / 60.0 * 10)
+        self._queue: List[_Request] = []
+        self._pending: Dict[str, _Request] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_concurrent_calls, thread_name_prefix="llm")
+        self.stats = {
+            "submitted": 0,
+            "cache_hits": 0,
+            "deduplicated": 0,
+            "batches": 0,
+            "model_calls": 0,
+            "prompts_sent": 0,
+            "budget_wait_seconds": 0.0
+        }
+        self._dispatcher = threading.Thread(target=self._run, daemon=True, name="llm-scheduler")
+        self._dispatcher.start()
+
+    def submit(self, prompt: str, model_key: str = "claims_model", priority: str = DEFAULT_PRIORITY,
+               context: Optional[Dict[str, Any]] = None) -> Future:
+        """Queue a prompt; resolves to the response text.
+
+        ``context`` is the tool context the answer depends on; it is part of
+        the cache key.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(prompt, model_key, _agent_name(model_key), context)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                future: Future = Future()
+                future.set_result(cached)
+                return future
+        label = f"{model_key}\0{json.dumps(context or {}, sort_keys=True, default=str)}\0{prompt}"
+        dedupe_key = hashlib.sha256(label.encode()).hexdigest()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scheduler is shut down")
+            self.stats["submitted"] += 1
+            pending = self._pending.get(dedupe_key)
+            if pending is not None:
+                self.stats["deduplicated"] += 1
+                return pending.future
+            request = _Request(PRIORITIES.get(priority, PRIORITIES[DEFAULT_PRIORITY]), next(self._seq),
+                               model_key, prompt, context, dedupe_key)
+            self._pending[dedupe_key] = request
+            heapq.heappush(self._queue, request)
+            self._cond.notify()
+        return request.future
+
+    def generate(self, prompt: str, model_key: str = "claims_model", priority: str = DEFAULT_PRIORITY,
+                 context: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> str:
+        return self.submit(prompt, model_key, priority, context).result(timeout)
+
+    def queue_depth(self) -> Dict[str, int]:
+        names = {value: name for name, value in PRIORITIES.items()}
+        with self._cond:
+            depth = {name: 0 for name in PRIORITIES}
+            for request in self._queue:
+                depth[names[request.priority]] += 1
+        return depth
+
+    def _next_batch(self) -> Optional[Tuple[str, List[_Request]]]:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            # Give concurrent callers a short window to join this batch
+            deadline = time.monotonic() + self.batch_window
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            head = heapq.heappop(self._queue)
+            batch, skipped = [head], []
+            while self._queue and len(batch) < self.max_batch_size:
+                request = heapq.heappop(self._queue)
+                (batch if request.model_key == head.model_key else skipped).append(request)
+            for request in skipped:
+                heapq.heappush(self._queue, request)
+            return head.model_key, batch
+
+    def _wait_for_budget(self, calls: int, tokens: int) -> None:
+        wait = max(self._requests.reserve(calls), self._tokens.reserve(tokens))
+        while wait > 0:
+            self.stats["budget_wait_seconds"] += wait
+            time.sleep(wait)
+            wait = max(self._requests.reserve(calls), self._tokens.reserve(tokens))
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            model_key, requests = batch
+            try:
+                model = self.model_resolver(model_key)
+            except Exception as e:
+                self._finish(requests, error=e)
+                continue
+            batched = getattr(model, "generate_batch", None) is not None
+            self._wait_for_budget(1 if batched else len(requests), sum(r.tokens for r in requests))
+            self.stats["batches"] += 1
+            self.stats["model_calls"] += 1 if batched else len(requests)
+            self.stats["prompts_sent"] += len(requests)
+            self._executor.submit(self._call, model, requests, batched)
+
+    def _call(self, model: Any, requests: List[_Request], batched: bool) -> None:
+        try:
+            prompts = [r.prompt for r in requests]
+            if batched:
+                responses = model.generate_batch(prompts)
+            else:
+                responses = [model.generate_content(prompt) for prompt in prompts]
+            texts = [response.text for response in responses]
+            if len(texts) != len(requests):
+                raise RuntimeError(f"Model returned {len(texts)} responses for {len(requests)} prompts")
+            self._finish(requests, responses=texts)
+        except Exception as e:
+            self._finish(requests, error=e)
+        finally:
+            # Whatever failed above, no caller is left waiting on its future
+            self._finish(requests, error=RuntimeError("Model call ended without a response"))
+
+    def _finish(self, requests: List[_Request], responses: Optional[List[str]] = None,
+                error: Optional[Exception] = None) -> None:
+        with self._cond:
+            for request in requests:
+                self._pending.pop(request.dedupe_key, None)
+        for i, request in enumerate(requests):
+            if request.future.done():
+                continue
+            if error is not None:
+                request.future.set_exception(error)
+            else:
+                if self.cache is not None:
+                    self.cache.put(request.prompt, request.model_key, responses[i], request.context)
+                request.future.set_result(responses[i])
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            self._dispatcher.join()
+        self._executor.shutdown(wait=wait)
+
+
+_default_scheduler: Optional[ModelCallScheduler] = None
+_default_lock = threading.Lock()
+
+
+def get_scheduler() -> ModelCallScheduler:
+    """Return the process-wide scheduler shared by all agents."""
+    global _default_scheduler
+    if _default_scheduler is None:
+        with _default_lock:
+            if _default_scheduler is None:
+                _default_scheduler = ModelCallScheduler(cache=get_response_cache())
+    return _default_scheduler
@@ -1,47 +1,90 @@
 # main.py
 
-from gemini.runtime import Runtime
-from auth_agent import agent as auth_agent
-from payment_agent import agent as payment_agent
-from claims_agent import agent as claims_agent
-from monitoring_agent import agent as monitoring_agent
-from agents import (
-    user_vetting_agent,
-    flight_verification_agent,
-    coverage_agent,
-    payment_agent,
-    claims_agent
-)
 from tools import (
     UserVettingTools,
-    FlightVerificationTools,
+    CachedFlightVerificationTools,
     CoverageTools,
-    PaymentTools,
     ClaimsTools
 )
-from typing import Dict, Any
+from event_log import (
+    CLAIM_FILED, DURABLE_EVENTS, PAYOUT_FAILED, PAYOUT_ISSUED, POLICY_PURCHASED, REFUND_PROCESSED,
+    TICKET_VERIFIED, TABLES, USER_REGISTERED, EventLog, Write, apply_writes, get_event_log
+)
+from fraud import PAYOUT_FAILED_STATUS, REJECT, REVIEW, FraudIndex
+from payment_engine import PaymentEngine, get_payment_engine
+from pricing_engine import DEFAULT_PLAN_TYPE, get_pricing_engine
+from reporting import ACTIVE, CLAIMED, REFUNDED, ReportingAggregates, get_reports
+from metrics import instrument_class
+from notifications import CLAIM_PAID, NotificationDispatcher, get_notifier
+from storage import StorageBackend, InMemoryStorage
+from subscriptions import SubscriptionScheduler
+from typing import Dict, Any, List, Optional
+import threading
+import time
+
+# Seconds to wait for a queued charge or refund to settle
+PAYMENT_TIMEOUT = 30.0
+
+CLAIM_IN_PROGRESS = {"status": "error", "message": "A claim for this ticket is already being processed"}
+CLAIM_NOT_ELIGIBLE = {"status": "error", "message": "Ticket is not eligible for a claim by this user"}
+
+
+def purchase_key(user_id: str, ticket_number: str, coverage_level: int, plan_type: str,
+                 payment_method: str, attempt: int = 0) -> str:
+    """Idempotency key for a policy purchase; a retried request maps to the same charge.
+
+    ``attempt`` counts earlier policies on the ticket that were refunded or
+    claimed, so buying again afterwards is a new charge.
+    """
+    return f"policy_{ticket_number}_{user_id}_{coverage_level}_{plan_type}_{payment_method}_{attempt}"
+
 
 class TravelInsuranceSystem:
-    def __init__(self):
-        self.user_data = {}
-        self.flight_data = {}
-        self.insurance_data = {}
-        self.payment_data = {}
-        self.claims_data = {}
-
-    def register_user(self, email: str, mac_address: str) -> Dict[str, Any]:
-        """Register a new user with MAC address verification and 2FA setup."""
+    def __init__(self, storage: Optional[StorageBackend] = None, payments: Optional[PaymentEngine] = None,
+                 reports: Optional[ReportingAggregates] = None,
+                 notifications: Optional[NotificationDispatcher] = None,
+                 events: Optional[EventLog] = None):
+        self.storage = storage or InMemoryStorage()
+        self.payments = payments or get_payment_engine()
+        self.notifications = notifications or get_notifier()
+        self.events = events if events is not None else get_event_log()
+        if self.events is not None:
+            # Durable storage is already up to date; in-memory storage is rebuilt from the log
+            if not any(len(getattr(self.storage, table)) for table in TABLES):
+                self.events.recover(self.storage)
+            self.events.attach(self.storage)
+        self.reports = reports or get_reports()
+        self.reports.load(self.storage)
+        self.user_data = self.storage.users
+        self.flight_data = self.storage.flights
+        self.insurance_data = self.storage.policies
+        self.payment_data = self.storage.payments
+        self.claims_data = self.storage.claims
+        self.fraud = FraudIndex.from_storage(self.storage)
+        self.subscriptions = SubscriptionScheduler(self)
+        # Tickets with a claim between screening and recording its payout
+        self._claims_in_flight = set()
+        self._claims_lock = threading.Lock()
+
+    def register_user(self, email: str, mac_address: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Register a new user with MAC address verification and 2FA setup.
+
+        ``user_id`` lets a caller such as the shard router choose the ID up front.
+        """
         # Verify MAC address
         if not UserVettingTools.verify_mac_address(mac_address):
             return {"status": "error", "message": "Invalid MAC address"}
 
         # Register user
-        user_info = UserVettingTools.register_user(email, mac_address)
-        self.user_data[user_info["user_id"]] = user_info
+        user_info = UserVettingTools.register_user(email, mac_address, user_id)
 
         # Setup 2FA
         two_fa_info = UserVettingTools.setup_2fa(email)
-        self.user_data[user_info["user_id"]]["2fa"] = two_fa_info
+        return self.complete_registration(user_info, two_fa_info)
+
+    def complete_registration(self, user_info: Dict[str, Any], two_fa_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a vetted user; the async front end calls this once its concurrent tool calls finish."""
+        self.store_user(user_info, two_fa_info)
 
         return {
             "status": "success",
@@ -52,12 +95,18 @@ class TravelInsuranceSystem:
     def process_flight_purchase(self, ticket_number: str, user_id: str) -> Dict[str, Any]:
         """Process flight purchase and offer insurance options."""
         # Verify flight purchase
-        flight_info = FlightVerificationTools.verify_flight_purchase(ticket_number, user_id)
-        self.flight_data[ticket_number] = flight_info
+        flight_info = CachedFlightVerificationTools.verify_flight_purchase(ticket_number, user_id)
 
         # Extract ticket details
-        ticket_details = FlightVerificationTools.extract_ticket_details(ticket_number)
-        self.flight_data[ticket_number]["details"] = ticket_details
+        ticket_details = CachedFlightVerificationTools.extract_ticket_details(ticket_number)
+        return self.complete_flight_purchase(ticket_number, flight_info, ticket_details)
+
+    def complete_flight_purchase(self, ticket_number: str, flight_info: Dict[str, Any],
+                                 ticket_details: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Store a verified ticket and offer coverage; shared with the async front end."""
+        if ticket_details is None or flight_info.get("status") != "verified":
+            return {"status": "error", "message": "Flight purchase could not be verified"}
+        self.store_flight(ticket_number, flight_info, ticket_details)
 
         # Calculate coverage options
         coverage_options = CoverageTools.recommend_coverage(ticket_details["price"])
@@ -69,33 +118,35 @@ class TravelInsuranceSystem:
         }
 
     def purchase_insurance(self, user_id: str, ticket_number: str, coverage_level: int, 
-                         payment_method: str) -> Dict[str, Any]:
+                         payment_method: str, plan_type: str = DEFAULT_PLAN_TYPE) -> Dict[str, Any]:
         """Process insurance purchase."""
+        if get_pricing_engine().subscription_terms(plan_type) is not None:
+            return self.purchase_covered_trip(user_id, ticket_number, coverage_level, plan_type)
+
         # Get ticket details
         ticket_details = self.flight_data[ticket_number]["details"]
         
         # Calculate premium
         coverage_info = CoverageTools.calculate_premium(
             ticket_details["price"], 
-            coverage_level
+            coverage_level,
+            plan_type
         )
 
         # Process payment
-        payment_info = PaymentTools.process_payment(
+        attempt = self.purchase_attempt(ticket_number)
+        payment_info = self.payments.charge(
             coverage_info["premium_amount"],
             payment_method,
-            user_id
-        )
-        self.payment_data[payment_info["transaction_id"]] = payment_info
+            user_id,
+            idempotency_key=purchase_key(user_id, ticket_number, coverage_level, plan_type, payment_method, attempt)
+        ).result(PAYMENT_TIMEOUT)
+        if payment_info["status"] != "success":
+            return {"status": "error", "message": "Payment failed"}
 
-        # Store insurance details
-        self.insurance_data[ticket_number] = {
-            "user_id": user_id,
-            "coverage_level": coverage_level,
-            "coverage_amount": coverage_info["coverage_amount"],
-            "premium_amount": coverage_info["premium_amount"],
-            "payment_info": payment_info
-        }
+        # Store payment and insurance details
+        self.store_policy(user_id, ticket_number, coverage_level, plan_type, coverage_info, payment_info,
+                          attempt=attempt)
 
         return {
             "status": "success",
@@ -103,7 +154,40 @@ class TravelInsuranceSystem:
             "coverage_details": coverage_info
         }
 
-    def process_claim(self, ticket_number: str, user_id: str) -> Dict[str, Any]:
+    def purchase_covered_trip(self, user_id: str, ticket_number: str, coverage_level: int,
+                              plan_type: str) -> Dict[str, Any]:
+        """Insure a ticket under the user's subscription, using one of this month's trips.
+
+        The monthly fee pays for the trip, so the policy carries no premium of its own.
+        """
+        existing = self.insurance_data.get(ticket_number)
+        if (existing is not None and existing["user_id"] == user_id and existing["plan_type"] == plan_type
+                and existing.get("status", ACTIVE) == ACTIVE):
+            # A retried purchase must not use up a second trip
+            return {"status": "success", "transaction_id": existing["transaction_id"],
+                    "subscription_id": existing.get("subscription_id")}
+
+        ticket_details = self.flight_data[ticket_number]["details"]
+        coverage_info = {
+            **CoverageTools.calculate_premium(ticket_details["price"], coverage_level, plan_type),
+            "premium_amount": 0.0
+        }
+        trip = self.subscriptions.use_trip(user_id, plan_type)
+        if trip["status"] != "success":
+            return trip
+        self.store_policy(user_id, ticket_number, coverage_level, plan_type, coverage_info, trip["payment_info"],
+                          subscription_id=trip["subscription_id"])
+
+        return {
+            "status": "success",
+            "transaction_id": trip["payment_info"]["transaction_id"],
+            "subscription_id": trip["subscription_id"],
+            "trips_remaining": trip["trips_remaining"],
+            "coverage_details": coverage_info
+        }
+
+    def process_claim(self, ticket_number: str, user_id: str,
+                      payout_destination: Optional[str] = None) -> Dict[str, Any]:
         """Process insurance claim for flight cancellation."""
         # Verify claim
         claim_id = f"claim_{ticket_number}_{user_id}"
@@ -113,41 +197,282 @@ class TravelInsuranceSystem:
             return {"status": "error", "message": "Claim verification failed"}
 
         # Get insurance details
-        insurance_details = self.insurance_data[ticket_number]
-        
-        # Process payout
-        payout_info = ClaimsTools.process_payout(
-            claim_id,
-            insurance_details["coverage_amount"]
-        )
-        self.claims_data[claim_id] = payout_info
+        insurance_details = self.insurance_data.get(ticket_number)
+        if insurance_details is None:
+            return {**CLAIM_NOT_ELIGIBLE, "claim_id": claim_id}
 
-        # Notify user
-        user_email = self.user_data[user_id]["email"]
-        notification = ClaimsTools.notify_user(
-            user_email,
-            f"Your claim has been processed. Payout amount: {insurance_details['coverage_amount']}"
-        )
+        if not self.reserve_claim(ticket_number):
+            return {**CLAIM_IN_PROGRESS, "claim_id": claim_id}
+        try:
+            # Fraud and duplicate checks
+            fraud_check = self.screen_claim(claim_id, ticket_number, user_id, payout_destination,
+                                            insurance_details["coverage_amount"])
+            if fraud_check is not None:
+                return fraud_check
+
+            # Process payout
+            payout_info = ClaimsTools.process_payout(
+                claim_id,
+                insurance_details["coverage_amount"]
+            )
+            self.store_payout(claim_id, ticket_number, user_id, payout_info, payout_destination)
+        finally:
+            self.release_claim(ticket_number)
+        if payout_info.get("status") != "success":
+            return {"status": "error", "message": "Payout failed", "claim_id": claim_id}
+
+        # Queue the notification; delivery happens off the claim path
+        notification_id = self.notify_claim_paid(user_id, insurance_details["coverage_amount"])
 
         return {
             "status": "success",
             "claim_id": claim_id,
             "payout_amount": insurance_details["coverage_amount"],
-            "notification": notification
+            "notification_id": notification_id
         }
 
-    def process_refund(self, transaction_id: str) -> Dict[str, Any]:
-        """Process refund for unused insurance plan."""
+    def process_refund(self, transaction_id: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Process refund for unused insurance plan.
+
+        With ``user_id`` only that user's own charges can be refunded.
+        """
         payment_info = self.payment_data.get(transaction_id)
-        if not payment_info:
+        if not payment_info or (user_id is not None and payment_info.get("user_id") != user_id):
             return {"status": "error", "message": "Transaction not found"}
 
-        refund_info = PaymentTools.process_refund(transaction_id)
+        # A refund holds the ticket like a claim does, so the two cannot both settle
+        policy = self.get_policy_by_transaction(transaction_id)
+        ticket_number = policy["ticket_number"] if policy is not None else None
+        if ticket_number is not None and not self.reserve_claim(ticket_number):
+            return {**CLAIM_IN_PROGRESS, "transaction_id": transaction_id}
+        try:
+            refund_check = self.screen_refund(transaction_id)
+            if refund_check is not None:
+                return refund_check
+            refund_info = self.payments.refund(
+                transaction_id,
+                payment_info["amount"],
+                payment_info["payment_method"]
+            ).result(PAYMENT_TIMEOUT)
+            self.store_refund(transaction_id, refund_info)
+        finally:
+            if ticket_number is not None:
+                self.release_claim(ticket_number)
+        if refund_info.get("status") != "success":
+            return {"status": "error", "message": "Refund failed", "refund_info": refund_info}
         return {
-            "status": "success",
+            "status": refund_info["status"],
             "refund_info": refund_info
         }
 
+    # === State recording ===>>>>> (shared by the sync and async front ends)
+
+    def record_event(self, event_type: int, writes: List[Write]) -> None:
+        """Apply (table, key, record) writes, logging them as one event when an event log is set."""
+        if self.events is None:
+            apply_writes(self.storage, writes)
+        else:
+            self.events.append(event_type, writes, event_type in DURABLE_EVENTS, self.storage)
+
+    def store_user(self, user_info: Dict[str, Any], two_fa_info: Dict[str, Any]) -> None:
+        if user_info["user_id"] not in self.user_data:
+            self.reports.record_registration()
+        self.record_event(USER_REGISTERED, [("users", user_info["user_id"], {**user_info, "2fa": two_fa_info})])
+        self.fraud.record_user(user_info["user_id"], user_info["mac_address"])
+
+    def store_flight(self, ticket_number: str, flight_info: Dict[str, Any],
+                     ticket_details: Dict[str, Any]) -> None:
+        self.record_event(TICKET_VERIFIED, [("flights", ticket_number, {**flight_info, "details": ticket_details})])
+
+    def purchase_attempt(self, ticket_number: str) -> int:
+        """Attempt number for the next purchase on a ticket; it moves on once the current policy is refunded or claimed."""
+        policy = self.insurance_data.get(ticket_number)
+        if policy is None:
+            return 0
+        attempt = policy.get("attempt", 0)
+        return attempt if policy.get("status", ACTIVE) == ACTIVE else attempt + 1
+
+    def store_policy(self, user_id: str, ticket_number: str, coverage_level: int, plan_type: str,
+                     coverage_info: Dict[str, Any], payment_info: Dict[str, Any],
+                     subscription_id: Optional[str] = None, attempt: int = 0) -> None:
+        """Record a policy; one under a subscription points at the monthly charge that covers it."""
+        replaced = self.insurance_data.get(ticket_number)
+        if replaced is not None and replaced["transaction_id"] == payment_info["transaction_id"]:
+            return  # a retried purchase settled by the same charge
+        policy = {
+            "ticket_number": ticket_number,
+            "user_id": user_id,
+            "transaction_id": payment_info["transaction_id"],
+            "coverage_level": coverage_level,
+            "plan_type": plan_type,
+            "coverage_amount": coverage_info["coverage_amount"],
+            "premium_amount": coverage_info["premium_amount"],
+            "status": ACTIVE,
+            "payment_info": payment_info,
+            "attempt": attempt
+        }
+        if subscription_id is None:
+            writes = [("payments", payment_info["transaction_id"], {**payment_info, "user_id": user_id})]
+        else:
+            # The subscription already recorded its charge
+            policy["subscription_id"] = subscription_id
+            writes = []
+        self.record_event(POLICY_PURCHASED, writes + [("policies", ticket_number, policy)])
+        self.reports.record_policy(coverage_level, plan_type, coverage_info["premium_amount"], replaced)
+
+    def store_payout(self, claim_id: str, ticket_number: str, user_id: str,
+                     payout_info: Dict[str, Any], payout_destination: Optional[str] = None) -> None:
+        """Record a payout result; a declined payout leaves the claim free to be filed again."""
+        filed_at = time.time()
+        previous = self.claims_data.get(claim_id)
+        already_paid = previous is not None and previous.get("status") == "success"
+        claim = {
+            **payout_info,
+            "user_id": user_id,
+            "ticket_number": ticket_number,
+            "payout_destination": payout_destination,
+            "filed_at": filed_at
+        }
+        if payout_info.get("status") != "success":
+            # Never let a late failure overwrite a payout the rail already made
+            if not already_paid:
+                self.record_event(PAYOUT_FAILED, [("claims", claim_id, {
+                    **claim, "status": PAYOUT_FAILED_STATUS, "payout_status": payout_info.get("status")
+                })])
+            return
+        policy = None if already_paid else self.insurance_data.get(ticket_number)
+        writes = [("claims", claim_id, claim)]
+        if policy is not None:
+            writes.append(("policies", ticket_number, {**policy, "status": CLAIMED}))
+        self.record_event(PAYOUT_ISSUED, writes)
+        self.fraud.record_claim(claim_id, ticket_number, user_id, payout_destination, filed_at)
+        if policy is not None:
+            self.reports.record_claim(payout_info["amount"], policy, filed_at)
+
+    def store_refund(self, transaction_id: str, refund_info: Dict[str, Any]) -> None:
+        payment = self.payment_data[transaction_id]
+        if refund_info.get("status") != "success" or payment.get("status") == REFUNDED:
+            return
+        policy = self.get_policy_by_transaction(transaction_id)
+        writes = [("payments", transaction_id,
+                   {**payment, "status": REFUNDED, "refund_id": refund_info["refund_id"]})]
+        if policy is not None and "ticket_number" in policy:
+            writes.append(("policies", policy["ticket_number"], {**policy, "status": REFUNDED}))
+        self.record_event(REFUND_PROCESSED, writes)
+        self.reports.record_refund(payment["amount"], policy)
+
+    def reserve_claim(self, ticket_number: str) -> bool:
+        """Claim the right to settle a ticket's claim or refund; False while another caller holds it.
+
+        Screening, payout and recording must not interleave for one ticket, or
+        two concurrent claims both pass the duplicate check and both get paid,
+        or a refund lands on a policy that is being claimed.
+        """
+        with self._claims_lock:
+            if ticket_number in self._claims_in_flight:
+                return False
+            self._claims_in_flight.add(ticket_number)
+            return True
+
+    def release_claim(self, ticket_number: str) -> None:
+        with self._claims_lock:
+            self._claims_in_flight.discard(ticket_number)
+
+    def screen_claim(self, claim_id: str, ticket_number: str, user_id: str,
+                     payout_destination: Optional[str], amount: float) -> Optional[Dict[str, Any]]:
+        """Run eligibility and fraud checks; returns the error response for a blocked claim, or None."""
+        existing = self.claims_data.get(claim_id)
+        if existing is not None and existing.get("status") == "under_review":
+            return {"status": "error", "message": "Claim is under fraud review", "claim_id": claim_id}
+
+        # Only the policy holder can claim, and only on a policy not yet claimed or refunded
+        policy = self.insurance_data.get(ticket_number)
+        if policy is None or policy["user_id"] != user_id or policy.get("status", ACTIVE) != ACTIVE:
+            return {**CLAIM_NOT_ELIGIBLE, "claim_id": claim_id}
+
+        decision = self.fraud.check_claim(claim_id, ticket_number, user_id, payout_destination)
+        if decision.action == REJECT:
+            return {"status": "error", "message": f"Claim rejected: {'; '.join(decision.reasons)}"}
+        if decision.action == REVIEW:
+            self.record_event(CLAIM_FILED, [("claims", claim_id, {
+                "claim_id": claim_id,
+                "payout_id": None,
+                "amount": amount,
+                "status": "under_review",
+                "user_id": user_id,
+                "ticket_number": ticket_number,
+                "payout_destination": payout_destination,
+                "fraud_reasons": decision.reasons,
+                "filed_at": time.time()
+            })])
+            return {"status": "error", "message": "Claim held for fraud review", "claim_id": claim_id,
+                    "fraud_reasons": decision.reasons}
+        return None
+
+    def screen_refund(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        """Check that a charge is still unused; returns the error response for a blocked refund, or None.
+
+        A policy can be refunded only while it is active. A subscription charge
+        can be refunded only while no trip has been insured against that month.
+        """
+        payment = self.payment_data.get(transaction_id)
+        if payment is None:
+            return {"status": "error", "message": "Transaction not found"}
+        if payment.get("status") == REFUNDED:
+            return {"status": "error", "message": "Transaction already refunded",
+                    "transaction_id": transaction_id}
+        subscription_id = payment.get("subscription_id")
+        if subscription_id is not None:
+            subscription = self.storage.subscriptions.get(subscription_id)
+            trips_used = (subscription is not None and subscription.get("transaction_id") == transaction_id
+                          and subscription.get("trips_used", 0) > 0)
+            if trips_used or self.get_policy_by_transaction(transaction_id) is not None:
+                return {"status": "error", "message": "Subscription month has trips in use",
+                        "transaction_id": transaction_id}
+            return None
+        policy = self.get_policy_by_transaction(transaction_id)
+        if policy is not None and policy.get("status", ACTIVE) != ACTIVE:
+            return {"status": "error", "message": f"Policy is {policy['status']} and cannot be refunded",
+                    "transaction_id": transaction_id}
+        return None
+
+    def notify_claim_paid(self, user_id: str, amount: float) -> str:
+        """Queue the payout notification for a user; returns its ID."""
+        return self.notifications.send(CLAIM_PAID, self.user_data[user_id]["email"], amount=amount)
+
+    def get_user_policies(self, user_id: str) -> List[Dict[str, Any]]:
+        """Return every policy held by a user via the user_id index."""
+        return self.insurance_data.find_by("user_id", user_id)
+
+    def get_user_claims(self, user_id: str) -> List[Dict[str, Any]]:
+        """Return every claim filed by a user via the user_id index."""
+        return self.claims_data.find_by("user_id", user_id)
+
+    def get_policy_by_transaction(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        """Look up the policy paid for by a transaction."""
+        policies = self.insurance_data.find_by("transaction_id", transaction_id)
+        return policies[0] if policies else None
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the flight verification caches."""
+        return CachedFlightVerificationTools.cache_stats()
+
+    def reload_pricing_rules(self) -> Dict[str, Any]:
+        """Hot-reload pricing tiers and plan types from the rules file."""
+        engine = get_pricing_engine()
+        try:
+            engine.reload()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            return {"status": "error", "message": f"Pricing rules not reloaded: {e}"}
+        return {
+            "status": "success",
+            "version": engine.version
+        }
+
+instrument_class(TravelInsuranceSystem, "system",
+                 ["register_user", "process_flight_purchase", "purchase_insurance",
+                  "process_claim", "process_refund"])
+
 # Example usage
 if __name__ == "__main__":
     system = TravelInsuranceSystem()
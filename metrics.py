@@ -0,0 +1,223 @@
+"""Low-overhead operation metrics with Prometheus text export.
+
+Every instrumented call records its latency in a fixed-bucket histogram and
+updates call, error and in-flight counts. A call counts as an error if it
+raises or returns ``{"status": "error", ...}``. Recording takes one lock
+acquisition per call; the in-flight increment on entry is unlocked, so that
+gauge can be off by a few calls under heavy thread contention.
+"""
+
+from bisect import bisect_left
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Iterable, Optional, Tuple
+import asyncio
+import threading
+import time
+
+# Upper bounds in seconds, from 50us to 10s
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class OperationStats:
+    """Latency histogram, call/error counters and in-flight gauge for one operation."""
+
+    __slots__ = ("name", "buckets", "bucket_counts", "calls", "errors", "in_flight", "total_seconds", "lock")
+
+    def __init__(self, name: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.total_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float, error: bool) -> None:
+        with self.lock:
+            self.bucket_counts[bisect_left(self.buckets, seconds)] += 1
+            self.calls += 1
+            self.total_seconds += seconds
+            self.in_flight -= 1
+            if error:
+                self.errors += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a latency quantile (seconds) from the bucket upper bounds."""
+        if not self.calls:
+            return 0.0
+        target = q * self.calls
+        running = 0
+        for upper, count in zip(self.buckets, self.bucket_counts):
+            running += count
+            if running >= target:
+                return upper
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": self.errors / self.calls if self.calls else 0.0,
+            "in_flight": self.in_flight,
+            "mean_ms": self.total_seconds / self.calls * 1000 if self.calls else 0.0,
+            "p50_ms": self.quantile(0.50) * 1000,
+            "p99_ms": self.quantile(0.99) * 1000
+        }
+
+
+def _is_error(result: Any) -> bool:
+    return type(result) is dict and result.get("status") == "error"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.started_at = time.time()
+        self._started_cpu = time.process_time()
+        self._operations: Dict[str, OperationStats] = {}
+        self._lock = threading.Lock()
+
+    def operation(self, name: str) -> OperationStats:
+        stats = self._operations.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self._operations.setdefault(name, OperationStats(name))
+        return stats
+
+    def wrap(self, name: str, func):
+        """Return ``func`` instrumented under operation ``name``."""
+        stats = self.operation(name)
+        clock = time.perf_counter
+
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                stats.in_flight += 1
+                start = clock()
+                error = True
+                try:
+                    result = await func(*args, **kwargs)
+                    error = _is_error(result)
+                    return result
+                finally:
+                    stats.observe(clock() - start, error)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            stats.in_flight += 1
+            start = clock()
+            error = True
+            try:
+                result = func(*args, **kwargs)
+                error = _is_error(result)
+                return result
+            finally:
+                stats.observe(clock() - start, error)
+        return wrapper
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.snapshot() for name, stats in sorted(self._operations.items())}
+
+    def totals(self) -> Dict[str, Any]:
+        """Aggregate throughput and error rate across all operations."""
+        operations = list(self._operations.values())
+        calls = sum(s.calls for s in operations)
+        errors = sum(s.errors for s in operations)
+        uptime = time.time() - self.started_at
+        return {
+            "uptime_seconds": uptime,
+            "calls": calls,
+            "errors": errors,
+            "error_rate": errors / calls if calls else 0.0,
+            "throughput_per_second": calls / uptime if uptime else 0.0,
+            "in_flight": sum(s.in_flight for s in operations),
+            "cpu_usage": (time.process_time() - self._started_cpu) / uptime if uptime else 0.0
+        }
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        prefix = "travel_insurance_operation"
+        lines = [
+            f"# HELP {prefix}_duration_seconds Latency of instrumented operations.",
+            f"# TYPE {prefix}_duration_seconds histogram"
+        ]
+        operations = sorted(self._operations.items())
+        for name, stats in operations:
+            with stats.lock:
+                counts = list(stats.bucket_counts)
+                calls, total = stats.calls, stats.total_seconds
+            running = 0
+            for upper, count in zip(stats.buckets, counts):
+                running += count
+                lines.append(f'{prefix}_duration_seconds_bucket{{operation="{name}",le="{upper}"}} {running}')
+            lines.append(f'{prefix}_duration_seconds_bucket{{operation="{name}",le="+Inf"}} {calls}')
+            lines.append(f'{prefix}_duration_seconds_sum{{operation="{name}"}} {total}')
+            lines.append(f'{prefix}_duration_seconds_count{{operation="{name}"}} {calls}')
+
+        for metric, kind, help_text, attr in (
+            ("calls_total", "counter", "Completed calls.", "calls"),
+            ("errors_total", "counter", "Calls that raised or returned an error status.", "errors"),
+            ("in_flight", "gauge", "Calls currently executing.", "in_flight"),
+        ):
+            lines.append(f"# HELP {prefix}_{metric} {help_text}")
+            lines.append(f"# TYPE {prefix}_{metric} {kind}")
+            for name, stats in operations:
+                lines.append(f'{prefix}_{metric}{{operation="{name}"}} {getattr(stats, attr)}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            for stats in self._operations.values():
+                with stats.lock:
+                    stats.bucket_counts = [0] * len(stats.bucket_counts)
+                    stats.calls = stats.errors = 0
+                    stats.total_seconds = 0.0
+            self.started_at = time.time()
+            self._started_cpu = time.process_time()
+
+
+metrics = MetricsRegistry()
+
+
+def instrument_class(cls, prefix: str, methods: Optional[Iterable[str]] = None, registry: MetricsRegistry = metrics):
+    """Instrument the public methods (including staticmethods) of ``cls`` in place."""
+    names = methods if methods is not None else [
+        name for name in vars(cls) if not name.startswith("_")
+    ]
+    for name in names:
+        attr = vars(cls)[name]
+        if isinstance(attr, staticmethod):
+            setattr(cls, name, staticmethod(registry.wrap(f"{prefix}.{name}", attr.__func__)))
+        elif callable(attr):
+            setattr(cls, name, registry.wrap(f"{prefix}.{name}", attr))
+    return cls
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = metrics
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(port: int = 9464, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve ``/metrics`` in Prometheus format from a background thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
@@ -1,21 +1,39 @@
-from google.generativeai import GenerativeModel
-import google.generativeai as genai
+from typing import Optional
+import resource
 
-# Configure the Gemini API
-genai.configure(api_key="YOUR_API_KEY")  # Replace with your actual API key
+from agent_registry import registry
+from llm_scheduler import get_scheduler
+from metrics import metrics
+from reporting import ReportingAggregates, get_reports
+
+# Register the monitoring agent; the Gemini client is configured from
+# GOOGLE_API_KEY and the model is created on first use of ``agent``
+registry.register_model("monitoring_model", "gemini-pro")
+
+
+def __getattr__(name: str):
+    if name == "agent":
+        return registry.get("monitoring_model")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Error rate above which the system reports itself as degraded
+DEGRADED_ERROR_RATE = 0.05
 
-# Create the monitoring agent
-agent = GenerativeModel('gemini-pro')
 
 def monitor_system_health() -> dict:
-    """Monitor system health."""
-    # In a real implementation, this would check various system metrics
+    """Monitor system health from the live operation metrics."""
+    totals = metrics.totals()
+    system_ops = [s for name, s in metrics.snapshot().items() if name.startswith("system.")]
+    calls = sum(s["calls"] for s in system_ops)
     return {
-        "status": "healthy",
+        "status": "degraded" if totals["error_rate"] > DEGRADED_ERROR_RATE else "healthy",
         "metrics": {
-            "cpu_usage": 0.0,
-            "memory_usage": 0.0,
-            "response_time": 0.0
+            "cpu_usage": totals["cpu_usage"],
+            "memory_usage": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "response_time": sum(s["mean_ms"] * s["calls"] for s in system_ops) / calls if calls else 0.0,
+            "throughput": totals["throughput_per_second"],
+            "error_rate": totals["error_rate"],
+            "in_flight": totals["in_flight"]
         }
     }
 
@@ -25,14 +43,22 @@ def log_activity(user_id: str, action: str) -> bool:
     print(f"User {user_id} performed action: {action}")
     return True
 
-def generate_report() -> dict:
-    """Generate system report."""
-    # In a real implementation, this would aggregate system metrics
+def generate_report(reports: Optional[ReportingAggregates] = None) -> dict:
+    """Generate system report from the incrementally maintained aggregates."""
+    health = monitor_system_health()
+    business = (reports or get_reports()).snapshot()
     return {
         "status": "success",
         "report": {
-            "total_users": 0,
-            "active_sessions": 0,
-            "system_health": "healthy"
+            "total_users": business["total_users"],
+            "active_sessions": health["metrics"]["in_flight"],
+            "system_health": health["status"],
+            "business": business,
+            "operations": metrics.snapshot()
         }
-    } 
\ No newline at end of file
+    }
+
+def summarize_report(report: dict) -> str:
+    """Ask the monitoring model for a summary; queued behind claims and payments."""
+    prompt = f"Summarize this travel insurance system report: {report}"
+    return get_scheduler().generate(prompt, "monitoring_model", priority="reports")
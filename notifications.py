@@ -0,0 +1,418 @@
+"""Queued, batched notification delivery.
+
+``send`` renders a message, appends it to the outbox and returns its ID, so
+the claim path never waits on an email or SMS gateway. A dispatcher thread
+collects queued messages into batches per channel. Within a batch, messages
+for the same recipient become one delivery. Batches are sent on a worker
+pool.
+
+A failed delivery is retried with exponential backoff. After
+``max_attempts`` failures it is moved to ``dead_letters``, and
+``retry_dead_letters`` queues those again.
+
+With an outbox path configured, every queued message is appended to a
+JSON-lines log. The log is fsynced once per batch before delivery. Sent and
+dead-lettered messages are then marked done. On restart, messages that were
+never marked done are queued again. Gateways dedupe by message ID, so
+delivering a message twice is safe. Every ``checkpoint_every`` finished
+messages, the log is rewritten as just the undelivered and dead-lettered
+ones, so it does not grow without bound.
+
+Message templates are parsed once per kind and rendered bodies are cached,
+so the same claim payout text is built once per amount.
+
+Batch latency and errors are recorded per channel as ``notify.<channel>``.
+The time from queueing to delivery is recorded as ``notify.delivery``, and
+its in-flight gauge is the number of undelivered messages.
+"""
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+
+from http_client import get_http_client
+from metrics import MetricsRegistry, metrics
+
+EMAIL = "email"
+SMS = "sms"
+
+CLAIM_PAID = "claim_paid"
+CLAIM_UNDER_REVIEW = "claim_under_review"
+REFUND_PROCESSED = "refund_processed"
+MESSAGE = "message"
+
+# kind -> template; claim kinds are rendered from the claim's fields
+TEMPLATES = {
+    CLAIM_PAID: "Your claim has been processed. Payout amount: {amount}",
+    CLAIM_UNDER_REVIEW: "Your claim {claim_id} is under review. We will contact you shortly.",
+    REFUND_PROCESSED: "Your refund of {amount} has been processed.",
+    MESSAGE: "{message}"
+}
+
+
+@lru_cache(maxsize=None)
+def _template(kind: str):
+    return TEMPLATES[kind].format
+
+
+@lru_cache(maxsize=4096)
+def _render_cached(kind: str, fields: Tuple[Tuple[str, Any], ...]) -> str:
+    return _template(kind)(**dict(fields))
+
+
+def render(kind: str, **fields) -> str:
+    """Render the ``kind`` template; a body seen before comes from the cache."""
+    try:
+        return _render_cached(kind, tuple(sorted(fields.items())))
+    except TypeError:  # unhashable field value
+        return _template(kind)(**fields)
+
+
+class StubGateway:
+    """Local gateway that accepts every delivery except to ``fail_recipients``."""
+
+    def __init__(self, latency: float = 0.0, fail_recipients: Tuple[str, ...] = ()):
+        self.latency = latency  # simulated round trip per batch
+        self.fail_recipients = fail_recipients
+        self.batches = 0
+        self.delivered = 0
+        self._lock = threading.Lock()
+
+    def send_batch(self, channel: str, deliveries: List[Dict[str, Any]]) -> List[bool]:
+        time.sleep(self.latency)
+        results = [d["recipient"] not in self.fail_recipients for d in deliveries]
+        with self._lock:
+            self.batches += 1
+            self.delivered += sum(len(d["messages"]) for d, ok in zip(deliveries, results) if ok)
+        return results
+
+
+class HTTPGateway:
+    """Notification API behind NOTIFICATION_GATEWAY_URL; one POST per batch."""
+
+    def __init__(self, api_url: str):
+        self.api_url = api_url
+
+    def send_batch(self, channel: str, deliveries: List[Dict[str, Any]]) -> List[bool]:
+        ids = "\0".join(i for d in deliveries for i in d["ids"])
+        response = get_http_client().post_json(
+            f"{self.api_url}/notifications/batch",
+            {"channel": channel, "deliveries": deliveries},
+            idempotency_key=hashlib.sha256(ids.encode()).hexdigest()
+        )
+        return [bool(ok) for ok in response["results"]]
+
+
+class _Outbox:
+    """JSON-lines log of queued messages and their final status."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def replay(self) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Return (undelivered, dead-lettered) messages."""
+        queued, status = {}, {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn final write
+                if entry["op"] == "queued":
+                    queued[entry["message"]["id"]] = entry["message"]
+                else:
+                    status[entry["id"]] = entry["status"]
+        pending = [m for i, m in queued.items() if i not in status]
+        dead = [m for i, m in queued.items() if status.get(i) == "dead"]
+        return pending, dead
+
+    def append(self, entries: List[Dict[str, Any]], sync: bool = False) -> None:
+        data = "".join(json.dumps(entry) + "\n" for entry in entries)
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def sync(self) -> None:
+        with self._lock:
+            os.fsync(self._file.fileno())
+
+    def checkpoint(self, pending: List[Dict[str, Any]], dead: List[Dict[str, Any]]) -> None:
+        """Rewrite the log as just the undelivered and dead-lettered messages."""
+        entries = [{"op": "queued", "message": m} for m in pending + dead]
+        entries += [{"op": "done", "id": m["id"], "status": "dead"} for m in dead]
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as tmp:
+                tmp.write("".join(json.dumps(entry) + "\n" for entry in entries))
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class NotificationDispatcher:
+    def __init__(self, gateways: Optional[Dict[str, Any]] = None, outbox_path: Optional[str] = None,
+                 batch_size: int = 500, flush_interval: float = 0.01, workers: int = 4,
+                 max_attempts: int = 5, retry_delay: float = 1.0, checkpoint_every: int = 10_000,
+                 metrics_registry: MetricsRegistry = metrics):
+        self.gateways = gateways or _default_gateways()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.checkpoint_every = checkpoint_every
+        self.metrics = metrics_registry
+        self.dead_letters: List[Dict[str, Any]] = []
+        self._queue: List[Dict[str, Any]] = []
+        self._retries: list = []  # (ready_at, seq, message) heap
+        self._seq = itertools.count()
+        # id -> (queued at, message) for every message not yet sent or dead-lettered
+        self._outstanding: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._finished_since_checkpoint = 0
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="notify")
+        self._delivery = metrics_registry.operation("notify.delivery")
+        self.stats = {"queued": 0, "sent": 0, "deliveries": 0, "batches": 0, "retried": 0,
+                      "dead_lettered": 0, "recovered": 0, "dispatch_errors": 0, "checkpoints": 0}
+        self._outbox = _Outbox(outbox_path) if outbox_path else None
+        if self._outbox is not None:
+            self._recover()
+        self._dispatcher = threading.Thread(target=self._run, daemon=True, name="notify-dispatcher")
+        self._dispatcher.start()
+
+    def _recover(self) -> None:
+        pending, dead = self._outbox.replay()
+        self._outbox.checkpoint(pending, dead)
+        self.dead_letters.extend(dead)
+        now = time.perf_counter()
+        for message in pending:
+            self._queue.append(message)
+            self._outstanding[message["id"]] = (now, message)
+        self._pending = len(pending)
+        self._delivery.in_flight += len(pending)
+        self.stats["recovered"] = len(pending)
+
+    def send(self, kind: str, recipient: str, channel: str = EMAIL, **fields) -> str:
+        """Queue a notification rendered from the ``kind`` template; returns its ID."""
+        if channel not in self.gateways:
+            raise KeyError(f"Unknown notification channel: {channel}")
+        message = {
+            "id": str(uuid.uuid4()),
+            "channel": channel,
+            "recipient": recipient,
+            "kind": kind,
+            "body": render(kind, **fields),
+            "attempts": 0
+        }
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Notification dispatcher is shut down")
+            # Logged under the lock so a checkpoint never drops a message it has not seen
+            if self._outbox is not None:
+                self._outbox.append([{"op": "queued", "message": message}])
+            self._queue.append(message)
+            self._outstanding[message["id"]] = (time.perf_counter(), message)
+            self._pending += 1
+            self._delivery.in_flight += 1
+            self.stats["queued"] += 1
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._cond.notify()
+        return message["id"]
+
+    def send_message(self, recipient: str, message: str, channel: str = EMAIL) -> str:
+        """Queue a free-text notification."""
+        return self.send(MESSAGE, recipient, channel, message=message)
+
+    def _take_batches(self) -> List[Tuple[str, List[Dict[str, Any]]]]:
+        with self._cond:
+            while not self._closed:
+                now = time.perf_counter()
+                while self._retries and self._retries[0][0] <= now:
+                    self._queue.append(heapq.heappop(self._retries)[2])
+                if self._queue:
+                    break
+                self._cond.wait(self._retries[0][0] - now if self._retries else None)
+            # Let the batch fill for up to flush_interval unless it is already full
+            if not self._closed and len(self._queue) < self.batch_size:
+                self._cond.wait(self.flush_interval)
+            queue, self._queue = self._queue, []
+
+        by_channel: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for message in queue:
+            by_channel[message["channel"]].append(message)
+        return [(channel, messages[i:i + self.batch_size])
+                for channel, messages in by_channel.items()
+                for i in range(0, len(messages), self.batch_size)]
+
+    def _run(self) -> None:
+        while True:
+            closing = self._closed
+            batches = self._take_batches()
+            try:
+                if batches and self._outbox is not None:
+                    self._outbox.sync()
+                while batches:
+                    channel, batch = batches[0]
+                    self._executor.submit(self._deliver, channel, batch)
+                    batches.pop(0)
+                    self.stats["batches"] += 1
+                if self._outbox is not None and self._finished_since_checkpoint >= self.checkpoint_every:
+                    self._checkpoint()
+            except Exception:
+                # Keep the dispatcher alive; batches not handed to a worker are retried later
+                self.stats["dispatch_errors"] += 1
+                self._retry_later([message for _, batch in batches for message in batch])
+            if closing:
+                return
+
+    def _retry_later(self, messages: List[Dict[str, Any]]) -> None:
+        with self._cond:
+            ready_at = time.perf_counter() + self.retry_delay
+            for message in messages:
+                heapq.heappush(self._retries, (ready_at, next(self._seq), message))
+
+    def _checkpoint(self) -> None:
+        # Under the lock so no send or delivery result lands between the snapshot and the rewrite
+        with self._cond:
+            self._outbox.checkpoint([message for _, message in self._outstanding.values()], self.dead_letters)
+            self._finished_since_checkpoint = 0
+            self.stats["checkpoints"] += 1
+
+    def _deliver(self, channel: str, batch: List[Dict[str, Any]]) -> None:
+        by_recipient: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for message in batch:
+            by_recipient[message["recipient"]].append(message)
+        deliveries = [
+            {"recipient": recipient, "ids": [m["id"] for m in messages], "messages": [m["body"] for m in messages]}
+            for recipient, messages in by_recipient.items()
+        ]
+        batch_stats = self.metrics.operation(f"notify.{channel}")
+        batch_stats.in_flight += 1
+        start = time.perf_counter()
+        try:
+            results = list(self.gateways[channel].send_batch(channel, deliveries))
+            error = None
+            if len(results) != len(deliveries):
+                # Deliveries without a result count as failed, not as silently dropped
+                error = f"gateway returned {len(results)} results for {len(deliveries)} deliveries"
+                results = results[:len(deliveries)] + [False] * (len(deliveries) - len(results))
+        except Exception as e:
+            results, error = [False] * len(deliveries), f"{type(e).__name__}: {e}"
+        now = time.perf_counter()
+        batch_stats.observe(now - start, not all(results))
+
+        sent, failed = [], []
+        for messages, ok in zip(by_recipient.values(), results):
+            (sent if ok else failed).extend(messages)
+        with self._cond:
+            # Messages are only mutated under the lock, since a checkpoint may be serializing them
+            for message in failed:
+                message["attempts"] += 1
+                message["last_error"] = error or "rejected by gateway"
+            dead = [m for m in failed if m["attempts"] >= self.max_attempts]
+            self.stats["deliveries"] += sum(results)
+            self.stats["sent"] += len(sent)
+            for message in sent:
+                self._delivery.observe(now - self._outstanding.pop(message["id"])[0], False)
+            for message in dead:
+                self._delivery.observe(now - self._outstanding.pop(message["id"])[0], True)
+            self._finished_since_checkpoint += len(sent) + len(dead)
+            for message in failed:
+                if message["attempts"] >= self.max_attempts:
+                    self.dead_letters.append(message)
+                    self.stats["dead_lettered"] += 1
+                else:
+                    ready_at = now + self.retry_delay * 2 ** (message["attempts"] - 1)
+                    heapq.heappush(self._retries, (ready_at, next(self._seq), message))
+                    self.stats["retried"] += 1
+            if self._outbox is not None:
+                self._outbox.append([{"op": "done", "id": m["id"], "status": "sent"} for m in sent]
+                                    + [{"op": "done", "id": m["id"], "status": "dead"} for m in dead])
+            self._pending -= len(sent) + len(dead)
+            self._cond.notify_all()
+
+    def retry_dead_letters(self) -> int:
+        """Queue every dead-lettered message again; returns how many were queued."""
+        with self._cond:
+            messages, self.dead_letters = self.dead_letters, []
+            now = time.perf_counter()
+            for message in messages:
+                message["attempts"] = 0
+                self._queue.append(message)
+                self._outstanding[message["id"]] = (now, message)
+            self._pending += len(messages)
+            self._delivery.in_flight += len(messages)
+            self._cond.notify_all()
+        if messages and self._outbox is not None:
+            self._outbox.append([{"op": "queued", "message": m} for m in messages])
+        return len(messages)
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued message is sent or dead-lettered."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def throughput(self) -> Dict[str, Any]:
+        """Delivery counters plus queue-to-delivery latency."""
+        delivery = self._delivery.snapshot()
+        with self._cond:
+            return {
+                **self.stats,
+                "pending": self._pending,
+                "retrying": len(self._retries),
+                "delivery_p50_ms": delivery["p50_ms"],
+                "delivery_p99_ms": delivery["p99_ms"]
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the dispatcher; messages still undelivered stay in the outbox."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            self._dispatcher.join()
+        self._executor.shutdown(wait=wait)
+        if self._outbox is not None:
+            self._outbox.close()
+
+
+def _default_gateways() -> Dict[str, Any]:
+    api_url = os.getenv("NOTIFICATION_GATEWAY_URL")
+    gateway = HTTPGateway(api_url) if api_url else StubGateway()
+    return {EMAIL: gateway, SMS: gateway}
+
+
+_default_dispatcher: Optional[NotificationDispatcher] = None
+_default_lock = threading.Lock()
+
+
+def get_notifier() -> NotificationDispatcher:
+    """Process-wide dispatcher; NOTIFICATION_OUTBOX_PATH makes the outbox durable."""
+    global _default_dispatcher
+    if _default_dispatcher is None:
+        with _default_lock:
+            if _default_dispatcher is None:
+                _default_dispatcher = NotificationDispatcher(
+                    outbox_path=os.getenv("NOTIFICATION_OUTBOX_PATH") or None
+                )
+    return _default_dispatcher
@@ -1,21 +1,22 @@
-from google.generativeai import GenerativeModel
-import google.generativeai as genai
+from typing import Optional
 
-# Configure the Gemini API
-genai.configure(api_key="YOUR_API_KEY")  # Replace with your actual API key
+from agent_registry import registry
+from payment_engine import get_payment_engine
 
-# Create the payment agent
-agent = GenerativeModel('gemini-pro')
+# Register the payment agent; the Gemini client is configured from
+# GOOGLE_API_KEY and the model is created on first use of ``agent``
+registry.register_model("payment_model", "gemini-pro")
 
-def process_payment(amount: float, payment_method: str, user_id: str) -> dict:
-    """Process a payment."""
-    # In a real implementation, this would integrate with a payment processor
-    return {
-        "status": "success",
-        "transaction_id": f"txn_{user_id}_{amount}",
-        "amount": amount,
-        "payment_method": payment_method
-    }
+
+def __getattr__(name: str):
+    if name == "agent":
+        return registry.get("payment_model")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def process_payment(amount: float, payment_method: str, user_id: str,
+                    idempotency_key: Optional[str] = None) -> dict:
+    """Process a payment through the shared payment engine."""
+    return get_payment_engine().charge(amount, payment_method, user_id, idempotency_key).result()
 
 def verify_payment(transaction_id: str) -> bool:
     """Verify a payment transaction."""
@@ -0,0 +1,372 @@
+"""Queued, batched and idempotent payment processing.
+
+Charges and refunds are queued per (processor, payment method, kind). A
+dispatcher thread drains each queue in batches and settles them on a worker
+pool, so callers wait on a future instead of holding a processor round trip
+each. Every request carries an idempotency key. Resubmitting a key returns
+the original request's result, so a retried purchase cannot double-charge.
+
+Only successful settlements are remembered. A declined or failed request is
+forgotten, so resubmitting its key (say, after the card is fixed) charges
+again. Successful results are kept for ``settled_ttl`` seconds, long enough
+to absorb client retries, and then evicted.
+
+With a write-ahead log configured, each batch's intents are fsynced (one
+group commit per batch) before the processor sees them, and settlements are
+appended afterwards. On restart the log is replayed. Successful keys still
+within their TTL keep their results, and intents that never settled are sent
+again. Processors dedupe by idempotency key, so sending an intent twice is
+safe.
+"""
+
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from http_client import get_http_client
+
+CHARGE = "charge"
+REFUND = "refund"
+
+# Seconds a successful result stays cached under its idempotency key
+SETTLED_TTL = 3600.0
+
+
+class StubProcessor:
+    """Local processor that settles whole batches instantly and dedupes successful keys."""
+
+    name = "stub"
+
+    def __init__(self, decline_methods: Tuple[str, ...] = (), latency: float = 0.0):
+        self.decline_methods = decline_methods
+        self.latency = latency  # simulated round trip per batch
+        self.batches = 0
+        self._settled: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def settle_batch(self, kind: str, payment_method: str, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        status = "failed" if payment_method in self.decline_methods else "success"
+        results = []
+        with self._lock:
+            self.batches += 1
+            for request in requests:
+                result = self._settled.get(request["idempotency_key"]) or {"status": status}
+                if result["status"] == "success":
+                    self._settled[request["idempotency_key"]] = result
+                results.append(result)
+        time.sleep(self.latency)
+        return results
+
+
+class HTTPProcessor:
+    """Processor API behind PAYMENT_PROCESSOR_URL; one POST per batch.
+
+    Items carry their own idempotency keys; the batch key lets the HTTP client
+    retry the POST itself.
+    """
+
+    def __init__(self, api_url: str, name: str = "default"):
+        self.api_url = api_url
+        self.name = name
+
+    def settle_batch(self, kind: str, payment_method: str, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        path = "payments" if kind == CHARGE else "refunds"
+        response = get_http_client().post_json(
+            f"{self.api_url}/{path}/batch",
+            {"payment_method": payment_method, "items": requests},
+            idempotency_key=hashlib.sha256("\0".join(r["idempotency_key"] for r in requests).encode()).hexdigest()
+        )
+        return response["results"]
+
+
+class _WriteAheadLog:
+    """JSON-lines log of payment intents and settlements."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def replay(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """Return (intents, settlements) keyed by idempotency key.
+
+        A settlement is ``{"result": ..., "at": settled time}``.
+        """
+        intents, settlements = {}, {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn final write
+                if entry["op"] == "intent":
+                    key = entry["request"]["idempotency_key"]
+                    intents[key] = entry["request"]
+                    settlements.pop(key, None)  # a retry of a declined key is pending again
+                else:
+                    settlements[entry["key"]] = {"result": entry["result"], "at": entry.get("at", 0.0)}
+        return intents, settlements
+
+    def append(self, entries: List[Dict[str, Any]], sync: bool) -> None:
+        data = "".join(json.dumps(entry) + "\n" for entry in entries)
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def checkpoint(self, intents: Dict[str, Dict[str, Any]], settlements: Dict[str, Dict[str, Any]]) -> None:
+        """Rewrite the log as one intent (plus settlement, if any) per key."""
+        entries = []
+        for key, request in intents.items():
+            entries.append({"op": "intent", "request": request})
+            if key in settlements:
+                entries.append({"op": "settled", "key": key, **settlements[key]})
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as tmp:
+                tmp.write("".join(json.dumps(entry) + "\n" for entry in entries))
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class _Pending:
+    __slots__ = ("request", "future")
+
+    def __init__(self, request: Dict[str, Any], future: Future):
+        self.request = request
+        self.future = future
+
+
+class PaymentEngine:
+    def __init__(self, processors: Optional[Dict[str, Any]] = None, wal_path: Optional[str] = None,
+                 batch_size: int = 500, flush_interval: float = 0.002, workers: int = 4,
+                 settled_ttl: float = SETTLED_TTL):
+        self.processors = processors or {"default": _default_processor()}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.settled_ttl = settled_ttl
+        self._settled: deque = deque()  # (settled at, key, future), oldest first
+        self._queues: Dict[Tuple[str, str, str], List[_Pending]] = defaultdict(list)
+        self._queued = 0
+        self._requests: Dict[str, Dict[str, Any]] = {}      # idempotency key -> request
+        self._futures: Dict[str, Future] = {}               # idempotency key -> settlement
+        self._cond = threading.Condition()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="payments")
+        self.stats = {"submitted": 0, "deduplicated": 0, "batches": 0, "settled": 0, "failed": 0, "recovered": 0,
+                      "evicted": 0}
+        self._wal = _WriteAheadLog(wal_path) if wal_path else None
+        if self._wal is not None:
+            self._recover()
+        self._dispatcher = threading.Thread(target=self._run, daemon=True, name="payment-dispatcher")
+        self._dispatcher.start()
+
+    def _recover(self) -> None:
+        intents, settlements = self._wal.replay()
+        # Declines and expired results are not remembered, so the checkpoint drops them
+        cutoff = time.time() - self.settled_ttl
+        for key, settlement in list(settlements.items()):
+            if settlement["result"]["status"] != "success" or settlement["at"] < cutoff:
+                del settlements[key]
+                del intents[key]
+        self._wal.checkpoint(intents, settlements)
+        for key, request in sorted(intents.items(), key=lambda item: settlements.get(item[0], {}).get("at", 0.0)):
+            future: Future = Future()
+            self._requests[key] = request
+            self._futures[key] = future
+            if key in settlements:
+                future.set_result(settlements[key]["result"])
+                self._settled.append((settlements[key]["at"], key, future))
+            else:
+                self._queues[self._queue_key(request)].append(_Pending(request, future))
+                self._queued += 1
+                self.stats["recovered"] += 1
+
+    @staticmethod
+    def _queue_key(request: Dict[str, Any]) -> Tuple[str, str, str]:
+        return request["processor"], request["payment_method"], request["kind"]
+
+    def _submit(self, request: Dict[str, Any]) -> Future:
+        if request["processor"] not in self.processors:
+            raise KeyError(f"Unknown payment processor: {request['processor']}")
+        key = request["idempotency_key"]
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Payment engine is shut down")
+            self.stats["submitted"] += 1
+            future = self._futures.get(key)
+            if future is not None:
+                self.stats["deduplicated"] += 1
+                return future
+            future = self._futures[key] = Future()
+            self._requests[key] = request
+            queue = self._queues[self._queue_key(request)]
+            queue.append(_Pending(request, future))
+            self._queued += 1
+            if self._queued == 1 or len(queue) >= self.batch_size:
+                self._cond.notify()
+        return future
+
+    def charge(self, amount: float, payment_method: str, user_id: str,
+               idempotency_key: Optional[str] = None, processor: str = "default") -> Future:
+        """Queue a charge; resolves to the PaymentTools-shaped payment info."""
+        transaction_id = str(uuid.uuid4())
+        return self._submit({
+            "kind": CHARGE,
+            "idempotency_key": idempotency_key or transaction_id,
+            "transaction_id": transaction_id,
+            "amount": amount,
+            "payment_method": payment_method,
+            "user_id": user_id,
+            "processor": processor
+        })
+
+    def refund(self, transaction_id: str, amount: float, payment_method: str,
+               idempotency_key: Optional[str] = None, processor: str = "default") -> Future:
+        """Queue a refund of ``transaction_id``; one refund per transaction by default."""
+        return self._submit({
+            "kind": REFUND,
+            "idempotency_key": idempotency_key or f"refund_{transaction_id}",
+            "refund_id": str(uuid.uuid4()),
+            "transaction_id": transaction_id,
+            "amount": amount,
+            "payment_method": payment_method,
+            "processor": processor
+        })
+
+    def _take_batches(self) -> List[Tuple[Tuple[str, str, str], List[_Pending]]]:
+        with self._cond:
+            while not self._queued and not self._closed:
+                self._cond.wait()
+            # Let the batch fill for up to flush_interval unless a queue is already full
+            if not self._closed and not any(len(q) >= self.batch_size for q in self._queues.values()):
+                self._cond.wait(self.flush_interval)
+            self._queued = 0
+            batches = []
+            for queue_key, queue in self._queues.items():
+                while queue:
+                    batches.append((queue_key, queue[:self.batch_size]))
+                    del queue[:self.batch_size]
+            return batches
+
+    def _run(self) -> None:
+        while True:
+            closing = self._closed
+            for queue_key, batch in self._take_batches():
+                self.stats["batches"] += 1
+                self._executor.submit(self._settle, queue_key, batch)
+            if closing:
+                return
+
+    def _settle(self, queue_key: Tuple[str, str, str], batch: List[_Pending]) -> None:
+        processor_name, payment_method, kind = queue_key
+        requests = [pending.request for pending in batch]
+        try:
+            if self._wal is not None:
+                self._wal.append([{"op": "intent", "request": r} for r in requests], sync=True)
+            outcomes = self.processors[processor_name].settle_batch(kind, payment_method, requests)
+            if len(outcomes) != len(requests):
+                raise RuntimeError(f"Processor {processor_name} returned {len(outcomes)} results "
+                                   f"for {len(requests)} requests")
+        except Exception as e:
+            for pending in batch:
+                self._forget(pending.request["idempotency_key"])
+                pending.future.set_exception(e)
+            return
+
+        results = [_result(request, outcome) for request, outcome in zip(requests, outcomes)]
+        now = time.time()
+        if self._wal is not None:
+            self._wal.append([{"op": "settled", "key": r["idempotency_key"], "result": result, "at": now}
+                              for r, result in zip(requests, results)], sync=False)
+        failed = 0
+        with self._cond:
+            for pending, result in zip(batch, results):
+                key = pending.request["idempotency_key"]
+                if result["status"] == "success":
+                    self._settled.append((now, key, pending.future))
+                else:
+                    # Not remembered: a retry under the same key goes back to the processor
+                    failed += 1
+                    self._futures.pop(key, None)
+                    self._requests.pop(key, None)
+            self.stats["settled"] += len(results) - failed
+            self.stats["failed"] += failed
+            self._evict(now)
+        for pending, result in zip(batch, results):
+            pending.future.set_result(result)
+
+    def _evict(self, now: float) -> None:
+        # Caller holds self._cond
+        cutoff = now - self.settled_ttl
+        while self._settled and self._settled[0][0] < cutoff:
+            _, key, future = self._settled.popleft()
+            if self._futures.get(key) is future:
+                del self._futures[key]
+                self._requests.pop(key, None)
+                self.stats["evicted"] += 1
+
+    def _forget(self, key: str) -> None:
+        # A batch the processor never accepted can be retried under the same key
+        with self._cond:
+            self._futures.pop(key, None)
+            self._requests.pop(key, None)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            self._dispatcher.join()
+        self._executor.shutdown(wait=wait)
+        if self._wal is not None:
+            self._wal.close()
+
+
+def _result(request: Dict[str, Any], outcome: Dict[str, Any]) -> Dict[str, Any]:
+    if request["kind"] == CHARGE:
+        return {
+            "transaction_id": request["transaction_id"],
+            "amount": request["amount"],
+            "payment_method": request["payment_method"],
+            "status": outcome["status"]
+        }
+    return {
+        "refund_id": request["refund_id"],
+        "transaction_id": request["transaction_id"],
+        "amount": request["amount"],
+        "status": outcome["status"]
+    }
+
+
+def _default_processor():
+    api_url = os.getenv("PAYMENT_PROCESSOR_URL")
+    return HTTPProcessor(api_url) if api_url else StubProcessor()
+
+
+_default_engine: Optional[PaymentEngine] = None
+_default_lock = threading.Lock()
+
+
+def get_payment_engine() -> PaymentEngine:
+    """Process-wide engine; PAYMENT_WAL_PATH enables the write-ahead log."""
+    global _default_engine
+    if _default_engine is None:
+        with _default_lock:
+            if _default_engine is None:
+                _default_engine = PaymentEngine(wal_path=os.getenv("PAYMENT_WAL_PATH") or None)
+    return _default_engine
@@ -0,0 +1,136 @@
+from typing import Dict, Any, Optional, Tuple
+import json
+import os
+import threading
+
+import numpy as np
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pricing_rules.json")
+DEFAULT_PLAN_TYPE = "SINGLE"
+
+# (coverage_rate, premium_rate, flat_fee, coverage_percentage)
+Quote = Tuple[float, float, float, float]
+
+
+class CompiledRules:
+    """Immutable lookup tables compiled from a pricing rules document."""
+
+    __slots__ = (
+        "levels", "plan_types", "quotes", "plan_index", "subscriptions",
+        "coverage_rates", "premium_rates", "flat_fees", "mtime_ns"
+    )
+
+    def __init__(self, rules: Dict[str, Any], mtime_ns: int = 0):
+        tiers = rules.get("coverage_tiers") or {}
+        plans = rules.get("plan_types") or {}
+        if not tiers or not plans:
+            raise ValueError("Pricing rules must define coverage_tiers and plan_types")
+
+        tier_rates = {}
+        for level, tier in tiers.items():
+            level = int(level)
+            if level < 1:
+                raise ValueError(f"Invalid coverage level: {level}")
+            tier_rates[level] = (float(tier["coverage"]), float(tier["premium"]))
+
+        surcharge_rate = sum(float(s.get("rate", 0.0)) for s in rules.get("surcharges", []))
+        surcharge_flat = sum(float(s.get("flat_fee", 0.0)) for s in rules.get("surcharges", []))
+
+        self.levels = tuple(sorted(tier_rates))
+        self.plan_types = {name: plan["description"] for name, plan in plans.items()}
+        self.plan_index = {name: i for i, name in enumerate(plans)}
+        # Recurring plans: name -> (monthly fee, covered trips per month)
+        self.subscriptions = {
+            name: (float(plan["subscription"]["monthly_fee"]), int(plan["subscription"]["trips_per_month"]))
+            for name, plan in plans.items() if "subscription" in plan
+        }
+        self.mtime_ns = mtime_ns
+
+        size = self.levels[-1] + 1
+        self.coverage_rates = np.full(size, np.nan)
+        self.premium_rates = np.full((len(plans), size), np.nan)
+        self.flat_fees = np.zeros(len(plans))
+        self.quotes = {}
+
+        for name, plan in plans.items():
+            multiplier = float(plan.get("premium_multiplier", 1.0)) * (1.0 + surcharge_rate)
+            flat_fee = float(plan.get("flat_fee", 0.0)) + surcharge_flat
+            row = self.plan_index[name]
+            self.flat_fees[row] = flat_fee
+            self.quotes[name] = {}
+            for level, (coverage_rate, premium_rate) in tier_rates.items():
+                premium_rate = premium_rate * multiplier
+                self.coverage_rates[level] = coverage_rate
+                self.premium_rates[row, level] = premium_rate
+                self.quotes[name][level] = (coverage_rate, premium_rate, flat_fee, coverage_rate * 100)
+
+        for table in (self.coverage_rates, self.premium_rates, self.flat_fees):
+            table.setflags(write=False)
+
+
+class PricingEngine:
+    """Serves quotes from compiled pricing tables, with hot reload of the rules file."""
+
+    def __init__(self, rules_path: str = DEFAULT_RULES_PATH):
+        self.rules_path = rules_path
+        self.version = 0
+        self._lock = threading.Lock()
+        self._rules = None
+        self.reload()
+
+    @property
+    def rules(self) -> CompiledRules:
+        return self._rules
+
+    def reload(self) -> CompiledRules:
+        """Load and compile the rules file, swapping it in atomically.
+
+        On a malformed file the previous rules stay active and the error is raised.
+        """
+        with self._lock:
+            mtime_ns = os.stat(self.rules_path).st_mtime_ns
+            with open(self.rules_path) as f:
+                compiled = CompiledRules(json.load(f), mtime_ns)
+            self._rules = compiled
+            self.version += 1
+            return compiled
+
+    def reload_if_changed(self) -> bool:
+        """Reload the rules if the file changed on disk."""
+        if os.stat(self.rules_path).st_mtime_ns == self._rules.mtime_ns:
+            return False
+        self.reload()
+        return True
+
+    def quote(self, ticket_price: float, coverage_level: int,
+              plan_type: str = DEFAULT_PLAN_TYPE) -> Tuple[float, float, float]:
+        """Return (coverage_amount, premium_amount, coverage_percentage)."""
+        coverage_rate, premium_rate, flat_fee, coverage_percentage = \
+            self._rules.quotes[plan_type][coverage_level]
+        return (ticket_price * coverage_rate,
+                ticket_price * premium_rate + flat_fee,
+                coverage_percentage)
+
+    def plan_types(self) -> Dict[str, str]:
+        return dict(self._rules.plan_types)
+
+    def subscription_terms(self, plan_type: str) -> Optional[Tuple[float, int]]:
+        """(monthly fee, trips per month) of a recurring plan, or None for a per-trip plan."""
+        return self._rules.subscriptions.get(plan_type)
+
+    def coverage_levels(self) -> Tuple[int, ...]:
+        return self._rules.levels
+
+
+_default_engine: Optional[PricingEngine] = None
+_default_lock = threading.Lock()
+
+
+def get_pricing_engine() -> PricingEngine:
+    """Return the process-wide pricing engine, loading rules on first use."""
+    global _default_engine
+    if _default_engine is None:
+        with _default_lock:
+            if _default_engine is None:
+                _default_engine = PricingEngine(os.getenv("PRICING_RULES_PATH", DEFAULT_RULES_PATH))
+    return _default_engine
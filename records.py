@@ -0,0 +1,260 @@
+"""Compact storage for the policies table, the largest table the system keeps.
+
+``Policy`` is a slotted record (no per-instance ``__dict__``) that converts
+to and from the dict shape TravelInsuranceSystem stores, losslessly.
+``PolicyColumnStore`` builds on it: numbers live in typed arrays and
+repeated strings (user IDs, plan types, payment methods) are interned once.
+It backs ``InMemoryStorage(columnar_policies=True)``. See
+benchmarks/bench_record_memory.py for bytes per policy.
+"""
+
+from array import array
+from typing import Dict, Any, Iterator, List, Optional
+
+from storage import Table
+
+
+# Fields Policy keeps in slots; anything else a record carries (subscription_id,
+# payment timestamps, ...) goes in its overflow dicts
+POLICY_FIELDS = frozenset({"ticket_number", "user_id", "transaction_id", "coverage_level", "plan_type",
+                           "coverage_amount", "premium_amount", "status", "payment_info", "attempt"})
+PAYMENT_FIELDS = frozenset({"transaction_id", "amount", "payment_method", "status"})
+
+
+class Policy:
+    """A policy references its payment by transaction_id instead of embedding it."""
+
+    __slots__ = ("ticket_number", "user_id", "transaction_id", "coverage_level", "plan_type",
+                 "coverage_amount", "premium_amount", "payment_method", "payment_status", "status",
+                 "payment_amount", "attempt", "extra", "payment_extra")
+
+    def __init__(self, ticket_number: str, user_id: str, transaction_id: str, coverage_level: int,
+                 plan_type: str, coverage_amount: float, premium_amount: float,
+                 payment_method: str, payment_status: str, status: str = "active",
+                 payment_amount: Optional[float] = None, attempt: int = 0,
+                 extra: Optional[Dict[str, Any]] = None, payment_extra: Optional[Dict[str, Any]] = None):
+        self.ticket_number = ticket_number
+        self.user_id = user_id
+        self.transaction_id = transaction_id
+        self.coverage_level = coverage_level
+        self.plan_type = plan_type
+        self.coverage_amount = coverage_amount
+        self.premium_amount = premium_amount
+        self.payment_method = payment_method
+        self.payment_status = payment_status
+        self.status = status
+        # A subscription trip's payment is the monthly charge, not the premium
+        self.payment_amount = premium_amount if payment_amount is None else payment_amount
+        self.attempt = attempt
+        self.extra = extra or None
+        self.payment_extra = payment_extra or None
+
+    @classmethod
+    def from_dict(cls, ticket_number: str, data: Dict[str, Any]) -> "Policy":
+        payment_info = data["payment_info"]
+        return cls(ticket_number, data["user_id"], payment_info["transaction_id"],
+                   data["coverage_level"], data.get("plan_type", "SINGLE"),
+                   data["coverage_amount"], data["premium_amount"],
+                   payment_info["payment_method"], payment_info["status"],
+                   data.get("status", "active"), payment_info.get("amount"), data.get("attempt", 0),
+                   {k: v for k, v in data.items() if k not in POLICY_FIELDS},
+                   {k: v for k, v in payment_info.items() if k not in PAYMENT_FIELDS})
+
+    def to_dict(self) -> Dict[str, Any]:
+        payment_info = {
+            "transaction_id": self.transaction_id,
+            "amount": self.payment_amount,
+            "payment_method": self.payment_method,
+            "status": self.payment_status
+        }
+        if self.payment_extra:
+            payment_info.update(self.payment_extra)
+        record = {
+            "ticket_number": self.ticket_number,
+            "user_id": self.user_id,
+            "transaction_id": self.transaction_id,
+            "coverage_level": self.coverage_level,
+            "plan_type": self.plan_type,
+            "coverage_amount": self.coverage_amount,
+            "premium_amount": self.premium_amount,
+            "status": self.status,
+            "payment_info": payment_info,
+            "attempt": self.attempt
+        }
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+
+class StringPool:
+    """Interns repeated strings as small integer codes."""
+
+    __slots__ = ("values", "codes")
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class PolicyColumnStore(Table):
+    """Columnar policies table, keyed by ticket number.
+
+    Stored dicts are decomposed into typed columns and rebuilt on read, so
+    reads return a fresh dict in the shape ``store_policy`` writes. Fields
+    without a column (subscription_id, extra payment fields) go in
+    sparse per-row overflow dicts. Rewriting a policy updates its row in
+    place; deleted rows are tombstoned and their slots are not reused.
+    """
+
+    name = "policies"
+    indexes = ("user_id", "transaction_id")
+
+    def __init__(self):
+        self._rows: Dict[str, int] = {}              # ticket_number -> row
+        self._by_user: Dict[int, List[int]] = {}     # user code -> rows
+        self._by_transaction: Dict[str, int] = {}    # transaction_id -> row
+        self._tickets: List[Optional[str]] = []
+        self._transactions: List[str] = []
+        self._users = StringPool()
+        self._labels = StringPool()                  # plan types, payment methods, statuses
+        self._status = array("h")
+        self._user = array("l")
+        self._coverage_level = array("b")
+        self._plan_type = array("h")
+        self._payment_method = array("h")
+        self._payment_status = array("h")
+        self._coverage_amount = array("d")
+        self._premium_amount = array("d")
+        self._payment_amount = array("d")
+        self._attempt = array("i")
+        self._extra: Dict[int, Dict[str, Any]] = {}          # row -> fields without a column
+        self._payment_extra: Dict[int, Dict[str, Any]] = {}  # row -> payment fields without a column
+
+    def add(self, policy: Policy) -> None:
+        user = self._users.code(policy.user_id)
+        row = self._rows.get(policy.ticket_number)
+        if row is None:
+            row = len(self._tickets)
+            self._rows[policy.ticket_number] = row
+            self._by_user.setdefault(user, []).append(row)
+            self._by_transaction[policy.transaction_id] = row
+            self._tickets.append(policy.ticket_number)
+            self._transactions.append(policy.transaction_id)
+            for column in (self._user, self._coverage_level, self._plan_type, self._payment_method,
+                           self._payment_status, self._status, self._coverage_amount,
+                           self._premium_amount, self._payment_amount, self._attempt):
+                column.append(0)
+        else:
+            if self._user[row] != user:
+                self._by_user[self._user[row]].remove(row)
+                self._by_user.setdefault(user, []).append(row)
+            if self._transactions[row] != policy.transaction_id:
+                if self._by_transaction.get(self._transactions[row]) == row:
+                    del self._by_transaction[self._transactions[row]]
+                self._by_transaction[policy.transaction_id] = row
+                self._transactions[row] = policy.transaction_id
+        self._user[row] = user
+        self._coverage_level[row] = policy.coverage_level
+        self._plan_type[row] = self._labels.code(policy.plan_type)
+        self._payment_method[row] = self._labels.code(policy.payment_method)
+        self._payment_status[row] = self._labels.code(policy.payment_status)
+        self._status[row] = self._labels.code(policy.status)
+        self._coverage_amount[row] = policy.coverage_amount
+        self._premium_amount[row] = policy.premium_amount
+        self._payment_amount[row] = policy.payment_amount
+        self._attempt[row] = policy.attempt
+        self._set_overflow(self._extra, row, policy.extra)
+        self._set_overflow(self._payment_extra, row, policy.payment_extra)
+
+    @staticmethod
+    def _set_overflow(overflow: Dict[int, Dict[str, Any]], row: int, fields: Optional[Dict[str, Any]]) -> None:
+        if fields:
+            overflow[row] = fields
+        else:
+            overflow.pop(row, None)
+
+    def policy(self, row: int) -> Policy:
+        labels = self._labels.values
+        return Policy(
+            self._tickets[row], self._users.values[self._user[row]], self._transactions[row],
+            self._coverage_level[row], labels[self._plan_type[row]],
+            self._coverage_amount[row], self._premium_amount[row],
+            labels[self._payment_method[row]], labels[self._payment_status[row]],
+            labels[self._status[row]], self._payment_amount[row], self._attempt[row],
+            self._extra.get(row), self._payment_extra.get(row)
+        )
+
+    def get_policy(self, ticket_number: str) -> Optional[Policy]:
+        row = self._rows.get(ticket_number)
+        return None if row is None else self.policy(row)
+
+    def __getitem__(self, ticket_number: str) -> Dict[str, Any]:
+        return self.policy(self._rows[ticket_number]).to_dict()
+
+    def __setitem__(self, ticket_number: str, record: Dict[str, Any]) -> None:
+        self.add(Policy.from_dict(ticket_number, record))
+
+    def __delitem__(self, ticket_number: str) -> None:
+        row = self._rows.pop(ticket_number)
+        self._by_user[self._user[row]].remove(row)
+        if self._by_transaction.get(self._transactions[row]) == row:
+            del self._by_transaction[self._transactions[row]]
+        self._tickets[row] = None
+        self._extra.pop(row, None)
+        self._payment_extra.pop(row, None)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, ticket_number: object) -> bool:
+        return ticket_number in self._rows
+
+    def freeze(self) -> "PolicyColumnStore":
+        """Copy of the rows as of now; the copy serves ``items()`` but shares the live secondary indexes.
+
+        Only the row map and columns are copied (memcpy for the arrays), so
+        building the dicts can happen after writes resume.
+        """
+        frozen = PolicyColumnStore.__new__(PolicyColumnStore)
+        frozen.__dict__.update(self.__dict__)
+        frozen._rows = dict(self._rows)
+        frozen._tickets = list(self._tickets)
+        frozen._transactions = list(self._transactions)
+        for name in ("_status", "_user", "_coverage_level", "_plan_type", "_payment_method",
+                     "_payment_status", "_coverage_amount", "_premium_amount", "_payment_amount", "_attempt"):
+            setattr(frozen, name, getattr(self, name)[:])
+        frozen._extra = dict(self._extra)
+        frozen._payment_extra = dict(self._payment_extra)
+        return frozen
+
+    def find_by(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        self._check_index(field)
+        if field == "user_id":
+            user = self._users.codes.get(value)
+            rows = self._by_user.get(user, []) if user is not None else []
+        else:
+            row = self._by_transaction.get(value)
+            rows = [row] if row is not None else []
+        return [self.policy(row).to_dict() for row in rows]
+
+    def live_rows(self) -> array:
+        """Row numbers of the policies currently in the table."""
+        return array("l", self._rows.values())
+
+    def columns(self) -> Dict[str, array]:
+        """Raw numeric columns for vectorized analysis; index them with ``live_rows()``."""
+        return {
+            "coverage_level": self._coverage_level,
+            "coverage_amount": self._coverage_amount,
+            "premium_amount": self._premium_amount
+        }
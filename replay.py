@@ -0,0 +1,225 @@
+"""Stream a JSONL file of operations through TravelInsuranceSystem.
+
+Each input line is one operation:
+
+    {"id": "u1", "op": "register", "args": {"email": "a@b.com", "mac_address": "00:1A:2B:3C:4D:5E"}}
+    {"op": "verify_ticket", "args": {"ticket_number": "ABC123", "user_id": "@u1.user_id"}}
+
+An argument of the form "@<id>.<field>" is replaced with that field from the
+result of the earlier operation tagged <id>. Operations that share a user_id
+argument run in file order, and operations for different users run
+concurrently. The input is read lazily and the results are written as JSONL
+while the replay runs, in input order.
+
+When the input is a file, a first pass counts how often each id is
+referenced. A tagged result is then kept only until its last reference has
+been resolved, so memory stays flat however long the file is. Input from
+stdin cannot be scanned ahead, so every tagged result is kept.
+
+Usage:
+    python replay.py ops.jsonl [-o results.jsonl] [-c 8] [--db insurance.db]
+"""
+
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, Iterable, Iterator, Optional, TextIO
+import argparse
+import json
+import resource
+import sys
+import threading
+import time
+
+from main import TravelInsuranceSystem
+from storage import open_storage
+
+OPERATIONS = {
+    "register": "register_user",
+    "verify_ticket": "process_flight_purchase",
+    "purchase": "purchase_insurance",
+    "claim": "process_claim",
+    "refund": "process_refund",
+}
+
+
+def read_operations(stream: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Yield parsed operations, skipping blank lines."""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            operation = json.loads(line)
+        except json.JSONDecodeError as e:
+            operation = {"op": None, "error": f"Invalid JSON: {e}"}
+        operation["line"] = line_number
+        yield operation
+
+
+def _references(operation: Dict[str, Any]) -> Iterator[str]:
+    for value in operation.get("args", {}).values():
+        if isinstance(value, str) and value.startswith("@") and "." in value:
+            yield value[1:].split(".", 1)[0]
+
+
+def count_references(operations: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """Number of "@<id>.<field>" arguments naming each id."""
+    counts: Dict[str, int] = {}
+    for operation in operations:
+        for ref in _references(operation):
+            counts[ref] = counts.get(ref, 0) + 1
+    return counts
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class ReplayEngine:
+    """Replays operations with bounded concurrency and collects latency stats."""
+
+    def __init__(self, system: TravelInsuranceSystem, concurrency: int = 8,
+                 references: Optional[Dict[str, int]] = None):
+        self.system = system
+        self.concurrency = max(1, concurrency)
+        # Remaining references per id (see count_references); None keeps every tagged result
+        self._references = references
+        self._results: Dict[str, Future] = {}
+        self._results_lock = threading.Lock()
+        self._last_for_user: Dict[str, Future] = {}
+        self._user_lock = threading.Lock()
+        self.latencies_ms = array("d")
+        self.errors = 0
+
+    def _resolve(self, value: Any) -> Any:
+        if isinstance(value, str) and value.startswith("@") and "." in value:
+            ref, field = value[1:].split(".", 1)
+            with self._results_lock:
+                future = self._results.get(ref)
+                if future is not None and self._references is not None:
+                    self._references[ref] -= 1
+                    if self._references[ref] <= 0:
+                        del self._results[ref], self._references[ref]
+            if future is not None:
+                result, _ = future.result()
+                return result.get(field)
+        return value
+
+    def _execute(self, operation: Dict[str, Any]) -> Dict[str, Any]:
+        if "error" in operation:
+            return {"status": "error", "message": operation["error"]}
+        # Resolved even for an unknown op, so its references are released
+        args = {key: self._resolve(value) for key, value in operation.get("args", {}).items()}
+        method_name = OPERATIONS.get(operation.get("op"))
+        if method_name is None:
+            return {"status": "error", "message": f"Unknown op: {operation.get('op')}"}
+
+        try:
+            return getattr(self.system, method_name)(**args)
+        except Exception as e:
+            return {"status": "error", "message": f"{type(e).__name__}: {e}"}
+
+    def _timed(self, operation: Dict[str, Any], previous: Optional[Future]):
+        if previous is not None:
+            previous.result()
+        start = time.perf_counter()
+        result = self._execute(operation)
+        return result, (time.perf_counter() - start) * 1000
+
+    def run(self, operations: Iterable[Dict[str, Any]], output: Optional[TextIO] = None) -> Dict[str, Any]:
+        """Replay ``operations``, writing one result line per operation to ``output``."""
+        start = time.perf_counter()
+        window: deque = deque()
+
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            for operation in operations:
+                future = self._submit(executor, operation)
+                if "id" in operation and (self._references is None or operation["id"] in self._references):
+                    with self._results_lock:
+                        self._results[operation["id"]] = future
+                window.append((operation, future))
+                if len(window) >= self.concurrency * 2:
+                    self._emit(*window.popleft(), output)
+            while window:
+                self._emit(*window.popleft(), output)
+
+        elapsed = time.perf_counter() - start
+        latencies = sorted(self.latencies_ms)
+        return {
+            "operations": len(latencies),
+            "errors": self.errors,
+            "elapsed_seconds": elapsed,
+            "ops_per_second": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        }
+
+    def _submit(self, executor: ThreadPoolExecutor, operation: Dict[str, Any]) -> Future:
+        # Chain each operation behind the previous one for the same user
+        user_key = operation.get("args", {}).get("user_id")
+        if not user_key:
+            return executor.submit(self._timed, operation, None)
+        with self._user_lock:
+            future = executor.submit(self._timed, operation, self._last_for_user.get(user_key))
+            self._last_for_user[user_key] = future
+        future.add_done_callback(partial(self._release_user, user_key))
+        return future
+
+    def _release_user(self, user_key: str, future: Future) -> None:
+        with self._user_lock:
+            if self._last_for_user.get(user_key) is future:
+                del self._last_for_user[user_key]
+
+    def _emit(self, operation: Dict[str, Any], future: Future, output: Optional[TextIO]) -> None:
+        result, latency_ms = future.result()
+        self.latencies_ms.append(latency_ms)
+        if result.get("status") != "success":
+            self.errors += 1
+        if output is not None:
+            output.write(json.dumps({
+                "line": operation["line"],
+                "id": operation.get("id"),
+                "op": operation.get("op"),
+                "latency_ms": round(latency_ms, 3),
+                "result": result
+            }, default=str) + "\n")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a JSONL operations file through TravelInsuranceSystem")
+    parser.add_argument("input", help="JSONL operations file, or - for stdin")
+    parser.add_argument("-o", "--output", help="Write JSONL results to this file")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--db", help="SQLite database path (default: in-memory storage)")
+    args = parser.parse_args(argv)
+
+    references = None
+    if args.input != "-":
+        with open(args.input) as f:
+            references = count_references(read_operations(f))
+
+    system = TravelInsuranceSystem(open_storage(args.db))
+    engine = ReplayEngine(system, args.concurrency, references)
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    output = open(args.output, "w", buffering=1 << 16) if args.output else None
+    try:
+        stats = engine.run(read_operations(source), output)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not None:
+            output.close()
+        system.storage.close()
+
+    print(json.dumps(stats, indent=2), file=sys.stderr)
+    return 0 if stats["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
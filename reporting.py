@@ -0,0 +1,213 @@
+"""Materialized reporting aggregates, maintained as the system writes.
+
+TravelInsuranceSystem updates these counters on every registration,
+purchase, subscription charge, claim payout and refund, so building a report
+never scans storage. Running totals cover users, active policies by coverage level and
+plan type, premium collected, payouts, refunds and the loss ratio. Activity
+is also bucketed into minute, hour and day rollups kept in fixed-size rings,
+so windowed totals cost the same at any data volume.
+
+``load`` seeds the totals from existing storage with one pass at startup.
+Stored claims are also added to the rollups by their ``filed_at`` time.
+Users and policies carry no timestamp, so they only count toward the totals.
+"""
+
+from collections import Counter
+from typing import Dict, Any, List, Optional, Set
+import threading
+import time
+
+ACTIVE = "active"
+CLAIMED = "claimed"
+REFUNDED = "refunded"
+
+FIELDS = ("registrations", "policies_sold", "premium_collected", "claims_paid", "payouts",
+          "refunds", "refunded_amount")
+_INDEX = {field: i for i, field in enumerate(FIELDS)}
+
+# name -> (bucket seconds, buckets kept)
+ROLLUPS = {"minute": (60, 60), "hour": (3600, 48), "day": (86_400, 90)}
+
+
+class _Rollup:
+    """Ring of fixed-width time buckets; a slot is reset when its bucket comes round again."""
+
+    __slots__ = ("resolution", "epochs", "values", "latest")
+
+    def __init__(self, resolution: int, slots: int):
+        self.resolution = resolution
+        self.latest = -1
+        self.epochs = [-1] * slots
+        self.values = [[0.0] * len(FIELDS) for _ in range(slots)]
+
+    def _slot(self, epoch: int) -> List[float]:
+        i = epoch % len(self.epochs)
+        if self.epochs[i] != epoch:
+            self.epochs[i] = epoch
+            self.values[i] = [0.0] * len(FIELDS)
+        return self.values[i]
+
+    def add(self, ts: float, deltas: Dict[str, float]) -> None:
+        epoch = int(ts // self.resolution)
+        if epoch <= self.latest - len(self.epochs):
+            return  # older than the ring keeps
+        self.latest = max(self.latest, epoch)
+        slot = self._slot(epoch)
+        for field, delta in deltas.items():
+            slot[_INDEX[field]] += delta
+
+    def series(self, now: float, count: int) -> List[Dict[str, Any]]:
+        """The last ``count`` buckets up to ``now``, oldest first."""
+        current = int(now // self.resolution)
+        out = []
+        for epoch in range(current - min(count, len(self.epochs)) + 1, current + 1):
+            i = epoch % len(self.epochs)
+            values = self.values[i] if self.epochs[i] == epoch else None
+            out.append({
+                "start": epoch * self.resolution,
+                **{field: values[j] if values else 0.0 for j, field in enumerate(FIELDS)}
+            })
+        return out
+
+    def window(self, now: float, count: int) -> Dict[str, float]:
+        current = int(now // self.resolution)
+        totals = [0.0] * len(FIELDS)
+        for i, epoch in enumerate(self.epochs):
+            if current - count < epoch <= current:
+                totals = [a + b for a, b in zip(totals, self.values[i])]
+        return dict(zip(FIELDS, totals))
+
+
+class ReportingAggregates:
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._loaded: Set[int] = set()
+        self.total_users = 0
+        self.active_by_level: Counter = Counter()
+        self.active_by_plan: Counter = Counter()
+        self.totals = dict.fromkeys(FIELDS, 0.0)
+        self.rollups = {name: _Rollup(*spec) for name, spec in ROLLUPS.items()}
+
+    def _add(self, deltas: Dict[str, float], ts: Optional[float] = None) -> None:
+        ts = self._clock() if ts is None else ts
+        for field, delta in deltas.items():
+            self.totals[field] += delta
+        for rollup in self.rollups.values():
+            rollup.add(ts, deltas)
+
+    def record_registration(self) -> None:
+        with self._lock:
+            self.total_users += 1
+            self._add({"registrations": 1})
+
+    def record_policy(self, coverage_level: int, plan_type: str, premium: float,
+                      replaced: Optional[Dict[str, Any]] = None) -> None:
+        """Count a new active policy; ``replaced`` is the earlier policy on the same ticket, if any."""
+        with self._lock:
+            if replaced is not None:
+                self._deactivate(replaced)
+            self.active_by_level[coverage_level] += 1
+            self.active_by_plan[plan_type] += 1
+            self._add({"policies_sold": 1, "premium_collected": premium})
+
+    def record_subscription_charge(self, amount: float) -> None:
+        """Count a subscription's monthly fee as premium; its trips are sold at no premium."""
+        with self._lock:
+            self._add({"premium_collected": amount})
+
+    def _deactivate(self, policy: Dict[str, Any]) -> None:
+        if policy.get("status", ACTIVE) == ACTIVE:
+            self.active_by_level[policy["coverage_level"]] -= 1
+            self.active_by_plan[policy.get("plan_type")] -= 1
+
+    def record_claim(self, amount: float, policy: Optional[Dict[str, Any]],
+                     filed_at: Optional[float] = None) -> None:
+        with self._lock:
+            if policy is not None:
+                self._deactivate(policy)
+            self._add({"claims_paid": 1, "payouts": amount}, filed_at)
+
+    def record_refund(self, amount: float, policy: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            if policy is not None:
+                self._deactivate(policy)
+            self._add({"refunds": 1, "refunded_amount": amount})
+
+    def load(self, storage) -> None:
+        """Seed the aggregates from ``storage``; loading the same backend again is a no-op."""
+        if id(storage) in self._loaded:
+            return
+        self._loaded.add(id(storage))
+        self.load_records(storage)
+
+    def load_records(self, tables, sign: int = 1) -> None:
+        """Add the records of a storage backend or a dict of tables; ``sign=-1`` takes them out.
+
+        The shard router uses this for users moved between shards.
+        """
+        def table(name: str):
+            return tables[name] if isinstance(tables, dict) else getattr(tables, name)
+
+        with self._lock:
+            users = len(table("users"))
+            self.total_users += sign * users
+            self.totals["registrations"] += sign * users
+            for policy in table("policies").values():
+                self.totals["policies_sold"] += sign
+                self.totals["premium_collected"] += sign * policy["premium_amount"]
+                if policy.get("status", ACTIVE) == ACTIVE:
+                    self.active_by_level[policy["coverage_level"]] += sign
+                    self.active_by_plan[policy.get("plan_type")] += sign
+            for payment in table("payments").values():
+                if payment.get("subscription_id") is not None:
+                    self.totals["premium_collected"] += sign * payment["amount"]
+                if payment.get("status") == REFUNDED:
+                    self.totals["refunds"] += sign
+                    self.totals["refunded_amount"] += sign * payment["amount"]
+            for claim in table("claims").values():
+                if claim.get("status") == "success":
+                    self._add({"claims_paid": sign, "payouts": sign * claim["amount"]},
+                              claim.get("filed_at", 0.0))
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Current totals plus last-hour, last-day and last-30-day windows."""
+        now = self._clock() if now is None else now
+        with self._lock:
+            net_premium = self.totals["premium_collected"] - self.totals["refunded_amount"]
+            return {
+                "total_users": self.total_users,
+                "active_policies": sum(self.active_by_level.values()),
+                "active_policies_by_coverage_level": {k: v for k, v in sorted(self.active_by_level.items()) if v},
+                "active_policies_by_plan_type": {k: v for k, v in sorted(self.active_by_plan.items()) if v},
+                "premium_collected": self.totals["premium_collected"],
+                "refunded_amount": self.totals["refunded_amount"],
+                "payouts": self.totals["payouts"],
+                "claims_paid": int(self.totals["claims_paid"]),
+                "loss_ratio": self.totals["payouts"] / net_premium if net_premium else 0.0,
+                "windows": {
+                    "last_hour": self.rollups["minute"].window(now, 60),
+                    "last_day": self.rollups["hour"].window(now, 24),
+                    "last_30_days": self.rollups["day"].window(now, 30)
+                }
+            }
+
+    def series(self, rollup: str, count: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Per-bucket activity for charts, e.g. ``series("minute", 60)``."""
+        now = self._clock() if now is None else now
+        with self._lock:
+            return self.rollups[rollup].series(now, count)
+
+
+_default_reports: Optional[ReportingAggregates] = None
+_default_lock = threading.Lock()
+
+
+def get_reports() -> ReportingAggregates:
+    """Process-wide aggregates shared by every TravelInsuranceSystem, like the metrics registry."""
+    global _default_reports
+    if _default_reports is None:
+        with _default_lock:
+            if _default_reports is None:
+                _default_reports = ReportingAggregates()
+    return _default_reports
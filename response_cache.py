@@ -0,0 +1,422 @@
+"""Response cache for agent LLM calls, persisted to a memory-mapped file.
+
+Responses are keyed on the normalized prompt, the model and the tool context
+(any JSON-serializable dict, e.g. the coverage tier being asked about). With
+an embedder configured, an exact miss falls back to the most similar cached
+prompt for the same model and context, if its cosine similarity clears the
+threshold. ``HashingEmbedder`` is a local stub, so both tiers work offline.
+
+On disk, the cache is an append-only file of records. It is read through
+``mmap`` and reindexed when opened, so entries survive restarts; a record
+torn by a crash mid-append is cut off then. Evicted and expired records are
+dropped when the file is compacted.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+# key, bucket (model + context), expires_at, prompt length, response length
+_HEADER = struct.Struct("<32s32sdII")
+# Words and numbers; keeps decimals, thousands separators and a leading sign
+_WORD = re.compile(r"(?:(?<!\w)[-+](?=\d))?\w+(?:[.,]\w+)*")
+COMPACT_MIN_BYTES = 1 << 20
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Fold case and reduce to words, so spacing and punctuation don't split keys.
+
+    NFKC first, so full-width and compatibility forms match their plain
+    spellings. "$1,500.50" and "-5" keep their separators and sign.
+    """
+    return " ".join(_WORD.findall(unicodedata.normalize("NFKC", prompt).casefold()))
+
+
+def _bucket(model: str, context: Optional[Dict[str, Any]]) -> bytes:
+    label = f"{model}\0{json.dumps(context or {}, sort_keys=True, default=str)}"
+    return hashlib.sha256(label.encode()).digest()
+
+
+def _key(bucket: bytes, normalized: str) -> bytes:
+    return hashlib.sha256(bucket + normalized.encode()).digest()
+
+
+class HashingEmbedder:
+    """Offline embedding stub: hashed word and word-pair counts, L2-normalized."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def __call__(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = text.split()
+        for feature in words + [a + " " + b for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            vector[int.from_bytes(digest, "little") % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class _DiskLog:
+    """Append-only record file read through mmap."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a+b")
+        self._map: Optional[mmap.mmap] = None
+        self._remap()
+        valid_end = self._valid_end()
+        if valid_end < self.size:
+            # Drop a torn tail so new records follow the last complete one
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._file.truncate(valid_end)
+            self._remap()
+
+    def _remap(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.flush()
+        if os.fstat(self._file.fileno()).st_size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def size(self) -> int:
+        return os.fstat(self._file.fileno()).st_size
+
+    def append(self, key: bytes, bucket: bytes, expires_at: float, prompt: str, text: str) -> int:
+        prompt_bytes, text_bytes = prompt.encode(), text.encode()
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell()
+        self._file.write(_HEADER.pack(key, bucket, expires_at, len(prompt_bytes), len(text_bytes)))
+        self._file.write(prompt_bytes)
+        self._file.write(text_bytes)
+        self._file.flush()
+        return offset
+
+    def read(self, offset: int) -> Tuple[bytes, bytes, float, str, str]:
+        if self._map is None or offset + _HEADER.size > len(self._map):
+            self._remap()
+        key, bucket, expires_at, prompt_len, text_len = _HEADER.unpack_from(self._map, offset)
+        start = offset + _HEADER.size
+        if start + prompt_len + text_len > len(self._map):
+            self._remap()
+        prompt = self._map[start:start + prompt_len].decode()
+        text = self._map[start + prompt_len:start + prompt_len + text_len].decode()
+        return key, bucket, expires_at, prompt, text
+
+    def _offsets(self):
+        """Yield (offset, length) for every complete record, stopping at a torn tail."""
+        if self._map is None:
+            return
+        offset, end = 0, len(self._map)
+        while offset + _HEADER.size <= end:
+            _, _, _, prompt_len, text_len = _HEADER.unpack_from(self._map, offset)
+            length = _HEADER.size + prompt_len + text_len
+            if offset + length > end:
+                break
+            yield offset, length
+            offset += length
+
+    def _valid_end(self) -> int:
+        end = 0
+        for offset, length in self._offsets():
+            end = offset + length
+        return end
+
+    def scan(self):
+        """Yield (offset, record) for every complete record."""
+        self._remap()
+        for offset, _ in self._offsets():
+            yield offset, self.read(offset)
+
+    def rewrite(self, records: List[Tuple[bytes, bytes, float, str, str]]) -> List[int]:
+        """Replace the file with ``records`` and return their new offsets."""
+        tmp_path = self.path + ".tmp"
+        offsets = []
+        with open(tmp_path, "wb") as tmp:
+            for key, bucket, expires_at, prompt, text in records:
+                offsets.append(tmp.tell())
+                prompt_bytes, text_bytes = prompt.encode(), text.encode()
+                tmp.write(_HEADER.pack(key, bucket, expires_at, len(prompt_bytes), len(text_bytes)))
+                tmp.write(prompt_bytes)
+                tmp.write(text_bytes)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a+b")
+        self._remap()
+        return offsets
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+class _BucketVectors:
+    """Embeddings of one bucket's prompts as rows of a matrix updated in place.
+
+    Removed rows are zeroed and reused, and the matrix grows by doubling, so
+    a put or eviction never restacks the bucket.
+    """
+
+    __slots__ = ("rows", "keys", "free", "matrix")
+
+    def __init__(self):
+        self.rows: Dict[bytes, int] = {}
+        self.keys: List[Optional[bytes]] = []
+        self.free: List[int] = []
+        self.matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, key: bytes, vector: np.ndarray) -> None:
+        row = self.rows.get(key)
+        if row is None:
+            if self.free:
+                row = self.free.pop()
+            else:
+                row = len(self.keys)
+                self.keys.append(None)
+                if self.matrix is None or row == len(self.matrix):
+                    grown = np.zeros((max(8, 2 * row), vector.shape[0]), dtype=np.float32)
+                    if self.matrix is not None:
+                        grown[:row] = self.matrix
+                    self.matrix = grown
+            self.rows[key] = row
+            self.keys[row] = key
+        self.matrix[row] = vector
+
+    def discard(self, key: bytes) -> None:
+        row = self.rows.pop(key, None)
+        if row is not None:
+            self.matrix[row] = 0.0
+            self.keys[row] = None
+            self.free.append(row)
+
+    def best(self, query: np.ndarray) -> Tuple[Optional[bytes], float]:
+        """The most similar key and its score."""
+        scores = self.matrix[:len(self.keys)] @ query
+        row = int(np.argmax(scores))
+        return self.keys[row], float(scores[row])
+
+
+class _Entry:
+    __slots__ = ("bucket", "expires_at", "prompt", "text", "offset")
+
+    def __init__(self, bucket: bytes, expires_at: float, prompt: str, text: str, offset: Optional[int]):
+        self.bucket = bucket
+        self.expires_at = expires_at
+        self.prompt = prompt
+        self.text = text
+        self.offset = offset
+
+
+class ResponseCache:
+    """Exact plus optional similarity cache of model responses, with per-agent stats."""
+
+    def __init__(self, path: Optional[str] = None, maxsize: int = 50_000, ttl: float = 86_400.0,
+                 embedder: Optional[Callable[[str], np.ndarray]] = None,
+                 similarity_threshold: float = 0.9, clock: Callable[[], float] = time.time):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[bytes, _Entry]" = OrderedDict()
+        self._vectors: Dict[bytes, _BucketVectors] = {}
+        self._agents: Dict[str, Dict[str, int]] = {}
+        self._dead_bytes = 0
+        self._log = _DiskLog(path) if path else None
+        if self._log is not None:
+            self._load()
+
+    def _load(self) -> None:
+        now = self._clock()
+        for offset, (key, bucket, expires_at, prompt, text) in self._log.scan():
+            if key in self._entries:
+                self._remove(key)
+            if expires_at > now:
+                self._insert(key, _Entry(bucket, expires_at, prompt, text, offset))
+        self._evict()
+
+    def _insert(self, key: bytes, entry: _Entry, vector: Optional[np.ndarray] = None) -> None:
+        self._entries[key] = entry
+        if self.embedder is not None:
+            if vector is None:
+                vector = self.embedder(entry.prompt)
+            vectors = self._vectors.get(entry.bucket)
+            if vectors is None:
+                vectors = self._vectors[entry.bucket] = _BucketVectors()
+            vectors.add(key, vector)
+
+    def _remove(self, key: bytes) -> None:
+        entry = self._entries.pop(key)
+        if entry.offset is not None:
+            self._dead_bytes += _HEADER.size + len(entry.prompt.encode()) + len(entry.text.encode())
+        vectors = self._vectors.get(entry.bucket)
+        if vectors is not None:
+            vectors.discard(key)
+            if not vectors:
+                del self._vectors[entry.bucket]
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def _similar(self, bucket: bytes, query: np.ndarray, now: float) -> Optional[bytes]:
+        vectors = self._vectors.get(bucket)
+        if not vectors:
+            return None
+        key, score = vectors.best(query)
+        if key is None or score < self.similarity_threshold:
+            return None
+        if self._entries[key].expires_at <= now:
+            self._remove(key)
+            return None
+        return key
+
+    def _record(self, agent: str, outcome: str) -> None:
+        stats = self._agents.get(agent)
+        if stats is None:
+            stats = self._agents[agent] = {"hits": 0, "similar_hits": 0, "misses": 0}
+        stats[outcome] += 1
+
+    def get(self, prompt: str, model: str, agent: str = "default",
+            context: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Return a cached response, or None on a miss."""
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            with self._lock:
+                self._record(agent, "misses")
+            return None
+        bucket = _bucket(model, context)
+        key = _key(bucket, normalized)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove(key)
+                entry = None
+        # Embedding a prompt is the slow part of a similarity lookup, so it runs outside the lock
+        query = self.embedder(normalized) if entry is None and self.embedder is not None else None
+        with self._lock:
+            if entry is not None and key not in self._entries:
+                entry = None  # evicted meanwhile
+            outcome = "hits"
+            if entry is None and query is not None:
+                similar = self._similar(bucket, query, now)
+                if similar is not None:
+                    key, entry, outcome = similar, self._entries[similar], "similar_hits"
+            if entry is None:
+                self._record(agent, "misses")
+                return None
+            self._entries.move_to_end(key)
+            self._record(agent, outcome)
+            return entry.text
+
+    def put(self, prompt: str, model: str, text: str, context: Optional[Dict[str, Any]] = None) -> None:
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            # Punctuation-only prompts would all share one key
+            return
+        bucket = _bucket(model, context)
+        key = _key(bucket, normalized)
+        expires_at = self._clock() + self.ttl
+        vector = self.embedder(normalized) if self.embedder is not None else None
+        with self._lock:
+            offset = None
+            if self._log is not None:
+                offset = self._log.append(key, bucket, expires_at, normalized, text)
+            if key in self._entries:
+                self._remove(key)
+            self._insert(key, _Entry(bucket, expires_at, normalized, text, offset), vector)
+            self._evict()
+            if self._log is not None and self._dead_bytes > max(COMPACT_MIN_BYTES, self._log.size // 2):
+                self._compact()
+
+    def get_or_generate(self, prompt: str, model: str, generate: Callable[[str], str], agent: str = "default",
+                        context: Optional[Dict[str, Any]] = None) -> str:
+        text = self.get(prompt, model, agent, context)
+        if text is None:
+            text = generate(prompt)
+            self.put(prompt, model, text, context)
+        return text
+
+    def _compact(self) -> None:
+        now = self._clock()
+        for key in [k for k, e in self._entries.items() if e.expires_at <= now]:
+            self._remove(key)
+        keys = list(self._entries)
+        records = [(k, e.bucket, e.expires_at, e.prompt, e.text)
+                   for k, e in ((k, self._entries[k]) for k in keys)]
+        for key, offset in zip(keys, self._log.rewrite(records)):
+            self._entries[key].offset = offset
+        self._dead_bytes = 0
+
+    def compact(self) -> None:
+        """Drop evicted and expired records from the disk file."""
+        if self._log is not None:
+            with self._lock:
+                self._compact()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            agents = {}
+            for agent, counts in self._agents.items():
+                lookups = counts["hits"] + counts["similar_hits"] + counts["misses"]
+                agents[agent] = {
+                    **counts,
+                    "hit_rate": (counts["hits"] + counts["similar_hits"]) / lookups if lookups else 0.0
+                }
+            return {
+                "size": len(self._entries),
+                "disk_bytes": self._log.size if self._log is not None else 0,
+                "agents": agents
+            }
+
+    def close(self) -> None:
+        if self._log is not None:
+            self._log.close()
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache; RESPONSE_CACHE_PATH enables the disk store and
+    RESPONSE_CACHE_SIMILARITY (a threshold such as 0.9) the similarity tier."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                threshold = os.getenv("RESPONSE_CACHE_SIMILARITY")
+                _default_cache = ResponseCache(
+                    path=os.getenv("RESPONSE_CACHE_PATH") or None,
+                    embedder=HashingEmbedder() if threshold else None,
+                    similarity_threshold=float(threshold) if threshold else 0.9
+                )
+    return _default_cache
@@ -0,0 +1,312 @@
+"""Multi-process sharded TravelInsuranceSystem.
+
+Each shard is a worker process that owns a full TravelInsuranceSystem. Users
+are placed on shards by a consistent hash of ``user_id``. A user's flights,
+policies, payments and claims live on the same shard, so every operation runs
+on exactly one worker. The router assigns user IDs at registration, so the
+owning shard is known before the first write.
+
+Requests to a shard are pipelined over one pipe and run in order in the
+worker. Calls for a given user therefore execute in the order they were
+routed. Adding a shard moves only the users whose hash range it takes over:
+old owners export those users' records and the router imports them into the
+new shard while routing is paused.
+"""
+
+from bisect import bisect
+from concurrent.futures import Future
+from typing import Dict, Any, Iterable, List, Optional
+import hashlib
+import itertools
+import multiprocessing
+import os
+import threading
+import uuid
+
+from event_log import USERS_MOVED
+from fraud import FraudIndex
+from pricing_engine import DEFAULT_PLAN_TYPE
+
+DEFAULT_VNODES = 64
+
+# TravelInsuranceSystem methods a shard runs on request
+_SYSTEM_OPS = {
+    "register_user", "process_flight_purchase", "purchase_insurance", "process_claim",
+    "process_refund", "get_user_policies", "get_user_claims", "get_policy_by_transaction"
+}
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes."""
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = DEFAULT_VNODES):
+        self.vnodes = vnodes
+        self.nodes: List[str] = []
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+    def add(self, node: str) -> None:
+        if node in self.nodes:
+            raise ValueError(f"Node already in ring: {node}")
+        self.nodes.append(node)
+        points = sorted(
+            [(p, o) for p, o in zip(self._points, self._owners)]
+            + [(self._hash(f"{node}#{i}"), node) for i in range(self.vnodes)]
+        )
+        self._points = [p for p, _ in points]
+        self._owners = [o for _, o in points]
+
+    def node_for(self, key: str) -> str:
+        if not self._points:
+            raise LookupError("Hash ring is empty")
+        return self._owners[bisect(self._points, self._hash(key)) % len(self._points)]
+
+
+# === Shard worker ===>>>>> (runs in the child process)
+
+def _export_user(storage, user_id: str) -> Dict[str, Any]:
+    flights = {f["ticket_number"]: f for f in storage.flights.find_by("user_id", user_id)}
+    return {
+        "user_id": user_id,
+        "users": {user_id: storage.users[user_id]} if user_id in storage.users else {},
+        "flights": flights,
+        "policies": {t: storage.policies[t] for t in flights if t in storage.policies},
+        "payments": {p["transaction_id"]: p for p in storage.payments.find_by("user_id", user_id)},
+        "claims": {c["claim_id"]: c for c in storage.claims.find_by("user_id", user_id)},
+        "subscriptions": {s["subscription_id"]: s for s in storage.subscriptions.find_by("user_id", user_id)}
+    }
+
+
+_TABLES = ("users", "flights", "policies", "payments", "claims", "subscriptions")
+
+
+def _export_moved(system, name: str, nodes: List[str], vnodes: int) -> List[Dict[str, Any]]:
+    """Remove and return the users this shard no longer owns under ``nodes``."""
+    ring = HashRing(nodes, vnodes)
+    storage = system.storage
+    user_ids = set(storage.users) | {f["user_id"] for f in storage.flights.values()}
+    bundles = [_export_user(storage, u) for u in user_ids if ring.node_for(u) != name]
+    with storage.transaction():
+        system.record_event(USERS_MOVED, [
+            (table, key, None) for bundle in bundles for table in _TABLES for key in bundle[table]
+        ])
+    system.subscriptions.load()
+    # The fraud index has no removal, so it is rebuilt from what this shard still owns
+    system.fraud = FraudIndex.from_storage(storage)
+    for bundle in bundles:
+        system.reports.load_records(bundle, sign=-1)
+    return bundles
+
+
+def _import_users(system, bundles: List[Dict[str, Any]]) -> int:
+    with system.storage.transaction():
+        system.record_event(USERS_MOVED, [
+            (table, key, record)
+            for bundle in bundles for table in _TABLES for key, record in bundle[table].items()
+        ])
+    system.subscriptions.load()
+    # Moved claims must keep blocking duplicates, and the moved totals must show up here
+    for bundle in bundles:
+        for user_id, user in bundle["users"].items():
+            system.fraud.record_user(user_id, user["mac_address"])
+        system.fraud.record_claims(bundle["claims"].items())
+        system.reports.load_records(bundle)
+    return len(bundles)
+
+
+def _find_payment_user(system, transaction_id: str) -> Optional[str]:
+    payment = system.payment_data.get(transaction_id)
+    return payment.get("user_id") if payment else None
+
+
+def _serve_shard(conn, name: str, storage_path: Optional[str]) -> None:
+    from event_log import EventLog
+    from main import TravelInsuranceSystem
+    from payment_engine import PaymentEngine
+    from storage import open_storage
+
+    # The worker runs one request at a time, so there is nothing to batch.
+    # Each shard keeps its own event log under EVENT_LOG_DIR.
+    event_dir = os.getenv("EVENT_LOG_DIR")
+    system = TravelInsuranceSystem(storage=open_storage(storage_path),
+                                   payments=PaymentEngine(flush_interval=0.0),
+                                   events=EventLog(os.path.join(event_dir, name)) if event_dir else None)
+    admin_ops = {
+        "export_moved": lambda nodes, vnodes: _export_moved(system, name, nodes, vnodes),
+        "import_users": lambda bundles: _import_users(system, bundles),
+        "find_payment_user": lambda transaction_id: _find_payment_user(system, transaction_id),
+        "user_count": lambda: len(system.user_data)
+    }
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        request_id, op, args = message
+        try:
+            handler = getattr(system, op) if op in _SYSTEM_OPS else admin_ops[op]
+            reply = (request_id, True, handler(*args))
+        except Exception as e:
+            reply = (request_id, False, RuntimeError(f"{type(e).__name__}: {e}"))
+        conn.send(reply)
+    system.payments.shutdown()
+    if system.events is not None:
+        system.events.close()
+    system.storage.close()
+
+
+# === Router ===>>>>> (runs in the calling process)
+
+class _ShardClient:
+    """Pipelined connection to one shard worker."""
+
+    def __init__(self, name: str, context, storage_path: Optional[str]):
+        self.name = name
+        self._conn, child = context.Pipe()
+        self.process = context.Process(target=_serve_shard, args=(child, name, storage_path),
+                                       daemon=True, name=name)
+        self.process.start()
+        child.close()
+        self._ids = itertools.count()
+        self._futures: Dict[int, Future] = {}
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, daemon=True, name=f"{name}-reader")
+        self._reader.start()
+
+    def submit(self, op: str, *args) -> Future:
+        future: Future = Future()
+        with self._send_lock:
+            request_id = next(self._ids)
+            self._futures[request_id] = future
+            self._conn.send((request_id, op, args))
+        return future
+
+    def call(self, op: str, *args) -> Any:
+        return self.submit(op, *args).result()
+
+    def _read(self) -> None:
+        while True:
+            try:
+                request_id, ok, value = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            future = self._futures.pop(request_id)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        error = RuntimeError(f"Shard {self.name} exited")
+        for request_id in list(self._futures):
+            self._futures.pop(request_id).set_exception(error)
+
+    def close(self) -> None:
+        with self._send_lock:
+            self._conn.send(None)
+        self.process.join()
+        self._reader.join()
+        self._conn.close()
+
+
+class ShardedTravelInsuranceSystem:
+    """TravelInsuranceSystem API routed across shard worker processes.
+
+    With ``storage_dir`` each shard keeps a SQLite database there; otherwise
+    shards use in-memory storage.
+    """
+
+    def __init__(self, shards: int = os.cpu_count() or 1, storage_dir: Optional[str] = None,
+                 vnodes: int = DEFAULT_VNODES):
+        self.storage_dir = storage_dir
+        self._context = multiprocessing.get_context("spawn")
+        self._shards: Dict[str, _ShardClient] = {}
+        self._ring = HashRing(vnodes=vnodes)
+        self._transactions: Dict[str, str] = {}  # transaction_id -> user_id
+        self._lock = threading.Lock()
+        for _ in range(shards):
+            name = self._start_shard()
+            self._ring.add(name)
+
+    def _start_shard(self) -> str:
+        name = f"shard-{len(self._shards)}"
+        path = os.path.join(self.storage_dir, f"{name}.db") if self.storage_dir else None
+        self._shards[name] = _ShardClient(name, self._context, path)
+        return name
+
+    def submit(self, user_id: str, op: str, *args) -> Future:
+        """Send ``op`` to the shard owning ``user_id`` without waiting for it."""
+        with self._lock:
+            return self._shards[self._ring.node_for(user_id)].submit(op, *args)
+
+    def _call(self, user_id: str, op: str, *args) -> Any:
+        return self.submit(user_id, op, *args).result()
+
+    def register_user(self, email: str, mac_address: str) -> Dict[str, Any]:
+        user_id = str(uuid.uuid4())
+        return self._call(user_id, "register_user", email, mac_address, user_id)
+
+    def process_flight_purchase(self, ticket_number: str, user_id: str) -> Dict[str, Any]:
+        return self._call(user_id, "process_flight_purchase", ticket_number, user_id)
+
+    def purchase_insurance(self, user_id: str, ticket_number: str, coverage_level: int,
+                           payment_method: str, plan_type: str = DEFAULT_PLAN_TYPE) -> Dict[str, Any]:
+        result = self._call(user_id, "purchase_insurance", user_id, ticket_number, coverage_level,
+                            payment_method, plan_type)
+        if result.get("status") == "success":
+            self._transactions[result["transaction_id"]] = user_id
+        return result
+
+    def process_claim(self, ticket_number: str, user_id: str) -> Dict[str, Any]:
+        return self._call(user_id, "process_claim", ticket_number, user_id)
+
+    def process_refund(self, transaction_id: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+        if user_id is not None:
+            # The owning shard checks that the transaction is this user's
+            return self._call(user_id, "process_refund", transaction_id, user_id)
+        user_id = self._transactions.get(transaction_id) or self._find_payment_user(transaction_id)
+        if user_id is None:
+            return {"status": "error", "message": "Transaction not found"}
+        return self._call(user_id, "process_refund", transaction_id)
+
+    def _find_payment_user(self, transaction_id: str) -> Optional[str]:
+        # Transactions from before this router started: ask every shard
+        with self._lock:
+            futures = [s.submit("find_payment_user", transaction_id) for s in self._shards.values()]
+        return next((user_id for user_id in (f.result() for f in futures) if user_id), None)
+
+    def get_user_policies(self, user_id: str) -> List[Dict[str, Any]]:
+        return self._call(user_id, "get_user_policies", user_id)
+
+    def get_user_claims(self, user_id: str) -> List[Dict[str, Any]]:
+        return self._call(user_id, "get_user_claims", user_id)
+
+    def add_shard(self) -> Dict[str, int]:
+        """Start a new shard and move the users it now owns; returns users moved per old shard."""
+        with self._lock:
+            name = self._start_shard()
+            self._ring.add(name)
+            nodes, vnodes = list(self._ring.nodes), self._ring.vnodes
+            moved = {}
+            exports = {old: self._shards[old].submit("export_moved", nodes, vnodes)
+                       for old in nodes if old != name}
+            for old, future in exports.items():
+                bundles = future.result()
+                self._shards[name].call("import_users", bundles)
+                moved[old] = len(bundles)
+            return moved
+
+    def shard_sizes(self) -> Dict[str, int]:
+        with self._lock:
+            futures = {name: s.submit("user_count") for name, s in self._shards.items()}
+        return {name: f.result() for name, f in futures.items()}
+
+    def close(self) -> None:
+        for shard in self._shards.values():
+            shard.close()
@@ -0,0 +1,260 @@
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+import json
+import sqlite3
+import threading
+
+# Table name -> fields with a secondary index. The primary key of each table is
+# the key TravelInsuranceSystem already uses (user_id, ticket_number, ...).
+SCHEMA: Dict[str, Tuple[str, ...]] = {
+    "users": ("email",),
+    "flights": ("user_id",),
+    "policies": ("user_id", "transaction_id"),
+    "payments": ("user_id",),
+    "claims": ("user_id", "ticket_number"),
+    "subscriptions": ("user_id",),
+}
+
+
+class Table(MutableMapping):
+    """Dict-like record table with secondary-index lookups."""
+
+    name: str
+    indexes: Tuple[str, ...]
+
+    @abstractmethod
+    def find_by(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Return all records whose indexed ``field`` equals ``value``."""
+
+    def load(self, records: Dict[str, Dict[str, Any]]) -> None:
+        """Bulk-insert records, e.g. when restoring from a snapshot."""
+        self.update(records)
+
+    def freeze(self):
+        """Point-in-time copy of the records, taken while writes are paused; read it with ``items()``."""
+        return dict(self.items())
+
+    def _check_index(self, field: str) -> None:
+        if field not in self.indexes:
+            raise KeyError(f"{self.name} has no index on {field!r}")
+
+
+class StorageBackend(ABC):
+    """Holds the users, flights, policies, payments, claims and subscriptions tables."""
+
+    def __init__(self):
+        self.users = self._open_table("users")
+        self.flights = self._open_table("flights")
+        self.policies = self._open_table("policies")
+        self.payments = self._open_table("payments")
+        self.claims = self._open_table("claims")
+        self.subscriptions = self._open_table("subscriptions")
+
+    @abstractmethod
+    def _open_table(self, name: str) -> Table:
+        """Open (creating if needed) the table called ``name``."""
+
+    @contextmanager
+    def transaction(self):
+        """Group several writes; backends may use this to batch commits."""
+        yield
+
+    def close(self) -> None:
+        pass
+
+
+# === In-memory backend ===>>>>> (plain dicts plus hash indexes)
+
+class InMemoryTable(Table):
+    def __init__(self, name: str, indexes: Tuple[str, ...]):
+        self.name = name
+        self.indexes = indexes
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._index: Dict[str, Dict[Any, Dict[str, None]]] = {field: {} for field in indexes}
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        return self._rows[key]
+
+    def __setitem__(self, key: str, record: Dict[str, Any]) -> None:
+        if key in self._rows:
+            self._unindex(key, self._rows[key])
+        self._rows[key] = record
+        for field in self.indexes:
+            value = record.get(field)
+            if value is not None:
+                self._index[field].setdefault(value, {})[key] = None
+
+    def __delitem__(self, key: str) -> None:
+        self._unindex(key, self._rows.pop(key))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def load(self, records: Dict[str, Dict[str, Any]]) -> None:
+        if self._rows:
+            self.update(records)
+            return
+        # Empty table: take the rows as they are and build each index in one pass
+        self._rows.update(records)
+        for field in self.indexes:
+            index = self._index[field]
+            for key, record in records.items():
+                value = record.get(field)
+                if value is not None:
+                    index.setdefault(value, {})[key] = None
+
+    def freeze(self) -> Dict[str, Dict[str, Any]]:
+        # Records are never mutated once stored, so a shallow copy is a consistent snapshot
+        return dict(self._rows)
+
+    def _unindex(self, key: str, record: Dict[str, Any]) -> None:
+        for field in self.indexes:
+            keys = self._index[field].get(record.get(field))
+            if keys is not None:
+                keys.pop(key, None)
+                if not keys:
+                    del self._index[field][record.get(field)]
+
+    def find_by(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        self._check_index(field)
+        return [self._rows[key] for key in self._index[field].get(value, ())]
+
+
+class InMemoryStorage(StorageBackend):
+    """Process-local storage; contents are lost on restart.
+
+    With ``columnar_policies=True`` the policies table is a compact
+    records.PolicyColumnStore instead of a dict of dicts.
+    """
+
+    def __init__(self, columnar_policies: bool = False):
+        self.columnar_policies = columnar_policies
+        super().__init__()
+
+    def _open_table(self, name: str) -> Table:
+        if name == "policies" and self.columnar_policies:
+            from records import PolicyColumnStore
+            return PolicyColumnStore()
+        return InMemoryTable(name, SCHEMA[name])
+
+
+# === SQLite backend ===>>>>> (WAL journal, cached statements, indexed columns)
+
+class SQLiteTable(Table):
+    def __init__(self, storage: "SQLiteStorage", name: str, indexes: Tuple[str, ...]):
+        self.name = name
+        self.indexes = indexes
+        self._storage = storage
+
+        columns = "".join(f", {field} TEXT" for field in indexes)
+        storage._execute(
+            f"CREATE TABLE IF NOT EXISTS {name} (key TEXT PRIMARY KEY{columns}, data TEXT NOT NULL)"
+        )
+        for field in indexes:
+            storage._execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_{field} ON {name} ({field})")
+
+        # Statement text is fixed per table so sqlite3's statement cache reuses
+        # the compiled statements across calls.
+        put_columns = ("key",) + indexes + ("data",)
+        placeholders = ", ".join("?" * len(put_columns))
+        self._sql_get = f"SELECT data FROM {name} WHERE key = ?"
+        self._sql_put = f"INSERT OR REPLACE INTO {name} ({', '.join(put_columns)}) VALUES ({placeholders})"
+        self._sql_delete = f"DELETE FROM {name} WHERE key = ?"
+        self._sql_keys = f"SELECT key FROM {name}"
+        self._sql_count = f"SELECT COUNT(*) FROM {name}"
+        self._sql_find = {field: f"SELECT data FROM {name} WHERE {field} = ?" for field in indexes}
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        row = self._storage._execute(self._sql_get, (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key: str, record: Dict[str, Any]) -> None:
+        index_values = tuple(_index_value(record.get(field)) for field in self.indexes)
+        self._storage._execute(self._sql_put, (key,) + index_values + (json.dumps(record),))
+
+    def __delitem__(self, key: str) -> None:
+        if self._storage._execute(self._sql_delete, (key,)).rowcount == 0:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([row[0] for row in self._storage._execute(self._sql_keys).fetchall()])
+
+    def __len__(self) -> int:
+        return self._storage._execute(self._sql_count).fetchone()[0]
+
+    def __contains__(self, key: object) -> bool:
+        return self._storage._execute(self._sql_get, (key,)).fetchone() is not None
+
+    def find_by(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        self._check_index(field)
+        rows = self._storage._execute(self._sql_find[field], (_index_value(value),)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+def _index_value(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+class SQLiteStorage(StorageBackend):
+    """SQLite-backed storage that survives process restarts.
+
+    Records are stored as JSON alongside their indexed fields. Writes outside
+    ``transaction()`` are committed immediately.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._in_transaction = False
+        self._conn = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False, cached_statements=256
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        super().__init__()
+
+    def _open_table(self, name: str) -> Table:
+        return SQLiteTable(self, name, SCHEMA[name])
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._in_transaction:
+                yield
+                return
+            self._conn.execute("BEGIN")
+            self._in_transaction = True
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+            finally:
+                self._in_transaction = False
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def open_storage(path: Optional[str] = None) -> StorageBackend:
+    """Open SQLite storage at ``path``, or in-memory storage when no path is given."""
+    if path:
+        return SQLiteStorage(path)
+    return InMemoryStorage()
@@ -1,23 +1,65 @@
 # streamlit_app.py
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Callable, Optional
+import uuid
+
 import streamlit as st
 from main import TravelInsuranceSystem
+from agent_registry import registry
 from agents import (
-    user_vetting_agent,
-    flight_verification_agent,
-    coverage_agent,
-    payment_agent,
-    claims_agent,
     calculate_coverage,
-    PLAN_TYPES,
     PAYMENT_METHODS
 )
+from pricing_engine import get_pricing_engine
+
+# How often the job panel re-checks background claims and refunds
+JOB_POLL_SECONDS = 0.5
+
+
+class InsuranceService:
+    """One TravelInsuranceSystem shared by every browser session, plus a pool for slow calls.
+
+    Claims and refunds wait on payout rails and the payment engine, so they
+    are submitted here and polled instead of blocking a script rerun.
+    """
+
+    def __init__(self, workers: int = 8):
+        self.system = TravelInsuranceSystem()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="ui-job")
+        self._jobs: Dict[str, Future] = {}
+
+    def submit(self, fn: Callable, *args) -> str:
+        job_id = str(uuid.uuid4())
+        self._jobs[job_id] = self._executor.submit(fn, *args)
+        return job_id
 
-# Initialize system and session
-if "insurance_system" not in st.session_state:
-    st.session_state.insurance_system = TravelInsuranceSystem()
+    def poll(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job's result once it has finished (and forget it), otherwise None."""
+        future = self._jobs.get(job_id)
+        if future is None or not future.done():
+            return None
+        del self._jobs[job_id]
+        try:
+            return future.result()
+        except Exception as e:
+            return {"status": "error", "message": f"{type(e).__name__}: {e}"}
+
+
+@st.cache_resource
+def get_service() -> InsuranceService:
+    return InsuranceService()
+
+
+@st.cache_data(max_entries=10_000)
+def get_quote(ticket_price: float, coverage_level: int, plan_type: str, rules_version: int) -> Dict[str, float]:
+    # rules_version is part of the cache key, so a pricing reload invalidates old quotes
+    return calculate_coverage(ticket_price, coverage_level, plan_type)
+
+
+def submit_job(label: str, fn: Callable, *args) -> None:
+    st.session_state.jobs.append({"label": label, "job_id": service.submit(fn, *args), "result": None})
 
-system = st.session_state.insurance_system
 
 # Page configuration
 st.set_page_config(
@@ -26,6 +68,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+service = get_service()
+system = service.system
+st.session_state.setdefault("jobs", [])
+
 # Custom CSS
 st.markdown("""
     <style>
@@ -47,22 +93,23 @@ st.markdown("""
 with st.sidebar:
     st.title("🤖 Agent Status")
     st.markdown("---")
-    
-    # Display agent statuses
+
+    # Display agent statuses from their declarations, without building them
     agents = {
-        "User Vetting": user_vetting_agent,
-        "Flight Verification": flight_verification_agent,
-        "Coverage": coverage_agent,
-        "Payment": payment_agent,
-        "Claims": claims_agent
+        "User Vetting": "user_vetting_agent",
+        "Flight Verification": "flight_verification_agent",
+        "Coverage": "coverage_agent",
+        "Payment": "payment_agent",
+        "Claims": "claims_agent"
     }
-    
-    for name, agent in agents.items():
+
+    for name, registry_name in agents.items():
+        status = "Active" if registry.is_built(registry_name) else "Standby"
         st.markdown(f"""
             <div class="agent-status" style="background-color: #f0f2f6;">
                 <h4>{name} Agent</h4>
-                <p>Status: Active</p>
-                <p>Model: {agent.model}</p>
+                <p>Status: {status}</p>
+                <p>Model: {registry.spec(registry_name)["model"]}</p>
             </div>
         """, unsafe_allow_html=True)
 
@@ -78,10 +125,12 @@ with col1:
     mac_address = st.text_input("MAC Address")
     if st.button("Register User"):
         if email and mac_address:
-            with st.spinner("Verifying user..."):
-                result = system.register_user(email, mac_address)
-                st.session_state.user_id = result.get("user_id", None)
+            result = system.register_user(email, mac_address)
+            if result["status"] == "success":
+                st.session_state.user_id = result["user_id"]
                 st.success(f"Registration successful! User ID: {st.session_state.user_id}")
+            else:
+                st.error(result["message"])
         else:
             st.error("Please fill in all fields")
 
@@ -97,8 +146,9 @@ with col3:
         else:
             with st.spinner("Verifying ticket..."):
                 result = system.process_flight_purchase(ticket_number, st.session_state.user_id)
+            if result["status"] == "success":
                 st.session_state.ticket_number = ticket_number
-                st.json(result)
+            st.json(result)
 
 # Insurance Purchase Section
 st.header("3. Insurance Coverage")
@@ -110,47 +160,44 @@ with col5:
         options=[1, 2, 3],
         format_func=lambda x: f"Level {x} ({'50%' if x==1 else '75%' if x==2 else '100%'} coverage)"
     )
-    
-    plan_type = st.selectbox("Plan Type", options=list(PLAN_TYPES.keys()))
+
+    plan_type = st.selectbox("Plan Type", options=list(get_pricing_engine().plan_types()))
     payment_method = st.selectbox("Payment Method", options=PAYMENT_METHODS)
-    
-    if st.button("Calculate Premium"):
-        if "ticket_number" in st.session_state:
-            with st.spinner("Calculating premium..."):
-                # Get ticket price from the system
-                ticket_info = system.get_ticket_info(st.session_state.ticket_number)
-                if ticket_info:
-                    coverage_details = calculate_coverage(ticket_info["price"], coverage_level)
-                    st.session_state.coverage_details = coverage_details
-                    st.success(f"""
-                        Premium Amount: ${coverage_details['premium_amount']:.2f}
-                        Coverage Amount: ${coverage_details['coverage_amount']:.2f}
-                        Coverage Percentage: {coverage_details['coverage_percentage']}%
-                    """)
-        else:
-            st.error("Please verify your ticket first")
+
+    flight = system.flight_data.get(st.session_state["ticket_number"]) if "ticket_number" in st.session_state else None
+    if flight is None:
+        st.info("Verify a ticket to see your premium")
+    else:
+        coverage_details = get_quote(flight["details"]["price"], coverage_level, plan_type,
+                                     get_pricing_engine().version)
+        st.success(f"""
+            Premium Amount: ${coverage_details['premium_amount']:.2f}
+            Coverage Amount: ${coverage_details['coverage_amount']:.2f}
+            Coverage Percentage: {coverage_details['coverage_percentage']}%
+        """)
+        if st.button("Purchase Coverage"):
+            with st.spinner("Processing payment..."):
+                result = system.purchase_insurance(st.session_state.user_id, st.session_state.ticket_number,
+                                                   coverage_level, payment_method, plan_type)
+            if result["status"] == "success":
+                st.session_state.transaction_id = result["transaction_id"]
+            st.json(result)
 
 # Claims Section
 st.header("4. File a Claim")
 col7, col8 = st.columns(2)
 
 with col7:
-    claim_type = st.selectbox(
-        "Claim Type",
-        options=["Flight Cancellation", "Medical Emergency", "Baggage Loss", "Trip Delay"]
-    )
-    claim_description = st.text_area("Claim Description")
-    
+    payout_destination = st.text_input("Payout Account (optional)")
+
     if st.button("Submit Claim"):
         if "user_id" in st.session_state and "ticket_number" in st.session_state:
-            with st.spinner("Processing claim..."):
-                result = system.process_claim(
-                    st.session_state.ticket_number,
-                    st.session_state.user_id,
-                    claim_type=claim_type,
-                    description=claim_description
-                )
-                st.json(result)
+            policy = system.insurance_data.get(st.session_state.ticket_number)
+            if policy is None or policy["user_id"] != st.session_state.user_id:
+                st.error("Please purchase coverage for this ticket first")
+            else:
+                submit_job(f"Claim for {st.session_state.ticket_number}", system.process_claim,
+                           st.session_state.ticket_number, st.session_state.user_id, payout_destination or None)
         else:
             st.error("Please complete registration and ticket verification first")
 
@@ -159,13 +206,34 @@ st.header("5. Request Refund")
 col9, col10 = st.columns(2)
 
 with col9:
-    transaction_id = st.text_input("Transaction ID")
-    refund_reason = st.text_area("Refund Reason")
-    
+    transaction_id = st.text_input("Transaction ID", value=st.session_state.get("transaction_id", ""))
+
     if st.button("Request Refund"):
-        if transaction_id:
-            with st.spinner("Processing refund..."):
-                result = system.process_refund(transaction_id, reason=refund_reason)
-                st.json(result)
+        if "user_id" not in st.session_state:
+            st.error("Please complete registration first")
+        elif transaction_id:
+            # The shared system serves every session, so refunds are limited to this user's charges
+            submit_job(f"Refund of {transaction_id}", system.process_refund, transaction_id,
+                       st.session_state.user_id)
         else:
             st.error("Please provide a transaction ID")
+
+
+# Background Jobs Section
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_panel() -> None:
+    jobs = st.session_state.jobs
+    if not jobs:
+        return
+    st.header("Requests")
+    for job in reversed(jobs):
+        if job["result"] is None:
+            job["result"] = service.poll(job["job_id"])
+        if job["result"] is None:
+            st.info(f"{job['label']}: processing...")
+        else:
+            with st.expander(f"{job['label']}: {job['result'].get('status', 'done')}"):
+                st.json(job["result"])
+
+
+job_panel()
@@ -0,0 +1,368 @@
+"""Recurring billing and monthly trip allowances for subscription plans.
+
+Plans with a ``subscription`` block in pricing_rules.json (MONTHLY and
+ANNUAL_FAMILY by default) are billed a monthly fee. Each paid month covers
+``trips_per_month`` insured trips. The first month is charged when the user
+subscribes. Each renewal is due when the paid month ends. Months are calendar
+months counted from the start date, so a subscription started on the 31st
+renews on the last day of shorter months without drifting.
+
+Renewal deadlines sit in a min-heap, so ``run_due`` pops only what is due
+and never scans all subscriptions. Entries go stale when a subscription is
+cancelled or rescheduled; they are skipped when popped. Due renewals are
+queued on the payment engine a batch at a time, so charges for the same
+payment method settle together. Each batch's results are then written as one
+event. A failed charge is retried every ``retry_delay`` seconds. After
+``max_failures`` failures in a row the subscription lapses.
+
+Each month's charge uses an idempotency key built from the subscription, the
+month and the attempt number. If the process dies between a charge and its
+write, re-running the renewal cannot charge twice.
+
+Live subscriptions are kept in memory, keyed by (user_id, plan_type), so
+``use_trip`` checks and counts a trip in O(1). The quota resets when a
+renewal succeeds.
+"""
+
+from calendar import monthrange
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+import heapq
+import threading
+import time
+import uuid
+
+from event_log import SUBSCRIPTION_STARTED, SUBSCRIPTION_UPDATED, SUBSCRIPTIONS_RENEWED
+from metrics import instrument_class
+from pricing_engine import get_pricing_engine
+
+ACTIVE = "active"
+PAST_DUE = "past_due"
+CANCELLED = "cancelled"
+LAPSED = "lapsed"
+
+RETRY_DELAY = 86_400.0
+MAX_FAILURES = 3
+PAYMENT_TIMEOUT = 30.0
+
+
+def add_months(ts: float, months: int) -> float:
+    """``months`` calendar months after ``ts`` (UTC), clamped to the end of shorter months."""
+    start = datetime.fromtimestamp(ts, timezone.utc)
+    year, month = divmod(start.month - 1 + months, 12)
+    year += start.year
+    day = min(start.day, monthrange(year, month + 1)[1])
+    return start.replace(year=year, month=month + 1, day=day).timestamp()
+
+
+def _charge_key(record: Dict[str, Any]) -> str:
+    # One key per month and attempt: a re-run dedupes, a retry after a decline charges again
+    return f"{record['subscription_id']}_m{record['periods_billed'] + 1}_a{record['failures']}"
+
+
+class SubscriptionScheduler:
+    """Subscriptions of one TravelInsuranceSystem, renewed from a deadline heap."""
+
+    def __init__(self, system, batch_size: int = 1000, retry_delay: float = RETRY_DELAY,
+                 max_failures: int = MAX_FAILURES, payment_timeout: float = PAYMENT_TIMEOUT,
+                 clock=time.time):
+        self.system = system
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_failures = max_failures
+        self.payment_timeout = payment_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # orders _persist calls; never taken under self._lock
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._by_user: Dict[Tuple[str, str], str] = {}
+        self._opening: set = set()  # (user_id, plan_type) with a first charge in flight
+        self._due: list = []  # (next_charge_at, subscription_id) heap; entries may be stale
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"started": 0, "renewed": 0, "declined": 0, "lapsed": 0, "cancelled": 0,
+                      "trips": 0, "over_quota": 0}
+        self.load()
+
+    def load(self) -> None:
+        """Rebuild the in-memory index from storage, e.g. after records were moved in or out."""
+        with self._lock:
+            self._records.clear()
+            self._by_user.clear()
+            for record in self.system.storage.subscriptions.values():
+                self._track(record)
+            self._due[:] = [(r["next_charge_at"], sub_id) for sub_id, r in self._records.items()
+                            if r["next_charge_at"] is not None]
+            heapq.heapify(self._due)
+
+    def _track(self, record: Dict[str, Any]) -> None:
+        # Caller holds self._lock
+        sub_id = record["subscription_id"]
+        self._records[sub_id] = record
+        key = (record["user_id"], record["plan_type"])
+        current = self._records.get(self._by_user.get(key))
+        if current is None or current["started_at"] <= record["started_at"]:
+            self._by_user[key] = sub_id
+
+    # === Subscribing ===>>>>> (first month charged up front)
+
+    def subscribe(self, user_id: str, plan_type: str, payment_method: str) -> Dict[str, Any]:
+        """Start a subscription and charge its first month."""
+        terms = get_pricing_engine().subscription_terms(plan_type)
+        if terms is None:
+            return {"status": "error", "message": f"{plan_type} is not a subscription plan"}
+        if user_id not in self.system.user_data:
+            return {"status": "error", "message": "User not found"}
+        monthly_fee, trips_per_month = terms
+        key = (user_id, plan_type)
+        with self._lock:
+            current = self._records.get(self._by_user.get(key))
+            if key in self._opening or (current is not None and current["status"] in (ACTIVE, PAST_DUE)):
+                return {"status": "error", "message": "Already subscribed to this plan"}
+            self._opening.add(key)
+
+        try:
+            now = self._clock()
+            sub_id = f"sub_{uuid.uuid4().hex}"
+            payment_info = self.system.payments.charge(
+                monthly_fee, payment_method, user_id, idempotency_key=f"{sub_id}_m1_a0"
+            ).result(self.payment_timeout)
+            if payment_info["status"] != "success":
+                return {"status": "error", "message": "Payment failed"}
+
+            paid_through = add_months(now, 1)
+            record = {
+                "subscription_id": sub_id,
+                "user_id": user_id,
+                "plan_type": plan_type,
+                "payment_method": payment_method,
+                "status": ACTIVE,
+                "started_at": now,
+                "periods_billed": 1,
+                "paid_through": paid_through,
+                "next_charge_at": paid_through,
+                "monthly_fee": monthly_fee,
+                "trips_per_month": trips_per_month,
+                "trips_used": 0,
+                "failures": 0,
+                "transaction_id": payment_info["transaction_id"],
+                "payment_info": payment_info
+            }
+            # Nobody else can see the record yet, so the durable write can wait outside the lock
+            self.system.record_event(SUBSCRIPTION_STARTED, [
+                ("payments", payment_info["transaction_id"],
+                 {**payment_info, "user_id": user_id, "subscription_id": sub_id}),
+                ("subscriptions", sub_id, record)
+            ])
+            self.system.reports.record_subscription_charge(monthly_fee)
+            with self._lock:
+                self._track(record)
+                heapq.heappush(self._due, (paid_through, sub_id))
+                self.stats["started"] += 1
+        finally:
+            with self._lock:
+                self._opening.discard(key)
+
+        return {
+            "status": "success",
+            "subscription_id": sub_id,
+            "transaction_id": payment_info["transaction_id"],
+            "paid_through": paid_through
+        }
+
+    def cancel(self, subscription_id: str) -> Dict[str, Any]:
+        """Stop renewals; trips stay covered until the paid month ends."""
+        with self._lock:
+            record = self._records.get(subscription_id)
+            if record is None:
+                return {"status": "error", "message": "Subscription not found"}
+            if record["status"] in (CANCELLED, LAPSED):
+                return {"status": "error", "message": f"Subscription is already {record['status']}"}
+            record = {**record, "status": CANCELLED, "next_charge_at": None}
+            self._records[subscription_id] = record
+            self.stats["cancelled"] += 1
+        self._persist([subscription_id])
+        return {"status": "success", "subscription_id": subscription_id, "covered_until": record["paid_through"]}
+
+    def get(self, user_id: str, plan_type: str) -> Optional[Dict[str, Any]]:
+        """The user's latest subscription to ``plan_type``, if any."""
+        with self._lock:
+            return self._records.get(self._by_user.get((user_id, plan_type)))
+
+    # === Trip allowance ===>>>>> (O(1) check-and-count per purchase)
+
+    def use_trip(self, user_id: str, plan_type: str) -> Dict[str, Any]:
+        """Count one covered trip against this month's allowance.
+
+        On success the response carries the payment that covers the month.
+        """
+        now = self._clock()
+        with self._lock:
+            sub_id = self._by_user.get((user_id, plan_type))
+            record = self._records.get(sub_id)
+            if record is None:
+                return {"status": "error", "message": f"No {plan_type} subscription"}
+            if now >= record["paid_through"]:
+                return {"status": "error", "message": "Subscription is not paid up"}
+            if record["trips_used"] >= record["trips_per_month"]:
+                self.stats["over_quota"] += 1
+                return {"status": "error", "message": "Monthly trip allowance used"}
+            record = {**record, "trips_used": record["trips_used"] + 1}
+            self._records[sub_id] = record
+            self.stats["trips"] += 1
+        self._persist([sub_id])
+        return {
+            "status": "success",
+            "subscription_id": sub_id,
+            "payment_info": record["payment_info"],
+            "trips_remaining": record["trips_per_month"] - record["trips_used"]
+        }
+
+    # === Renewals ===>>>>> (deadline heap, batched charges)
+
+    def next_due(self) -> Optional[float]:
+        """Earliest pending renewal time (possibly of a stale entry), or None."""
+        with self._lock:
+            return self._due[0][0] if self._due else None
+
+    def run_due(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Charge every renewal due by ``now``, ``batch_size`` at a time."""
+        now = self._clock() if now is None else now
+        due = []
+        with self._lock:
+            while self._due and self._due[0][0] <= now:
+                when, sub_id = heapq.heappop(self._due)
+                record = self._records.get(sub_id)
+                if record is not None and record["next_charge_at"] == when:
+                    due.append(record)
+
+        summary = {"due": len(due), "renewed": 0, "declined": 0, "lapsed": 0}
+        for i in range(0, len(due), self.batch_size):
+            for field, count in self._renew_batch(due[i:i + self.batch_size], now).items():
+                summary[field] += count
+        return {"status": "success", **summary}
+
+    def _renew_batch(self, batch: List[Dict[str, Any]], now: float) -> Dict[str, int]:
+        engine = get_pricing_engine()
+        charges = []
+        for record in batch:
+            terms = engine.subscription_terms(record["plan_type"]) or (record["monthly_fee"], record["trips_per_month"])
+            future = self.system.payments.charge(terms[0], record["payment_method"], record["user_id"],
+                                                 idempotency_key=_charge_key(record))
+            charges.append((record, terms, future))
+
+        outcomes = []
+        for record, terms, future in charges:
+            try:
+                payment_info = future.result(self.payment_timeout)
+            except Exception as e:
+                payment_info = {"status": "failed", "message": str(e)}
+            outcomes.append((record, terms, payment_info))
+
+        counts = {"renewed": 0, "declined": 0, "lapsed": 0}
+        writes, updated = [], []  # updated: (record merged onto, new record)
+        with self._lock:
+            for charged, (monthly_fee, trips_per_month), payment_info in outcomes:
+                sub_id = charged["subscription_id"]
+                # Merge onto the current record: trips or a cancel may have landed meanwhile
+                base = record = self._records[sub_id]
+                cancelled = record["status"] == CANCELLED
+                if payment_info["status"] == "success":
+                    periods = record["periods_billed"] + 1
+                    paid_through = add_months(record["started_at"], periods)
+                    record = {
+                        **record,
+                        "status": CANCELLED if cancelled else ACTIVE,
+                        "periods_billed": periods,
+                        "paid_through": paid_through,
+                        "next_charge_at": None if cancelled else paid_through,
+                        "monthly_fee": monthly_fee,
+                        "trips_per_month": trips_per_month,
+                        "trips_used": 0,
+                        "failures": 0,
+                        "transaction_id": payment_info["transaction_id"],
+                        "payment_info": payment_info
+                    }
+                    writes.append(("payments", payment_info["transaction_id"],
+                                   {**payment_info, "user_id": record["user_id"], "subscription_id": sub_id}))
+                    self.system.reports.record_subscription_charge(payment_info["amount"])
+                    counts["renewed"] += 1
+                else:
+                    failures = record["failures"] + 1
+                    lapsed = failures >= self.max_failures
+                    status = CANCELLED if cancelled else LAPSED if lapsed else PAST_DUE
+                    record = {
+                        **record,
+                        "status": status,
+                        "failures": failures,
+                        "next_charge_at": None if cancelled or lapsed else now + self.retry_delay
+                    }
+                    counts["declined"] += 1
+                    counts["lapsed"] += status == LAPSED
+                writes.append(("subscriptions", sub_id, record))
+                updated.append((base, record))
+
+        # The durable append waits for an fsync; use_trip and cancel must not queue behind it
+        with self.system.storage.transaction():
+            self.system.record_event(SUBSCRIPTIONS_RENEWED, writes)
+
+        with self._lock:
+            for base, record in updated:
+                sub_id = record["subscription_id"]
+                current = self._records[sub_id]
+                if current is not base and current["status"] == CANCELLED and record["status"] != CANCELLED:
+                    # Cancelled while the renewal was being written: the cancel wins
+                    record = {**record, "status": CANCELLED, "next_charge_at": None}
+                self._records[sub_id] = record
+                if record["next_charge_at"] is not None:
+                    heapq.heappush(self._due, (record["next_charge_at"], sub_id))
+            self.stats["renewed"] += counts["renewed"]
+            self.stats["declined"] += counts["declined"]
+            self.stats["lapsed"] += counts["lapsed"]
+        # Trips and cancels written meanwhile may have landed after the renewal
+        self._persist([record["subscription_id"] for _, record in updated])
+        return counts
+
+    def _persist(self, sub_ids: List[str]) -> None:
+        """Write the in-memory records of ``sub_ids`` that storage does not hold yet.
+
+        Called after self._lock is released, so a slow append never blocks
+        other subscription calls. Each call writes whatever is newest once it
+        has the write lock, so storage ends on the latest record however
+        concurrent updates interleave.
+        """
+        with self._write_lock:
+            with self._lock:
+                records = [self._records[sub_id] for sub_id in sub_ids if sub_id in self._records]
+            stored = self.system.storage.subscriptions
+            writes = [("subscriptions", record["subscription_id"], record) for record in records
+                      if stored.get(record["subscription_id"]) != record]
+            if writes:
+                self.system.record_event(SUBSCRIPTION_UPDATED, writes)
+
+    # === Background loop ===>>>>> (sleeps until the next deadline)
+
+    def start(self, max_sleep: float = 60.0) -> None:
+        """Run renewals on a daemon thread, waking at the next deadline or every ``max_sleep`` seconds."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(max_sleep,), daemon=True,
+                                        name="subscription-renewals")
+        self._thread.start()
+
+    def _run(self, max_sleep: float) -> None:
+        while not self._stop.is_set():
+            self.run_due()
+            next_due = self.next_due()
+            wait = max_sleep if next_due is None else min(max_sleep, max(next_due - self._clock(), 0.0))
+            self._stop.wait(wait)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+instrument_class(SubscriptionScheduler, "subscriptions", ["subscribe", "cancel", "use_trip", "run_due"])
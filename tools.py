@@ -1,24 +1,78 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
+from itertools import islice
 import hashlib
 import json
+import os
 import requests
 import uuid
 import re
 
+import numpy as np
+
+from cache import TTLCache
+from http_client import get_http_client
+from metrics import instrument_class
+from notifications import get_notifier
+from pricing_engine import DEFAULT_PLAN_TYPE, get_pricing_engine
+
+MAC_ADDRESS_PATTERN = re.compile(r'^([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})$')
+MAC_ADDRESS_LENGTH = 17
+
+# Byte lookup tables for the vectorized MAC validator
+_HEX_BYTES = np.zeros(256, dtype=bool)
+_HEX_BYTES[np.frombuffer(b"0123456789abcdefABCDEF", dtype=np.uint8)] = True
+_MAC_SEPARATORS = np.zeros(256, dtype=bool)
+_MAC_SEPARATORS[np.frombuffer(b":-", dtype=np.uint8)] = True
+_MAC_SEPARATOR_COLUMNS = np.arange(2, MAC_ADDRESS_LENGTH, 3)
+_MAC_HEX_COLUMNS = np.setdiff1d(np.arange(MAC_ADDRESS_LENGTH), _MAC_SEPARATOR_COLUMNS)
+
+
+def normalize_email(email: str) -> str:
+    """Canonical form users are stored and looked up under."""
+    return email.strip().lower()
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """Yield lists of up to ``size`` items; bulk jobs use it to stream their input."""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
 class UserVettingTools:
     @staticmethod
     def verify_mac_address(mac_address: str) -> bool:
         """Verify MAC address format."""
-        pattern = r'^([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})$'
-        return bool(re.match(pattern, mac_address))
+        return bool(MAC_ADDRESS_PATTERN.match(mac_address))
 
     @staticmethod
-    def register_user(email: str, mac_address: str) -> Dict[str, Any]:
+    def verify_mac_addresses(mac_addresses: List[str]) -> List[bool]:
+        """Verify a batch of MAC addresses with one vectorized pass over their bytes."""
+        n = len(mac_addresses)
+        if not n:
+            return []
+        fixed = [m if len(m) == MAC_ADDRESS_LENGTH and m.isascii() else "?" * MAC_ADDRESS_LENGTH
+                 for m in mac_addresses]
+        chars = np.frombuffer("".join(fixed).encode("ascii"), dtype=np.uint8).reshape(n, MAC_ADDRESS_LENGTH)
+        valid = (_HEX_BYTES[chars[:, _MAC_HEX_COLUMNS]].all(axis=1)
+                 & _MAC_SEPARATORS[chars[:, _MAC_SEPARATOR_COLUMNS]].all(axis=1))
+        result = valid.tolist()
+        # Anything not exactly 17 ASCII characters (e.g. a trailing newline) goes through the regex
+        for i, mac_address in enumerate(mac_addresses):
+            if fixed[i] is not mac_address:
+                result[i] = bool(MAC_ADDRESS_PATTERN.match(mac_address))
+        return result
+
+    @staticmethod
+    def register_user(email: str, mac_address: str, user_id: Optional[str] = None) -> Dict[str, Any]:
         """Register a new user."""
         return {
-            "user_id": str(uuid.uuid4()),
-            "email": email,
+            "user_id": user_id or str(uuid.uuid4()),
+            "email": normalize_email(email),
             "mac_address": mac_address
         }
 
@@ -30,10 +84,27 @@ class UserVettingTools:
             "email": email
         }
 
+    @staticmethod
+    def setup_2fa_bulk(emails: List[str]) -> List[Dict[str, Any]]:
+        """Setup 2FA for a batch of users."""
+        return [{"2fa_enabled": True, "email": email} for email in emails]
+
 class FlightVerificationTools:
+    # Airline ticket validation service; the built-in stub answers when unset
+    api_url: Optional[str] = os.getenv("TICKET_VALIDATION_URL")
+
     @staticmethod
     def verify_flight_purchase(ticket_number: str, user_id: str) -> Dict[str, Any]:
         """Verify flight purchase."""
+        if FlightVerificationTools.api_url:
+            response = get_http_client().request(
+                "GET", f"{FlightVerificationTools.api_url}/tickets/{ticket_number}/verify",
+                params={"user_id": user_id}
+            )
+            if response.status_code == 404:
+                return {"ticket_number": ticket_number, "user_id": user_id, "status": "not_found"}
+            response.raise_for_status()
+            return response.json()
         return {
             "ticket_number": ticket_number,
             "user_id": user_id,
@@ -41,8 +112,16 @@ class FlightVerificationTools:
         }
 
     @staticmethod
-    def extract_ticket_details(ticket_number: str) -> Dict[str, Any]:
-        """Extract ticket details."""
+    def extract_ticket_details(ticket_number: str) -> Optional[Dict[str, Any]]:
+        """Extract ticket details; None if the airline does not know the ticket."""
+        if FlightVerificationTools.api_url:
+            response = get_http_client().request(
+                "GET", f"{FlightVerificationTools.api_url}/tickets/{ticket_number}"
+            )
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            return response.json()
         return {
             "ticket_number": ticket_number,
             "price": 1000.0,  # Example price
@@ -50,39 +129,115 @@ class FlightVerificationTools:
             "arrival": "2024-03-21"
         }
 
-class CoverageTools:
+class CachedFlightVerificationTools(FlightVerificationTools):
+    """FlightVerificationTools behind shared TTL/LRU caches.
+
+    Unknown tickets (no details, or a non-verified status) are negatively
+    cached for a shorter TTL so repeated lookups do not hit the airline API.
+    """
+
+    verification_cache = TTLCache(
+        maxsize=50_000, ttl=300.0, negative_ttl=30.0,
+        is_negative=lambda result: result is None or result.get("status") != "verified"
+    )
+    details_cache = TTLCache(maxsize=50_000, ttl=900.0, negative_ttl=30.0)
+
     @staticmethod
-    def recommend_coverage(ticket_price: float) -> Dict[str, Any]:
-        """Recommend coverage options."""
+    def verify_flight_purchase(ticket_number: str, user_id: str) -> Dict[str, Any]:
+        """Verify flight purchase, served from cache when possible."""
+        return CachedFlightVerificationTools.verification_cache.get_or_load(
+            (ticket_number, user_id),
+            lambda: FlightVerificationTools.verify_flight_purchase(ticket_number, user_id)
+        )
+
+    @staticmethod
+    def extract_ticket_details(ticket_number: str) -> Dict[str, Any]:
+        """Extract ticket details, served from cache when possible."""
+        return CachedFlightVerificationTools.details_cache.get_or_load(
+            ticket_number,
+            lambda: FlightVerificationTools.extract_ticket_details(ticket_number)
+        )
+
+    @staticmethod
+    def cache_stats() -> Dict[str, Dict[str, Any]]:
         return {
-            "options": [
-                {"level": 1, "coverage": 0.5, "premium": ticket_price * 0.01},
-                {"level": 2, "coverage": 0.75, "premium": ticket_price * 0.02},
-                {"level": 3, "coverage": 1.0, "premium": ticket_price * 0.03}
-            ]
+            "flight_verification": CachedFlightVerificationTools.verification_cache.stats(),
+            "ticket_details": CachedFlightVerificationTools.details_cache.stats()
         }
 
+class CoverageTools:
+    @staticmethod
+    def recommend_coverage(ticket_price: float, plan_type: str = DEFAULT_PLAN_TYPE) -> Dict[str, Any]:
+        """Recommend coverage options."""
+        plan_quotes = get_pricing_engine().rules.quotes.get(plan_type)
+        if plan_quotes is None:
+            raise ValueError(f"Unknown plan type: {plan_type}")
+        options = []
+        for level, (coverage_rate, premium_rate, flat_fee, _) in sorted(plan_quotes.items()):
+            options.append({
+                "level": level,
+                "coverage": coverage_rate,
+                "premium": ticket_price * premium_rate + flat_fee
+            })
+        return {"options": options}
+
     @staticmethod
-    def calculate_premium(ticket_price: float, coverage_level: int) -> Dict[str, Any]:
+    def calculate_premium(ticket_price: float, coverage_level: int,
+                          plan_type: str = DEFAULT_PLAN_TYPE) -> Dict[str, Any]:
         """Calculate insurance premium."""
-        coverage_percentages = {1: 0.5, 2: 0.75, 3: 1.0}
-        premium_percentages = {1: 0.01, 2: 0.02, 3: 0.03}
-        
-        coverage_amount = ticket_price * coverage_percentages[coverage_level]
-        premium_amount = ticket_price * premium_percentages[coverage_level]
-        
+        coverage_amount, premium_amount, coverage_percentage = get_pricing_engine().quote(
+            ticket_price, coverage_level, plan_type
+        )
         return {
             "coverage_amount": coverage_amount,
             "premium_amount": premium_amount,
-            "coverage_percentage": coverage_percentages[coverage_level] * 100
+            "coverage_percentage": coverage_percentage
+        }
+
+    @staticmethod
+    def calculate_premiums_bulk(ticket_prices, coverage_levels,
+                                plan_type: str = DEFAULT_PLAN_TYPE) -> Dict[str, np.ndarray]:
+        """Calculate premiums for a batch of tickets in one vectorized pass.
+
+        ``coverage_levels`` may be a single level applied to every ticket or an
+        array matching ``ticket_prices``. Returns columnar results.
+        """
+        rules = get_pricing_engine().rules
+        plan_row = rules.plan_index.get(plan_type)
+        if plan_row is None:
+            raise ValueError(f"Unknown plan type: {plan_type}")
+        prices = np.asarray(ticket_prices, dtype=np.float64)
+        levels = np.broadcast_to(np.asarray(coverage_levels, dtype=np.intp), prices.shape)
+
+        if levels.size and (levels.min() < 1 or levels.max() >= len(rules.coverage_rates)):
+            raise ValueError("Unknown coverage level in batch")
+        coverage_rates = rules.coverage_rates[levels]
+        if np.isnan(coverage_rates).any():
+            raise ValueError("Unknown coverage level in batch")
+
+        return {
+            "coverage_amount": prices * coverage_rates,
+            "premium_amount": prices * rules.premium_rates[plan_row, levels] + rules.flat_fees[plan_row],
+            "coverage_percentage": coverage_rates * 100
         }
 
 class PaymentTools:
+    # Payment processor; the built-in stub answers when unset
+    api_url: Optional[str] = os.getenv("PAYMENT_PROCESSOR_URL")
+
     @staticmethod
     def process_payment(amount: float, payment_method: str, user_id: str) -> Dict[str, Any]:
         """Process payment."""
+        transaction_id = str(uuid.uuid4())
+        if PaymentTools.api_url:
+            return get_http_client().post_json(
+                f"{PaymentTools.api_url}/payments",
+                {"transaction_id": transaction_id, "amount": amount,
+                 "payment_method": payment_method, "user_id": user_id},
+                idempotency_key=transaction_id
+            )
         return {
-            "transaction_id": str(uuid.uuid4()),
+            "transaction_id": transaction_id,
             "amount": amount,
             "payment_method": payment_method,
             "status": "success"
@@ -91,6 +246,12 @@ class PaymentTools:
     @staticmethod
     def process_refund(transaction_id: str) -> Dict[str, Any]:
         """Process refund."""
+        if PaymentTools.api_url:
+            return get_http_client().post_json(
+                f"{PaymentTools.api_url}/refunds",
+                {"transaction_id": transaction_id},
+                idempotency_key=f"refund_{transaction_id}"
+            )
         return {
             "refund_id": str(uuid.uuid4()),
             "transaction_id": transaction_id,
@@ -98,6 +259,9 @@ class PaymentTools:
         }
 
 class ClaimsTools:
+    # Payout rail; the built-in stub answers when unset
+    payout_api_url: Optional[str] = os.getenv("PAYOUT_API_URL")
+
     @staticmethod
     def verify_claim(claim_id: str, user_id: str) -> Dict[str, Any]:
         """Verify claim."""
@@ -110,6 +274,12 @@ class ClaimsTools:
     @staticmethod
     def process_payout(claim_id: str, amount: float) -> Dict[str, Any]:
         """Process payout."""
+        if ClaimsTools.payout_api_url:
+            return get_http_client().post_json(
+                f"{ClaimsTools.payout_api_url}/payouts",
+                {"claim_id": claim_id, "amount": amount},
+                idempotency_key=claim_id
+            )
         return {
             "payout_id": str(uuid.uuid4()),
             "claim_id": claim_id,
@@ -117,8 +287,42 @@ class ClaimsTools:
             "status": "success"
         }
 
+    @staticmethod
+    def verify_claims(claims: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Verify a batch of (claim_id, user_id) pairs."""
+        return [ClaimsTools.verify_claim(claim_id, user_id) for claim_id, user_id in claims]
+
+    @staticmethod
+    def process_payouts(payment_rail: str, payouts: List[Tuple[str, float]]) -> List[Dict[str, Any]]:
+        """Submit a batch of (claim_id, amount) payouts on one payment rail.
+
+        The claim_id is the idempotency key, so resubmitting a claim that the
+        rail already paid must not pay it twice.
+        """
+        return [
+            {**ClaimsTools.process_payout(claim_id, amount), "payment_rail": payment_rail}
+            for claim_id, amount in payouts
+        ]
+
     @staticmethod
     def notify_user(email: str, message: str) -> bool:
-        """Notify user."""
-        print(f"Sending notification to {email}: {message}")
-        return True 
\ No newline at end of file
+        """Queue a notification to the user; see notifications.py for delivery."""
+        get_notifier().send_message(email, message)
+        return True
+
+    @staticmethod
+    def notify_users(notifications: List[Tuple[str, str]]) -> int:
+        """Queue a batch of (email, message) notifications; returns the number queued."""
+        notifier = get_notifier()
+        for email, message in notifications:
+            notifier.send_message(email, message)
+        return len(notifications)
+
+# Record latency, throughput and errors for every tool call
+instrument_class(UserVettingTools, "tool.user_vetting")
+instrument_class(FlightVerificationTools, "tool.flight_verification")
+instrument_class(CachedFlightVerificationTools, "tool.cached_flight_verification",
+                 ["verify_flight_purchase", "extract_ticket_details"])
+instrument_class(CoverageTools, "tool.coverage")
+instrument_class(PaymentTools, "tool.payment")
+instrument_class(ClaimsTools, "tool.claims")
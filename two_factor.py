@@ -0,0 +1,198 @@
+"""2FA code issuing and verification.
+
+Codes come from ``secrets`` and only an HMAC of each code is kept, checked
+with ``hmac.compare_digest``. Each user has at most one live code, and a new
+code replaces the old one. A code is deleted once it is used, once it
+expires, or after ``max_attempts`` wrong guesses. Each user may request
+``issue_limit`` codes per ``issue_window``.
+
+Live codes and rate-limit windows sit in dicts. A min-heap of deadlines lets
+expired ones be dropped from the front of the heap as new codes are issued,
+so the store never needs a full scan.
+
+With ``db_path`` (or TWO_FACTOR_DB_PATH) codes are also written to SQLite and
+reloaded on start, so a restart does not void codes that are already out.
+Set TWO_FACTOR_SECRET so that a restarted process can still check them.
+"""
+
+from collections import deque
+from typing import Dict, Any, Deque, Iterator, Optional, Tuple
+import heapq
+import hmac
+import hashlib
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+CODE_DIGITS = 6
+CODE_TTL = 300.0
+MAX_ATTEMPTS = 5
+ISSUE_LIMIT = 5
+ISSUE_WINDOW = 900.0
+
+
+class _CodeEntry:
+    __slots__ = ("digest", "expires_at", "attempts")
+
+    def __init__(self, digest: bytes, expires_at: float, attempts: int = 0):
+        self.digest = digest
+        self.expires_at = expires_at
+        self.attempts = attempts
+
+
+class SQLiteCodeBackend:
+    """Write-through copy of the live codes in a SQLite table."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS two_factor_codes ("
+            "user_id TEXT PRIMARY KEY, digest BLOB NOT NULL, expires_at REAL NOT NULL, attempts INTEGER NOT NULL)"
+        )
+
+    def save(self, user_id: str, entry: _CodeEntry) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO two_factor_codes VALUES (?, ?, ?, ?)",
+                               (user_id, entry.digest, entry.expires_at, entry.attempts))
+
+    def delete(self, user_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM two_factor_codes WHERE user_id = ?", (user_id,))
+
+    def load(self, now: float) -> Iterator[Tuple[str, _CodeEntry]]:
+        """Drop expired rows and yield the rest."""
+        with self._lock:
+            self._conn.execute("DELETE FROM two_factor_codes WHERE expires_at <= ?", (now,))
+            rows = self._conn.execute("SELECT user_id, digest, expires_at, attempts FROM two_factor_codes").fetchall()
+        for user_id, digest, expires_at, attempts in rows:
+            yield user_id, _CodeEntry(bytes(digest), expires_at, attempts)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TwoFactorService:
+    def __init__(self, secret: Optional[bytes] = None, backend: Optional[SQLiteCodeBackend] = None,
+                 code_ttl: float = CODE_TTL, max_attempts: int = MAX_ATTEMPTS,
+                 issue_limit: int = ISSUE_LIMIT, issue_window: float = ISSUE_WINDOW,
+                 digits: int = CODE_DIGITS, clock=time.time):
+        self._secret = secret or secrets.token_bytes(32)
+        self.backend = backend
+        self.code_ttl = code_ttl
+        self.max_attempts = max_attempts
+        self.issue_limit = issue_limit
+        self.issue_window = issue_window
+        self.digits = digits
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._codes: Dict[str, _CodeEntry] = {}
+        self._issued: Dict[str, Deque[float]] = {}
+        self._deadlines: list = []  # (time, user_id) heap; entries may be stale
+        self.stats = {"issued": 0, "verified": 0, "rejected": 0, "expired": 0, "rate_limited": 0, "locked_out": 0}
+        if backend is not None:
+            for user_id, entry in backend.load(clock()):
+                self._codes[user_id] = entry
+                heapq.heappush(self._deadlines, (entry.expires_at, user_id))
+
+    def _digest(self, user_id: str, code: str) -> bytes:
+        return hmac.new(self._secret, f"{user_id}:{code}".encode(), hashlib.sha256).digest()
+
+    def _evict(self, now: float) -> None:
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][0] <= now:
+            _, user_id = heapq.heappop(deadlines)
+            entry = self._codes.get(user_id)
+            if entry is not None and entry.expires_at <= now:
+                del self._codes[user_id]
+                if self.backend is not None:
+                    self.backend.delete(user_id)
+            issued = self._issued.get(user_id)
+            if issued is not None and issued[-1] <= now - self.issue_window:
+                del self._issued[user_id]
+
+    def issue(self, user_id: str) -> Dict[str, Any]:
+        """Issue a fresh code for ``user_id``, replacing any live one."""
+        now = self._clock()
+        code = str(secrets.randbelow(10 ** self.digits)).zfill(self.digits)
+        with self._lock:
+            self._evict(now)
+            issued = self._issued.get(user_id)
+            if issued is None:
+                issued = self._issued[user_id] = deque(maxlen=self.issue_limit)
+            elif len(issued) == issued.maxlen and issued[0] > now - self.issue_window:
+                self.stats["rate_limited"] += 1
+                return {"status": "error", "message": "Too many codes requested, try again later"}
+            issued.append(now)
+            entry = self._codes[user_id] = _CodeEntry(self._digest(user_id, code), now + self.code_ttl)
+            heapq.heappush(self._deadlines, (entry.expires_at, user_id))
+            heapq.heappush(self._deadlines, (now + self.issue_window, user_id))
+            self.stats["issued"] += 1
+            if self.backend is not None:
+                self.backend.save(user_id, entry)
+        return {"status": "success", "code": code, "expires_at": entry.expires_at}
+
+    def verify(self, user_id: str, code: str) -> Dict[str, Any]:
+        """Check ``code`` against the user's live code; a correct code can be used once."""
+        now = self._clock()
+        digest = self._digest(user_id, str(code))
+        with self._lock:
+            entry = self._codes.get(user_id)
+            if entry is None:
+                self.stats["rejected"] += 1
+                return {"status": "error", "message": "No active code"}
+            if entry.expires_at <= now:
+                self._drop(user_id)
+                self.stats["expired"] += 1
+                return {"status": "error", "message": "Code expired"}
+            if hmac.compare_digest(entry.digest, digest):
+                self._drop(user_id)
+                self.stats["verified"] += 1
+                return {"status": "success"}
+            entry.attempts += 1
+            self.stats["rejected"] += 1
+            if entry.attempts >= self.max_attempts:
+                self._drop(user_id)
+                self.stats["locked_out"] += 1
+                return {"status": "error", "message": "Too many attempts, request a new code"}
+            if self.backend is not None:
+                self.backend.save(user_id, entry)
+            return {"status": "error", "message": "Invalid code"}
+
+    def _drop(self, user_id: str) -> None:
+        del self._codes[user_id]
+        if self.backend is not None:
+            self.backend.delete(user_id)
+
+    def active_codes(self) -> int:
+        with self._lock:
+            self._evict(self._clock())
+            return len(self._codes)
+
+    def close(self) -> None:
+        if self.backend is not None:
+            self.backend.close()
+
+
+_default_service: Optional[TwoFactorService] = None
+_default_lock = threading.Lock()
+
+
+def get_two_factor() -> TwoFactorService:
+    """Process-wide 2FA service, persisted when TWO_FACTOR_DB_PATH is set."""
+    global _default_service
+    if _default_service is None:
+        with _default_lock:
+            if _default_service is None:
+                secret = os.getenv("TWO_FACTOR_SECRET")
+                path = os.getenv("TWO_FACTOR_DB_PATH")
+                _default_service = TwoFactorService(
+                    secret=secret.encode() if secret else None,
+                    backend=SQLiteCodeBackend(path) if path else None
+                )
+    return _default_service